@@ -0,0 +1,69 @@
+# -*- encoding: utf-8
+"""Fixtures for the parser benchmarks.
+
+The benchmarks run against the saved AO3 pages in ``tests/fixtures``, so
+they never touch the network.  The "huge" work is built from the small one
+by repeating its chapter text and kudos list until it's about the size of
+a long, popular fic -- a couple of megabytes -- rather than checking in a file
+that size.
+"""
+
+import io
+import os
+
+import pytest
+
+from ao3 import parsers
+
+
+FIXTURES_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'tests', 'fixtures')
+
+PARSERS = ['html.parser', 'lxml', 'selectolax']
+
+
+def read_fixture(name):
+    with io.open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def huge_work_html(paragraphs=10000, kudos=20000):
+    html = read_fixture('work.html')
+    text = ''.join(
+        '<p>Paragraph %d of a very long work, which goes on and on and on '
+        'for quite a while before it gets to the point.</p>\n' % i
+        for i in range(paragraphs))
+    names = ', '.join(
+        '<a href="/users/reader%d">reader%d</a>' % (i, i)
+        for i in range(kudos))
+    html = html.replace(
+        '<p>Pinboard is already up', text + '<p>Pinboard is already up')
+    html = html.replace(
+        '<a href="/users/winterbelles">',
+        names + ', <a href="/users/winterbelles">')
+    return html
+
+
+PAGES = {
+    'small': read_fixture('work.html'),
+    'huge': huge_work_html(),
+}
+
+
+@pytest.fixture(params=PARSERS)
+def parser(request):
+    """Each of the parser backends that's installed."""
+    if request.param != 'html.parser':
+        pytest.importorskip(request.param)
+    return parsers.get_parser(request.param)
+
+
+@pytest.fixture(params=sorted(PAGES))
+def work_html(request):
+    """The HTML for each size of work page."""
+    return PAGES[request.param]
+
+
+@pytest.fixture
+def fixture_html():
+    return read_fixture
@@ -0,0 +1,208 @@
+# -*- encoding: utf-8
+"""A load test for the client, run against the local stand-in for AO3.
+
+This drives ``AO3``, ``User`` and ``Work`` through ``StandInServer``, and
+reports how many requests per second we managed, the median and 99th
+percentile latency of those requests, and the peak memory of the process.
+For example, to see how well ``AO3.works()`` copes with a slow server that
+sometimes tells us to back off:
+
+    $ python benchmarks/loadtest.py works --count 500 --max-workers 16 \\
+        --latency 0.05 --throttle-rate 0.05 --rate 100
+
+The scenarios are:
+
+*   ``works``: look up ``--count`` works with ``AO3.works()``
+*   ``bookmarks``: log in and list a user's bookmarks
+*   ``history``: log in and read a user's reading history
+*   ``kudos``: stream the kudos list of ``--count`` works
+
+Pass ``--url`` to use a server you've started yourself (say, with
+``benchmarks/server.py`` in another process, so the server doesn't compete
+with the client for the GIL) instead of one on a background thread.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (Windows)
+    resource = None
+
+from ao3 import AO3
+from ao3.metrics import CounterSink
+from ao3.ratelimit import RateLimiter
+from ao3.utils import threaded_map
+
+from server import add_server_arguments, server_from_arguments
+
+
+LoadTestResult = collections.namedtuple('LoadTestResult', [
+    'requests', 'failures', 'elapsed', 'latencies', 'peak_memory'])
+
+
+def percentile(values, pct):
+    """Returns the ``pct``-th percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[idx]
+
+
+def peak_memory():
+    """Returns the peak resident memory of this process, in bytes, or
+    None if we can't tell."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports this in kilobytes, macOS in bytes.
+    if sys.platform == 'darwin':
+        return maxrss
+    return maxrss * 1024
+
+
+class LatencyRecorder(object):
+    """A requests response hook that records how long each request took."""
+
+    def __init__(self):
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def __call__(self, resp, *args, **kwargs):
+        with self._lock:
+            self.latencies.append(resp.elapsed.total_seconds())
+
+
+def _run_works(api, args):
+    def fetch(work_id):
+        try:
+            return api.work(work_id).title
+        except Exception:
+            return None
+
+    results = threaded_map(
+        fetch, range(1, args.count + 1),
+        max_workers=args.max_workers, ordered=False)
+    return sum(1 for _, future in results if future.result() is None)
+
+
+def _run_kudos(api, args):
+    def fetch(work_id):
+        try:
+            return list(api.work(work_id, lazy=True).iter_kudos())
+        except Exception:
+            return None
+
+    results = threaded_map(
+        fetch, range(1, args.count + 1),
+        max_workers=args.max_workers, ordered=False)
+    return sum(1 for _, future in results if future.result() is None)
+
+
+def _run_listing(method):
+    def run(api, args):
+        try:
+            api.login('reader', 'password')
+            list(getattr(api.user, method)(max_workers=args.max_workers))
+        except Exception:
+            return 1
+        return 0
+    return run
+
+
+SCENARIOS = {
+    'works': _run_works,
+    'kudos': _run_kudos,
+    'bookmarks': _run_listing('bookmarks_ids'),
+    'history': _run_listing('reading_history'),
+}
+
+
+def run_load_test(scenario, base_url, args):
+    """Run one scenario against the server at ``base_url``.
+
+    :returns: a ``LoadTestResult``.
+    """
+    rate_limiter = None
+    if args.rate:
+        rate_limiter = RateLimiter(rate=args.rate, burst=args.max_workers)
+
+    api = AO3(base_url=base_url, parser=args.parser,
+              rate_limiter=rate_limiter)
+    recorder = LatencyRecorder()
+    api.session.hooks['response'].append(recorder)
+    if args.metrics:
+        counters = api.instrumentation.add_sink(CounterSink())
+
+    start = time.time()
+    failures = SCENARIOS[scenario](api, args)
+    elapsed = time.time() - start
+
+    if args.metrics:
+        print(counters.render())
+
+    return LoadTestResult(
+        requests=len(recorder.latencies),
+        failures=failures,
+        elapsed=elapsed,
+        latencies=recorder.latencies,
+        peak_memory=peak_memory())
+
+
+def report(result, out=None):
+    out = out or sys.stdout
+    rate = result.requests / result.elapsed if result.elapsed else 0.0
+    print('requests:     %d' % result.requests, file=out)
+    print('failures:     %d' % result.failures, file=out)
+    print('elapsed:      %.2fs' % result.elapsed, file=out)
+    print('requests/sec: %.1f' % rate, file=out)
+    print('p50 latency:  %.1fms' % (
+        percentile(result.latencies, 50) * 1000), file=out)
+    print('p99 latency:  %.1fms' % (
+        percentile(result.latencies, 99) * 1000), file=out)
+    if result.peak_memory is not None:
+        print('peak memory:  %.1fMB' % (
+            result.peak_memory / (1024.0 * 1024)), file=out)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('scenario', choices=sorted(SCENARIOS))
+    parser.add_argument('--count', type=int, default=200,
+                        help='how many works to fetch')
+    parser.add_argument('--max-workers', type=int, default=8,
+                        help='how many requests to make at once')
+    parser.add_argument('--parser', default=None,
+                        help='the HTML parser backend to use')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='rate limit the client to this many '
+                             'requests per second')
+    parser.add_argument('--metrics', action='store_true',
+                        help='print the counters from ao3.metrics')
+    parser.add_argument('--url', default=None,
+                        help='use an already-running server at this URL')
+    add_server_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.url:
+        result = run_load_test(args.scenario, args.url, args)
+    else:
+        with server_from_arguments(args) as server:
+            result = run_load_test(args.scenario, server.url, args)
+            print('server:       %s' % dict(server.stats))
+    report(result)
+
+
+if __name__ == '__main__':
+    main()
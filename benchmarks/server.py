@@ -0,0 +1,382 @@
+# -*- encoding: utf-8
+"""A local stand-in for AO3, for load testing the client.
+
+It serves the saved pages in ``tests/fixtures`` (and generates as many pages
+of bookmarks and reading history as you like), with configurable latency,
+server errors and ``429 Too Many Requests`` responses.  Point the client at
+it with the ``base_url`` argument:
+
+    >>> with StandInServer(latency=0.05, throttle_rate=0.1) as server:
+    ...     api = AO3(base_url=server.url)
+    ...     work = api.work('258626')
+
+You can also run it by itself, and drive it from another process:
+
+    $ python benchmarks/server.py --port 8000 --latency 0.05
+
+Every work ID is served the same fixture page, so you can ask for as many
+different works as you like.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import datetime
+import io
+import os
+import random
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+
+FIXTURES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, 'tests', 'fixtures')
+
+
+def read_fixture(name):
+    with io.open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+PAGINATION_TEMPLATE = u'''
+      <ol class="pagination actions" role="navigation" title="pagination">
+        %(pages)s
+        <li class="next" title="next">%(next)s</li>
+      </ol>'''
+
+BOOKMARK_TEMPLATE = u'''
+        <li id="bookmark_%(id)d" class="bookmark blurb group" role="article">
+          <div class="header module">
+            <h4 class="heading">
+              <a href="/works/%(id)d">Work %(id)d</a>
+              by
+              <a rel="author" href="/users/author/pseuds/author">author</a>
+            </h4>
+          </div>
+        </li>'''
+
+READING_TEMPLATE = u'''
+        <li id="work_%(id)d" class="reading work blurb group" role="article">
+          <div class="header module">
+            <h4 class="heading">
+              <a href="/works/%(id)d">Work %(id)d</a>
+              by
+              <a rel="author" href="/users/author/pseuds/author">author</a>
+            </h4>
+          </div>
+          <h4 class="viewed heading">
+            <span>Last visited:</span> %(date)s
+          </h4>
+        </li>'''
+
+LISTING_TEMPLATE = u'''<!DOCTYPE html>
+<html lang="en">
+  <head>
+    <meta charset="utf-8">
+    <title>%(title)s | Archive of Our Own</title>
+  </head>
+  <body class="logged-in">
+    <div id="main" class="%(kind)s-index region" role="main">%(pagination)s
+      <ol class="%(list_class)s index group">%(items)s
+      </ol>%(pagination)s
+    </div>
+  </body>
+</html>
+'''
+
+
+def pagination(path, page_no, page_count):
+    """Returns the pagination links for one page of a listing."""
+    pages = u'\n        '.join(
+        u'<li><span class="current">%d</span></li>' % n if n == page_no
+        else u'<li><a href="%s?page=%d">%d</a></li>' % (path, n, n)
+        for n in range(1, page_count + 1))
+    if page_no < page_count:
+        next_link = u'<a rel="next" href="%s?page=%d">Next &#8594;</a>' % (
+            path, page_no + 1)
+    else:
+        next_link = u'<span class="disabled">Next &#8594;</span>'
+    return PAGINATION_TEMPLATE % {'pages': pages, 'next': next_link}
+
+
+def listing_page(kind, path, page_no, page_count, per_page):
+    """Generates one page of a user's bookmarks or reading history.
+
+    Work IDs are numbered from the first page onwards, and the reading
+    history goes back one day per entry.
+    """
+    if page_no > page_count:
+        items = []
+    else:
+        first = (page_no - 1) * per_page
+        items = range(first + 1, first + per_page + 1)
+
+    if kind == 'bookmarks':
+        list_class = 'bookmark'
+        rendered = [BOOKMARK_TEMPLATE % {'id': i} for i in items]
+    else:
+        list_class = 'reading work'
+        start = datetime.date(2018, 1, 1)
+        rendered = [
+            READING_TEMPLATE % {
+                'id': i,
+                'date': (start - datetime.timedelta(days=i)).strftime(
+                    '%d %b %Y'),
+            }
+            for i in items]
+
+    nav = pagination(path, page_no, page_count)
+    return LISTING_TEMPLATE % {
+        'title': kind.title(),
+        'kind': kind,
+        'list_class': list_class,
+        'pagination': nav,
+        'items': u''.join(rendered),
+    }
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    # The routes we know how to serve, as (method, regex, handler name).
+    ROUTES = [
+        ('GET', re.compile(r'^/$'), 'front_page'),
+        ('POST', re.compile(r'^/user_sessions$'), 'login'),
+        ('GET', re.compile(r'^/works/[0-9]+/kudos$'), 'kudos'),
+        ('GET', re.compile(r'^/works/[0-9]+$'), 'work'),
+        ('GET', re.compile(r'^/users/[^/]+/bookmarks$'), 'bookmarks'),
+        ('GET', re.compile(r'^/users/[^/]+/readings$'), 'readings'),
+    ]
+
+    # Keep connections open, like AO3 does.
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        standin = self.server.standin
+        url = urlparse(self.path)
+        self.query = parse_qs(url.query)
+
+        outcome = standin.next_outcome()
+        if standin.latency:
+            time.sleep(standin.latency)
+
+        if outcome == 'throttled':
+            return self.respond(
+                429, u'Too many requests',
+                headers={'Retry-After': str(standin.retry_after)})
+        elif outcome == 'error':
+            return self.respond(500, u'Internal server error')
+
+        for route_method, pattern, name in self.ROUTES:
+            if route_method == method and pattern.match(url.path):
+                return getattr(self, name)(standin, url.path)
+        self.respond(404, u'Not found')
+
+    def respond(self, status, body, headers=None):
+        content = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def page_no(self):
+        return int(self.query.get('page', ['1'])[0])
+
+    def front_page(self, standin, path):
+        self.respond(200, standin.pages['work.html'])
+
+    def login(self, standin, path):
+        self.respond(200, u'Successfully logged in.')
+
+    def work(self, standin, path):
+        if standin.adult and self.query.get('view_adult') != ['true']:
+            return self.respond(200, standin.pages['adult_interstitial.html'])
+        self.respond(200, standin.pages['work.html'])
+
+    def kudos(self, standin, path):
+        name = 'kudos_page%d.html' % (1 if self.page_no() == 1 else 2)
+        self.respond(200, standin.pages[name])
+
+    def bookmarks(self, standin, path):
+        self.respond(200, listing_page(
+            'bookmarks', path, self.page_no(),
+            standin.listing_pages, standin.per_page))
+
+    def readings(self, standin, path):
+        self.respond(200, listing_page(
+            'readings', path, self.page_no(),
+            standin.listing_pages, standin.per_page))
+
+
+class StandInServer(object):
+    """A local HTTP server that behaves (enough) like AO3.
+
+    :param host: the interface to listen on.
+    :param port: the port to listen on.  The default of 0 picks a free port;
+        look at ``url`` to find out which one.
+    :param latency: how long (in seconds) to wait before answering each
+        request.
+    :param error_rate: the fraction of requests that get a ``500`` error.
+    :param throttle_rate: the fraction of requests that get a ``429 Too Many
+        Requests``, with a ``Retry-After`` header of ``retry_after`` seconds.
+    :param adult: if True, works are behind the adult content interstitial.
+    :param listing_pages: how many pages of bookmarks and reading history
+        each user has.
+    :param per_page: how many items are on each of those pages.
+    :param seed: seeds the random choice of which requests fail, so runs
+        can be repeated exactly.
+
+    The ``stats`` attribute counts the ``requests`` served, and how many of
+    them were ``errors`` or ``throttled``.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, error_rate=0,
+                 throttle_rate=0, retry_after=0, adult=False,
+                 listing_pages=3, per_page=20, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.adult = adult
+        self.listing_pages = listing_pages
+        self.per_page = per_page
+        self.stats = collections.Counter(requests=0, errors=0, throttled=0)
+        self.pages = dict(
+            (name, read_fixture(name)) for name in [
+                'work.html', 'adult_interstitial.html',
+                'kudos_page1.html', 'kudos_page2.html',
+            ])
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.standin = self
+        self._thread = None
+
+    def __repr__(self):
+        return '%s(url=%r)' % (type(self).__name__, self.url)
+
+    @property
+    def url(self):
+        """The base URL to pass to ``AO3(base_url=...)``."""
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def next_outcome(self):
+        """Decide whether the next request succeeds, errors or is
+        throttled."""
+        with self._lock:
+            self.stats['requests'] += 1
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                self.stats['throttled'] += 1
+                return 'throttled'
+            elif roll < self.throttle_rate + self.error_rate:
+                self.stats['errors'] += 1
+                return 'error'
+            return 'ok'
+
+    def start(self):
+        """Start serving requests on a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests, and close the socket."""
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def add_server_arguments(parser):
+    """Add the options for configuring a ``StandInServer`` to an
+    ``argparse.ArgumentParser``."""
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds to wait before each response')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of requests that get a 500')
+    parser.add_argument('--throttle-rate', type=float, default=0,
+                        help='fraction of requests that get a 429')
+    parser.add_argument('--retry-after', type=int, default=0,
+                        help='the Retry-After header sent with a 429')
+    parser.add_argument('--adult', action='store_true',
+                        help='put works behind the adult interstitial')
+    parser.add_argument('--listing-pages', type=int, default=3,
+                        help='pages of bookmarks and reading history')
+    parser.add_argument('--per-page', type=int, default=20,
+                        help='items on each page of a listing')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for choosing which requests fail')
+
+
+def server_from_arguments(args, host='127.0.0.1', port=0):
+    return StandInServer(
+        host=host, port=port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        adult=args.adult,
+        listing_pages=args.listing_pages,
+        per_page=args.per_page,
+        seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_arguments(args, host=args.host, port=args.port)
+    print('Serving a stand-in AO3 at %s' % server.url)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# -*- encoding: utf-8
+"""Smoke tests for the stand-in server and the load test harness.
+
+These don't measure anything; they check the harness still works, so it's
+ready when you need it.
+"""
+
+import pytest
+
+from ao3 import AO3
+from ao3.ratelimit import RateLimiter
+
+import loadtest
+from server import StandInServer
+
+
+@pytest.fixture
+def server():
+    with StandInServer(seed=0) as server:
+        yield server
+
+
+def test_client_can_talk_to_the_stand_in(server):
+    api = AO3(base_url=server.url)
+    assert api.work('258626').title == 'The Morning After'
+
+    api.login('reader', 'password')
+    assert len(api.user.bookmarks_ids()) == 60
+    assert len(list(api.user.reading_history())) == 60
+
+
+def test_adult_interstitial_is_skipped():
+    with StandInServer(adult=True) as server:
+        work = AO3(base_url=server.url).work('258626')
+        assert work.title == 'The Morning After'
+
+
+def test_throttled_requests_are_retried():
+    with StandInServer(throttle_rate=0.5, seed=1) as server:
+        limiter = RateLimiter(rate=1000, burst=10)
+        api = AO3(base_url=server.url, rate_limiter=limiter)
+        works = list(api.works(range(10)))
+        assert len(works) == 10
+        assert server.stats['throttled'] == limiter.stats['throttled'] > 0
+
+
+@pytest.mark.parametrize('scenario', sorted(loadtest.SCENARIOS))
+def test_load_test_scenarios(scenario, capsys):
+    loadtest.main([scenario, '--count', '5', '--error-rate', '0'])
+    out = capsys.readouterr().out
+    assert 'failures:     0' in out
+    assert 'requests/sec' in out
@@ -0,0 +1,134 @@
+# -*- encoding: utf-8
+"""Benchmarks for parsing AO3 pages.
+
+Run them with ``tox -e benchmark``, or ``py.test benchmarks/``.  To compare
+against an earlier run, use pytest-benchmark's ``--benchmark-autosave`` and
+``--benchmark-compare`` options.
+"""
+
+import pytest
+
+from ao3.parsers import KudosScanner
+from ao3.works import (
+    RestrictedWork, Work, check_not_restricted, is_adult_interstitial
+)
+
+
+pytest.importorskip('pytest_benchmark')
+
+
+PROPERTIES = [
+    'title', 'author', 'summary', 'rating', 'warnings', 'category',
+    'fandoms', 'relationship', 'characters', 'additional_tags', 'language',
+    'published', 'words', 'comments', 'kudos', 'bookmarks', 'hits',
+]
+
+
+WORK_URL = 'https://archiveofourown.org/works/258626'
+
+
+class SavedResponse(object):
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+
+class SavedPages(object):
+    """Stands in for a ``requests.Session``, serving pages from a dict of
+    ``{url: html}``."""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, **kwargs):
+        if url in self.pages:
+            return SavedResponse(200, self.pages[url])
+        return SavedResponse(404, 'Not found')
+
+
+@pytest.mark.parametrize('metadata_only', [False, True])
+def test_work_construction(benchmark, parser, work_html, metadata_only):
+    benchmark(
+        Work, '258626', html=work_html, parser=parser,
+        metadata_only=metadata_only)
+
+
+def test_adult_work_construction(benchmark, parser, work_html, fixture_html):
+    # The first request gets the interstitial, so this is two pages' worth
+    # of checks, and then the work itself.
+    sess = SavedPages({
+        WORK_URL: fixture_html('adult_interstitial.html'),
+        WORK_URL + '?view_adult=true': work_html,
+    })
+    benchmark(Work, '258626', sess=sess, parser=parser)
+
+
+def test_restricted_work_construction(benchmark, parser, fixture_html):
+    sess = SavedPages({WORK_URL: fixture_html('restricted.html')})
+
+    def construct():
+        try:
+            Work('258626', sess=sess, parser=parser)
+        except RestrictedWork:
+            pass
+        else:
+            raise AssertionError('Expected RestrictedWork')
+
+    benchmark(construct)
+
+
+def test_page_checks(benchmark, work_html):
+    # Every work page is checked for the interstitial and for being
+    # restricted, and an ordinary work has to be read to the end to find
+    # that it's neither.
+    def check():
+        assert not is_adult_interstitial(work_html)
+        check_not_restricted('258626', work_html)
+
+    benchmark(check)
+
+
+@pytest.mark.parametrize('name', PROPERTIES)
+def test_first_property_access(benchmark, parser, name, fixture_html):
+    # The first property we look at pays for extracting the metadata, so
+    # each round gets a freshly parsed work.
+    html = fixture_html('work.html')
+    benchmark.pedantic(
+        getattr,
+        setup=lambda: ((Work('258626', html=html, parser=parser), name), {}),
+        rounds=200)
+
+
+def test_json(benchmark, parser, work_html):
+    benchmark.pedantic(
+        lambda work: work.json(),
+        setup=lambda: ((Work('258626', html=work_html, parser=parser),), {}),
+        rounds=5)
+
+
+@pytest.mark.parametrize('metadata_only', [False, True])
+def test_kudos_left_by(benchmark, parser, work_html, metadata_only):
+    benchmark.pedantic(
+        lambda work: list(work.kudos_left_by),
+        setup=lambda: ((Work(
+            '258626', html=work_html, parser=parser,
+            metadata_only=metadata_only),), {}),
+        rounds=5)
+
+
+def test_kudos_scanner(benchmark, work_html):
+    def scan():
+        scanner = KudosScanner()
+        scanner.feed(work_html)
+        scanner.close()
+        return scanner.drain()
+
+    benchmark(scan)
+
+
+def test_bookmarks_page(benchmark, parser, fixture_html):
+    benchmark(parser.bookmarks_page, fixture_html('bookmarks.html'))
+
+
+def test_readings_page(benchmark, parser, fixture_html):
+    benchmark(parser.readings_page, fixture_html('readings.html'))
@@ -44,5 +44,15 @@ setup(
     install_requires=[
         'beautifulsoup4>=4.5.3, <5',
         'requests>=2.12.4, <3',
+        'futures>=3.0.5; python_version < "3"',
     ],
+    extras_require={
+        'async': ['aiohttp>=3.0, <4'],
+        'export': ['pyarrow'],
+        'lxml': ['lxml'],
+        'selectolax': ['selectolax>=0.3.12'],
+    },
+    entry_points={
+        'console_scripts': ['ao3 = ao3.cli:main'],
+    },
 )
@@ -1,33 +1,67 @@
 # -*- encoding: utf-8
+"""A Python API for scraping AO3 (the Archive of Our Own).
 
-import requests
-from . import utils
-from .users import User
-from .works import Work
+    >>> from ao3 import AO3
+    >>> api = AO3()
+    >>> work = api.work(id='258626')
 
-class AO3(object):
-    """A scraper for the Archive of Our Own (AO3)."""
+Importing ``ao3`` doesn't import anything else: the names below, the
+submodules (``ao3.works`` and so on), and requests and BeautifulSoup, are
+only imported the first time you use one of them.  That keeps short-lived
+programs like the ``ao3`` command (see ``ao3.cli``) quick to start.
+"""
 
-    def __init__(self):
-        self.user = None
-        self.session = requests.Session()
+import importlib
+import sys
 
-    def __repr__(self):
-        return '%s()' % (type(self).__name__)
+# The names you can import from ``ao3``, and the modules they live in.
+_EXPORTS = {
+    'AO3': 'api',
+    'CounterSink': 'metrics',
+    'Instrumentation': 'metrics',
+    'LoggingSink': 'metrics',
+    'PageCache': 'cache',
+    'RateLimiter': 'ratelimit',
+    'RestrictedWork': 'works',
+    'User': 'users',
+    'Work': 'works',
+    'WorkBlurb': 'works',
+    'WorkIndex': 'index',
+    'WorkNotFound': 'works',
+}
 
-    def work(self, id):
-        """Look up a work that's been posted to AO3.
+# The submodules, which used to be imported along with ``ao3`` -- so code
+# that does ``import ao3`` and then uses ``ao3.works`` keeps working.
+_SUBMODULES = set([
+    'aio', 'api', 'cache', 'cli', 'export', 'index', 'memo', 'metrics',
+    'parsers', 'pipeline', 'ratelimit', 'search', 'sync', 'users', 'utils',
+    'works',
+])
 
-        :param id: the work ID.  In the URL to a work, this is the number.
-            e.g. the work ID of http://archiveofourown.org/works/1234 is 1234.
-        """
-        return Work(id=id, sess=self.session)
+__all__ = sorted(_EXPORTS)
 
-    def login(self, username, password):
-        """Log in to the archive.
 
-        This allows you to access pages that are only available while
-        logged in.  This doesn't do any checking that the password is correct.
+def __getattr__(name):
+    if name in _EXPORTS:
+        module = importlib.import_module('.' + _EXPORTS[name], __name__)
+        value = getattr(module, name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name))
 
-        """
-        self.user = User(username=username, password=password, sess=self.session)
+    # Remember it, so we don't come through here again.
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | _SUBMODULES)
+
+
+# Modules can't define ``__getattr__`` before Python 3.7, so import
+# everything up front.
+if sys.version_info < (3, 7):  # pragma: no cover
+    for _name in __all__:
+        __getattr__(_name)
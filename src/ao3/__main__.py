@@ -0,0 +1,8 @@
+# -*- encoding: utf-8
+"""Lets you run the ``ao3`` command as ``python -m ao3``."""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,266 @@
+# -*- encoding: utf-8
+"""An asyncio interface to AO3.
+
+This mirrors the ``AO3`` and ``User`` classes, but does its network I/O on
+an event loop with aiohttp, so you can have many requests in flight without
+a thread for each one.  All the HTML parsing is shared with the blocking
+classes, so the works you get back are ordinary ``Work`` instances.
+
+This needs Python 3.6+ and aiohttp (``pip install ao3[async]``).
+"""
+
+import asyncio
+import itertools
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .memo import LRUCache
+from .parsers import get_parser
+from .utils import AO3_URL
+from .users import (
+    check_logged_in, parse_authenticity_token, parse_bookmarks_page,
+    parse_readings_page
+)
+from .works import (
+    RestrictedWork, Work, WorkNotFound, check_not_restricted,
+    check_work_response, is_adult_interstitial, work_url
+)
+
+
+class AsyncAO3(object):
+    """An asyncio scraper for the Archive of Our Own (AO3).
+
+    Use it as an async context manager, so the underlying connections get
+    cleaned up afterwards:
+
+        async with AsyncAO3() as api:
+            work = await api.work('258626')
+
+    :param max_connections: the maximum number of requests to have in
+        flight at once.
+    :param parser: the HTML parser backend, as for ``AO3``.
+    :param base_url: the address of AO3, as for ``AO3``.
+    :param memo_size: how many fetched works to remember, as for ``AO3``.
+    """
+
+    def __init__(self, max_connections=100, parser=None, base_url=AO3_URL,
+                 memo_size=128):
+        if aiohttp is None:
+            raise RuntimeError(
+                'AsyncAO3 requires aiohttp; install it with '
+                '`pip install ao3[async]`')
+        self.user = None
+        self.max_connections = max_connections
+        self.parser = get_parser(parser)
+        self.base_url = base_url.rstrip('/')
+        self.memo = LRUCache(memo_size)
+        self._in_flight = {}
+        self._session = None
+
+    @property
+    def session(self):
+        """The aiohttp session used for all requests.
+
+        This is created on first use, because aiohttp needs to be running
+        inside an event loop when it's created.
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections))
+        return self._session
+
+    def __repr__(self):
+        return '%s()' % (type(self).__name__)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close all the connections held by this instance."""
+        if self._session is not None:
+            await self._session.close()
+
+    async def _get(self, url):
+        async with self.session.get(url) as resp:
+            return resp.status, await resp.text()
+
+    async def work(self, id):
+        """Look up a work that's been posted to AO3.
+
+        :param id: the work ID.  In the URL to a work, this is the number.
+            e.g. the work ID of http://archiveofourown.org/works/1234 is 1234.
+
+        If this work was fetched recently, or another task is already
+        fetching it, you get the same ``Work`` back.
+        """
+        key = str(id)
+        work = self.memo.get(key)
+        if work is not None:
+            return work
+
+        # Every task that wants this work waits on the same fetch.  It's
+        # shielded, so if one of them is cancelled, the others still get
+        # their work.
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(
+                self._fetch_work(id))
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_work(self, id):
+        status, html = await self._get(
+            work_url(id, base_url=self.base_url))
+        check_work_response(id, status, html)
+
+        if is_adult_interstitial(html):
+            status, html = await self._get(
+                work_url(id, view_adult=True, base_url=self.base_url))
+
+        check_not_restricted(id, html)
+        work = Work(id=id, html=html, parser=self.parser,
+                    base_url=self.base_url)
+        self.memo.put(str(id), work)
+        return work
+
+    async def works(self, ids, ordered=True, on_error=None):
+        """Look up a batch of works, fetching several of them at once.
+
+        This is an async generator of ``Work`` instances, and takes the same
+        arguments as ``AO3.works()``.  Up to ``max_connections`` works are
+        fetched at once.
+        """
+        window = self.max_connections
+        ids = iter(ids)
+
+        def submit(work_id):
+            return asyncio.ensure_future(self.work(work_id)), work_id
+
+        pending = [
+            submit(work_id) for work_id in itertools.islice(ids, window)]
+        try:
+            while pending:
+                if ordered:
+                    task, work_id = pending.pop(0)
+                    await asyncio.wait([task])
+                else:
+                    done, _ = await asyncio.wait(
+                        [t for t, _ in pending],
+                        return_when=asyncio.FIRST_COMPLETED)
+                    idx = next(
+                        i for i, (t, _) in enumerate(pending) if t in done)
+                    task, work_id = pending.pop(idx)
+
+                for next_id in itertools.islice(ids, 1):
+                    pending.append(submit(next_id))
+
+                try:
+                    yield task.result()
+                except (RestrictedWork, WorkNotFound) as exc:
+                    if on_error is not None:
+                        on_error(work_id, exc)
+        finally:
+            for task, _ in pending:
+                task.cancel()
+
+    async def login(self, username, password):
+        """Log in to the archive.
+
+        This allows you to access pages that are only available while
+        logged in.  This doesn't do any checking that the password is correct.
+
+        """
+        _, html = await self._get(self.base_url)
+        authenticity_token = parse_authenticity_token(html)
+
+        async with self.session.post(
+                self.base_url + '/user_sessions', params={
+                    'authenticity_token': authenticity_token,
+                    'user_session[login]': username,
+                    'user_session[password]': password,
+                }) as resp:
+            check_logged_in(await resp.text())
+
+        self.user = AsyncUser(username=username, api=self)
+        return self.user
+
+
+class AsyncUser(object):
+    """The asyncio counterpart to ``User``.
+
+    You get one of these by calling ``AsyncAO3.login()``.
+    """
+
+    def __init__(self, username, api):
+        self.username = username
+        self.api = api
+
+    def __repr__(self):
+        return '%s(username=%r)' % (type(self).__name__, self.username)
+
+    async def _iter_listing(self, api_url, parse_page):
+        """Generates every item in a paginated listing, in order.
+
+        This works like ``User._iter_listing()``: once we know how many
+        pages there are, all the rest are requested at once.
+        """
+        _, html = await self.api._get(api_url % 1)
+        page = parse_page(html, self.api.parser)
+        for item in page.items:
+            yield item
+        page_no = 1
+
+        async def fetch_page(n):
+            _, html = await self.api._get(api_url % n)
+            return parse_page(html, self.api.parser)
+
+        if page.has_next_page and page.page_count:
+            tasks = [
+                asyncio.ensure_future(fetch_page(n))
+                for n in range(2, page.page_count + 1)]
+            try:
+                for page_no, task in enumerate(tasks, start=2):
+                    page = await task
+                    for item in page.items:
+                        yield item
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        while page.has_next_page:
+            page_no += 1
+            page = await fetch_page(page_no)
+            for item in page.items:
+                yield item
+
+    async def bookmarks_ids(self):
+        """
+        Returns a list of the user's bookmarks' ids. Ignores external work
+        bookmarks.
+        """
+        api_url = (
+            '%s/users/%s/bookmarks?page=%%d'
+            % (self.api.base_url, self.username))
+
+        return [
+            work_id async for work_id in self._iter_listing(
+                api_url, parse_bookmarks_page)]
+
+    async def reading_history(self):
+        """Returns the entries in the user's reading history.
+
+        This is an async generator of ``ReadingHistoryItem`` instances,
+        a 2-tuple ``(work_id, last_read)``.
+        """
+        api_url = (
+            '%s/users/%s/readings?page=%%d' %
+            (self.api.base_url, self.username))
+
+        async for entry in self._iter_listing(api_url, parse_readings_page):
+            yield entry
@@ -0,0 +1,377 @@
+# -*- encoding: utf-8
+"""The ``AO3`` class, which is the starting point for using the API.
+
+This is where requests and BeautifulSoup get imported, so ``ao3`` doesn't
+import this module until you ask for ``ao3.AO3``.  The optional features
+(the page cache, the rate limiter, exporting and the process pipeline) are
+only imported when they're used, so creating an ``AO3`` stays quick.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import utils
+from .memo import LRUCache, SingleFlight, work_key
+from .metrics import Instrumentation, InstrumentedAdapter, InstrumentedParser
+from .parsers import get_parser
+from . import search
+from .users import User
+from .works import RestrictedWork, Work, WorkNotFound
+
+
+def _memo_key(work):
+    return work_key(work.id, work._metadata_only, work._low_memory)
+
+
+class AO3(object):
+    """A scraper for the Archive of Our Own (AO3).
+
+    :param cache: an optional ``PageCache``.  If supplied, pages are
+        stored there and only fetched again when they've expired or changed.
+    :param parser: the HTML parser backend: ``'html.parser'`` (the default),
+        ``'lxml'`` or ``'selectolax'``.  See ``ao3.parsers``.
+    :param rate_limiter: an optional ``RateLimiter``, which spaces out
+        requests and retries them if AO3 says we're going too fast.
+    :param base_url: the address of AO3.  You only need to change this if
+        you're pointing the API at a local stand-in, e.g. for testing.
+    :param sinks: an optional list of sinks for the events in
+        ``ao3.metrics``, which report how long requests and parsing take.
+        You can add more later with ``instrumentation.add_sink()``.
+    :param index: an optional ``WorkIndex``.  If supplied, the metadata
+        for every work fetched by ``work()``, ``works()`` and ``prefetch()``
+        is saved there, so you can search it later without going back to
+        AO3.
+    :param memo_size: how many fetched works to remember.  Asking for one
+        of them again returns the same ``Work``, without going back to
+        AO3.  Pass 0 to turn this off.
+    """
+
+    def __init__(self, cache=None, parser=None, rate_limiter=None,
+                 base_url=utils.AO3_URL, sinks=None, index=None,
+                 memo_size=128):
+        self.user = None
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.index = index
+        self.instrumentation = Instrumentation(sinks)
+        self.parser = InstrumentedParser(
+            get_parser(parser), self.instrumentation)
+        self.rate_limiter = rate_limiter
+        self.session = requests.Session()
+
+        # If several threads ask for the same work at once, only one of them
+        # fetches it, and the rest share the result.  See ``ao3.memo``.
+        self.memo = LRUCache(memo_size)
+        self._in_flight = SingleFlight()
+
+        # Each feature wraps the transport adapter below it, so a request
+        # is looked up in the cache first, then waits for the rate limiter,
+        # then goes over the network.  The instrumentation goes outside
+        # all of them, so it sees what the caller sees.
+        adapter = HTTPAdapter()
+        if rate_limiter is not None:
+            from .ratelimit import RateLimitedAdapter
+            adapter = RateLimitedAdapter(rate_limiter, adapter=adapter)
+        if cache is not None:
+            from .cache import CachingAdapter
+            adapter = CachingAdapter(cache, adapter=adapter)
+        adapter = InstrumentedAdapter(self.instrumentation, adapter=adapter)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __repr__(self):
+        return '%s()' % (type(self).__name__)
+
+    def work(self, id, lazy=False, metadata_only=False, low_memory=False):
+        """Look up a work that's been posted to AO3.
+
+        :param id: the work ID.  In the URL to a work, this is the number.
+            e.g. the work ID of http://archiveofourown.org/works/1234 is 1234.
+        :param lazy: if True, don't fetch the work until you look at one of
+            its properties (other than ``id`` and ``url``).
+        :param metadata_only: if True, only parse the parts of the page with
+            the work's metadata, and skip the text of the work.  This is
+            much faster for long works.
+        :param low_memory: if True, extract everything from the page as soon
+            as it's fetched, and don't keep the page.  See ``Work``.
+
+        If this work was fetched recently with the same options, or another
+        thread is already fetching it, you get the same ``Work`` back.
+        """
+        if lazy:
+            work = self.memo.get(work_key(id, metadata_only, low_memory))
+            if work is None:
+                work = Work(id=id, sess=self.session, lazy=True,
+                            parser=self.parser, metadata_only=metadata_only,
+                            base_url=self.base_url, low_memory=low_memory)
+            return work
+        work = self._fetch_work(
+            id, metadata_only=metadata_only, low_memory=low_memory)
+        self._add_to_index(work)
+        return work
+
+    def _fetch_work(self, id, metadata_only=False, low_memory=False):
+        key = work_key(id, metadata_only, low_memory)
+        work = self.memo.get(key)
+        if work is not None and work.is_loaded:
+            return work
+
+        def fetch():
+            # Another thread might have finished fetching this work between
+            # us checking the memo and getting here.  The memo can also
+            # have works that haven't been fetched yet, like the ones from
+            # ``check_kudos()``.
+            work = self.memo.get(key)
+            if work is None:
+                work = Work(id=id, sess=self.session, lazy=True,
+                            parser=self.parser, metadata_only=metadata_only,
+                            base_url=self.base_url, low_memory=low_memory)
+            work.prefetch()
+            self.memo.put(key, work)
+            return work
+
+        return self._in_flight.do(key, fetch)
+
+    def _add_to_index(self, work):
+        if self.index is not None:
+            self.index.add(work)
+
+    def works(self, ids, max_workers=8, ordered=True, on_error=None,
+              metadata_only=False, low_memory=False):
+        """Look up a batch of works, fetching several of them at once.
+
+        This generates a series of ``Work`` instances.  The works are
+        fetched on a pool of threads that share this instance's session,
+        which is much faster than calling ``work()`` in a loop.  If the same
+        ID comes up more than once, it's only fetched once.
+
+        :param ids: an iterable of work IDs.
+        :param max_workers: the maximum number of works to fetch at once.
+        :param ordered: if True, works are returned in the same order as
+            ``ids``.  If False, they're returned as soon as they've been
+            fetched.
+        :param on_error: called as ``on_error(work_id, exc)`` for any work
+            that raises ``WorkNotFound`` or ``RestrictedWork``.  These works
+            are skipped, and the rest of the batch carries on.  Any other
+            error is raised immediately.
+        :param metadata_only: as for ``work()``.
+        :param low_memory: as for ``work()``.
+        """
+        results = utils.threaded_map(
+            lambda work_id: self._fetch_work(
+                work_id, metadata_only=metadata_only, low_memory=low_memory),
+            ids,
+            max_workers=max_workers,
+            ordered=ordered)
+        for work_id, future in results:
+            try:
+                work = future.result()
+            except (RestrictedWork, WorkNotFound) as exc:
+                if on_error is not None:
+                    on_error(work_id, exc)
+            else:
+                self._add_to_index(work)
+                yield work
+
+    def pipeline(self, ids, max_workers=8, processes=None, on_error=None):
+        """Look up a batch of works, parsing them on a pool of processes.
+
+        Like ``works()`` in metadata-only mode, but the pages are parsed
+        in ``processes`` separate processes (one per CPU by default), so
+        parsing isn't limited to a single core.  Use this when you're
+        fetching so many works that parsing is the bottleneck.  The works
+        come back in the order they finish.  See ``ao3.pipeline``.
+
+        :param ids: an iterable of work IDs.
+        :param max_workers: the number of threads downloading pages.
+        :param processes: the number of processes parsing pages.
+        :param on_error: as for ``works()``.
+        """
+        from .pipeline import pipeline_works
+
+        for work in pipeline_works(
+                ids, sess=self.session, parser=self.parser,
+                base_url=self.base_url, max_workers=max_workers,
+                processes=processes, on_error=on_error):
+            self._add_to_index(work)
+            yield work
+
+    def prefetch(self, works, max_workers=8, on_error=None):
+        """Fetch a batch of lazy works, several at once.
+
+        Use this when you know you're going to need the contents of a batch
+        of works created with ``lazy=True``.  Works that have already been
+        fetched are skipped.
+
+        :param works: an iterable of ``Work`` instances.
+        :param on_error: called as ``on_error(work, exc)`` for any work
+            that raises ``WorkNotFound`` or ``RestrictedWork``.
+        """
+        results = utils.threaded_map(
+            lambda work: work.prefetch(),
+            (work for work in works if not work.is_loaded),
+            max_workers=max_workers)
+        for work, future in results:
+            try:
+                future.result()
+            except (RestrictedWork, WorkNotFound) as exc:
+                if on_error is not None:
+                    on_error(work, exc)
+            else:
+                self.memo.put(_memo_key(work), work)
+                self._add_to_index(work)
+
+    def check_kudos(self, username, ids, max_workers=8, ordered=True,
+                    on_error=None):
+        """Find out whether a user left kudos on each of a batch of works.
+
+        This generates ``(work_id, left_kudos)`` pairs.  Each work's kudos
+        pages are scanned on a pool of threads, stopping as soon as the
+        user turns up (see ``Work.kudos_from()``), so this doesn't fetch or
+        parse the work pages at all.  Works this instance has already seen
+        are checked first, and a work whose kudos have been read in full
+        won't be scanned again.
+
+        :param username: the user to look for.
+        :param ids: an iterable of work IDs.
+        :param ordered: as for ``works()``.
+        :param on_error: called as ``on_error(work_id, exc)`` for any work
+            that raises ``WorkNotFound`` or ``RestrictedWork``.  These works
+            are skipped.
+        """
+        def check(work_id):
+            work = self.work(work_id, lazy=True)
+            left_kudos = work.has_kudos_from(username)
+            self.memo.put(work_key(work_id), work)
+            return left_kudos
+
+        results = utils.threaded_map(
+            check, ids, max_workers=max_workers, ordered=ordered)
+        for work_id, future in results:
+            try:
+                left_kudos = future.result()
+            except (RestrictedWork, WorkNotFound) as exc:
+                if on_error is not None:
+                    on_error(work_id, exc)
+            else:
+                yield work_id, left_kudos
+
+    def export(self, ids, f, format='ndjson', batch_size=500, max_workers=8,
+               on_error=None, processes=None):
+        """Export the metadata for a batch of works to a file.
+
+        The works are fetched in metadata-only mode on a pool of threads,
+        and written in batches as they arrive, so this uses constant memory
+        however many works there are.  See ``ao3.export`` for the formats.
+
+        :param ids: an iterable of work IDs.
+        :param f: the file to write to, as for ``export_works()``.
+        :param on_error: as for ``works()``.
+        :param processes: if given, parse the pages on this many processes
+            with ``pipeline()``, rather than on the fetching threads.
+        :returns: the number of works written.
+        """
+        from .export import export_works
+
+        if processes is not None:
+            works = self.pipeline(
+                ids, max_workers=max_workers, processes=processes,
+                on_error=on_error)
+        else:
+            works = self.works(
+                ids, max_workers=max_workers, ordered=False,
+                on_error=on_error, metadata_only=True)
+        return export_works(works, f, format=format, batch_size=batch_size)
+
+    def tag_works(self, tag, sort_by=None, sort_direction=None,
+                  complete=None, crossover=None, words_from=None,
+                  words_to=None, updated_from=None, updated_to=None,
+                  language=None, include_tags=None, exclude_tags=None,
+                  query=None, max_workers=4):
+        """List the works with a tag, like the tag's works page on AO3.
+
+        This generates a ``WorkBlurb`` for each work, read from the
+        listing pages, so it only makes one request per page of twenty
+        works.  The filters are applied by AO3, as if you'd used the
+        "Sort and Filter" form.  See ``ao3.search``.
+
+        :param tag: the name of the tag, e.g. ``'Star Wars - All Media
+            Types'``.
+        :param sort_by: one of the keys of ``ao3.search.SORT_COLUMNS``, e.g.
+            ``'kudos'``.  AO3 sorts by date updated by default.
+        :param sort_direction: ``'asc'`` or ``'desc'``.
+        :param complete: if True, only complete works; if False, only
+            works in progress.
+        :param crossover: if True, only crossovers; if False, no
+            crossovers.
+        :param words_from: the fewest words a work can have.
+        :param words_to: the most words a work can have.
+        :param updated_from: the earliest date a work was last updated.
+        :param updated_to: the latest date a work was last updated.
+        :param language: an AO3 language code, e.g. ``'en'``.
+        :param include_tags: a list of other tags the works must have.
+        :param exclude_tags: a list of tags the works mustn't have.
+        :param query: search within the results.
+        :param max_workers: how many pages to fetch at once.
+        """
+        return search.tag_works(
+            tag, sess=self.session, parser=self.parser,
+            base_url=self.base_url, max_workers=max_workers,
+            sort_by=sort_by, sort_direction=sort_direction,
+            complete=complete, crossover=crossover, words_from=words_from,
+            words_to=words_to, updated_from=updated_from,
+            updated_to=updated_to, language=language,
+            include_tags=include_tags, exclude_tags=exclude_tags,
+            query=query)
+
+    def search_works(self, query=None, title=None, creators=None,
+                     fandoms=None, characters=None, relationships=None,
+                     tags=None, complete=None, crossover=None,
+                     single_chapter=None, words=None, hits=None, kudos=None,
+                     comments=None, bookmarks=None, updated=None,
+                     language=None, sort_by=None, sort_direction=None,
+                     max_workers=4):
+        """Search for works, like the works search on AO3.
+
+        This generates a ``WorkBlurb`` for each result, as for
+        ``tag_works()``.  The numeric and date fields take AO3's search
+        syntax, e.g. ``words='1000-5000'``, ``kudos='>100'`` or
+        ``updated='< 2 weeks'``.
+
+        :param query: any text, searched for in all the fields.
+        :param title: the title of the work.
+        :param creators: the names of the authors.
+        :param fandoms: a list of fandom tags.
+        :param characters: a list of character tags.
+        :param relationships: a list of relationship tags.
+        :param tags: a list of additional tags.
+        :param complete: if True, only complete works; if False, only
+            works in progress.
+        :param crossover: if True, only crossovers; if False, no
+            crossovers.
+        :param single_chapter: if True, only single-chapter works.
+        :param language: an AO3 language code, e.g. ``'en'``.
+        :param sort_by: as for ``tag_works()``.
+        :param sort_direction: as for ``tag_works()``.
+        :param max_workers: how many pages to fetch at once.
+        """
+        return search.search_works(
+            sess=self.session, parser=self.parser, base_url=self.base_url,
+            max_workers=max_workers, query=query, title=title,
+            creators=creators, fandoms=fandoms, characters=characters,
+            relationships=relationships, tags=tags, complete=complete,
+            crossover=crossover, single_chapter=single_chapter, words=words,
+            hits=hits, kudos=kudos, comments=comments, bookmarks=bookmarks,
+            updated=updated, language=language, sort_by=sort_by,
+            sort_direction=sort_direction)
+
+    def login(self, username, password):
+        """Log in to the archive.
+
+        This allows you to access pages that are only available while
+        logged in.  This doesn't do any checking that the password is correct.
+
+        """
+        self.user = User(username=username, password=password,
+                         sess=self.session, parser=self.parser,
+                         base_url=self.base_url)
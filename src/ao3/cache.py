@@ -0,0 +1,232 @@
+# -*- encoding: utf-8
+"""An on-disk cache for pages fetched from AO3.
+
+Most pages on AO3 don't change very often, so there's no point fetching
+them again every time a script runs.  ``PageCache`` stores responses in
+an SQLite database, keyed by URL, and ``CachingAdapter`` plugs it into a
+``requests.Session``:
+
+    >>> api = AO3(cache=PageCache('ao3-cache.sqlite'))
+
+Each kind of page (works, bookmarks, reading history) can have its own
+time-to-live.  A cached page that's younger than its TTL is returned
+without touching the network.  Once it's older, we ask AO3 if it's changed
+(using the ETag and Last-Modified headers), and only download it again
+if it has.
+
+Only works and listings (bookmarks, reading history, tags and searches) are
+cached.  Nothing else is -- in particular, not the front page we fetch to
+log in, which has a fresh CSRF token every time.  Once a session has logged
+in, its pages are personal, so it stops using the cache altogether.
+"""
+
+import collections
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .utils import URL_KINDS, url_kind
+
+# The kinds of page that are worth caching: everything but 'default'.
+CACHED_KINDS = set(kind for kind, _ in URL_KINDS)
+
+# Logging in posts to this URL.
+_LOGIN_URL = re.compile(r'/user_sessions')
+
+# Headers that only make sense for the response they came with.
+_UNCACHED_HEADERS = set(['set-cookie'])
+
+
+class PageCache(object):
+    """A cache of AO3 pages, stored in an SQLite database.
+
+    :param path: path to the database file.  Use ``':memory:'`` for a cache
+        that only lasts as long as the process.
+    :param ttl: how long (in seconds) a cached page can be used without
+        checking if it's changed.
+    :param ttls: a dict of TTLs for particular kinds of page, which override
+        ``ttl``.  The keys are ``'work'``, ``'bookmarks'``, ``'readings'``,
+        ``'tag_works'``, ``'search'`` and ``'default'``.
+
+    The ``stats`` attribute counts how often the cache was useful:
+    ``hits`` (served straight from the cache), ``revalidated`` (AO3 told
+    us the cached copy was still good) and ``misses`` (we had to download
+    the page).
+    """
+
+    def __init__(self, path, ttl=3600, ttls=None):
+        self.path = path
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.stats = collections.Counter(hits=0, revalidated=0, misses=0)
+
+        # The cache is shared by all the threads using a session, so we
+        # serialise access to the connection ourselves.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                '  url TEXT PRIMARY KEY,'
+                '  status_code INTEGER,'
+                '  headers TEXT,'
+                '  content BLOB,'
+                '  stored_at REAL'
+                ')')
+
+    def __repr__(self):
+        return '%s(path=%r)' % (type(self).__name__, self.path)
+
+    def ttl_for(self, url):
+        """Returns the TTL (in seconds) for a URL."""
+        return self.ttls.get(url_kind(url), self.ttl)
+
+    def get(self, url):
+        """Returns the cached ``(response, age)`` for a URL, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status_code, headers, content, stored_at '
+                'FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        status_code, headers, content, stored_at = row
+
+        resp = Response()
+        resp.url = url
+        resp.status_code = status_code
+        resp.headers = CaseInsensitiveDict(json.loads(headers))
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp._content = bytes(content)
+        resp._content_consumed = True
+        return resp, time.time() - stored_at
+
+    def record(self, outcome):
+        """Count a cache hit, revalidation or miss."""
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def set(self, url, resp):
+        """Store a response in the cache."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)', (
+                    url,
+                    resp.status_code,
+                    json.dumps(dict(
+                        (name, value) for name, value in resp.headers.items()
+                        if name.lower() not in _UNCACHED_HEADERS)),
+                    sqlite3.Binary(resp.content),
+                    time.time(),
+                ))
+
+    def touch(self, url):
+        """Mark a cached page as fresh, after AO3 says it hasn't changed."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE pages SET stored_at = ? WHERE url = ?',
+                (time.time(), url))
+
+    def clear(self):
+        """Remove every page from the cache."""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM pages')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _conditional_request(request, cached_resp):
+    """If we know a stale page's ETag or Last-Modified date, returns a copy
+    of the request that asks AO3 to only send the page if it's changed."""
+    etag = cached_resp.headers.get('ETag')
+    last_modified = cached_resp.headers.get('Last-Modified')
+    if not (etag or last_modified):
+        return request
+    request = request.copy()
+    if etag:
+        request.headers['If-None-Match'] = etag
+    if last_modified:
+        request.headers['If-Modified-Since'] = last_modified
+    return request
+
+
+class CachingAdapter(BaseAdapter):
+    """A transport adapter that answers GET requests from a ``PageCache``.
+
+    Anything that isn't in the cache (or has changed) is passed through to
+    ``adapter``, which defaults to a plain ``HTTPAdapter``.  GET responses
+    record whether they were a ``'hit'``, ``'revalidated'`` or ``'miss'`` in
+    their ``cache_status``, for ``ao3.metrics``; requests that skip the
+    cache don't have one.
+
+    Only the kinds of page in ``CACHED_KINDS`` are cached, streamed
+    requests skip the cache, and once this adapter has sent a login
+    request, nothing is cached.
+    """
+
+    def __init__(self, cache, adapter=None):
+        super(CachingAdapter, self).__init__()
+        self.cache = cache
+        self.adapter = adapter or HTTPAdapter()
+        self.logged_in = False
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            if _LOGIN_URL.search(request.url):
+                self.logged_in = True
+            return self.adapter.send(request, **kwargs)
+
+        # Streamed responses are read a bit at a time, so they never have
+        # to be in memory all at once (e.g. ``Work.iter_kudos()``).  Caching
+        # one would mean reading the whole thing first.
+        url = request.url
+        if (self.logged_in or kwargs.get('stream') or
+                url_kind(url) not in CACHED_KINDS):
+            return self.adapter.send(request, **kwargs)
+
+        cached = self.cache.get(url)
+        if cached is not None:
+            cached_resp, age = cached
+            if age < self.cache.ttl_for(url):
+                self.cache.record('hits')
+                cached_resp.cache_status = 'hit'
+                return self._from_cache(cached_resp, request)
+            request = _conditional_request(request, cached_resp)
+
+        resp = self.adapter.send(request, **kwargs)
+
+        if resp.status_code == 304 and cached is not None:
+            return self._revalidated(resp, cached[0], request)
+
+        self.cache.record('misses')
+        resp.cache_status = 'miss'
+        if resp.status_code == 200:
+            self.cache.set(url, resp)
+        return resp
+
+    def _revalidated(self, resp, cached_resp, request):
+        # AO3 says our copy is still good, so we use it, but keep what the
+        # adapters below us recorded about the request.
+        self.cache.record('revalidated')
+        self.cache.touch(request.url)
+        cached_resp.cache_status = 'revalidated'
+        for name in ('retries', 'rate_limit_wait'):
+            if hasattr(resp, name):
+                setattr(cached_resp, name, getattr(resp, name))
+        return self._from_cache(cached_resp, request)
+
+    def _from_cache(self, resp, request):
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self):
+        self.adapter.close()
@@ -0,0 +1,145 @@
+# -*- encoding: utf-8
+"""The ``ao3`` command.
+
+    $ ao3 work 258626 > work.json
+    $ ao3 bookmarks USERNAME > bookmarks.txt
+    $ ao3 history USERNAME | head
+    $ ao3 export works.parquet --ids bookmarks.txt
+
+``work`` prints the metadata for each work as a line of JSON, ``bookmarks``
+prints a user's bookmarked work IDs, one per line, and ``history`` prints
+their reading history as ``work_id<TAB>last_read``.  ``export`` takes the
+same options as ``python -m ao3.export``.  Commands that need you to log in
+read the password from ``$AO3_PASSWORD``, or ask for it.
+
+The command is meant to be run over and over from scripts, so this module
+only imports the standard library.  The rest of the API (and requests and
+BeautifulSoup) isn't imported until a command actually runs -- so
+``ao3 --help``, or a mistyped command, doesn't pay for it.
+"""
+
+from __future__ import print_function
+
+import argparse
+import getpass
+import os
+import sys
+
+from .export import (
+    add_export_arguments, check_export_arguments, run_export
+)
+
+# The names you can pass to ``--parser``; see ``ao3.parsers.get_parser()``.
+# We don't import ``ao3.parsers`` to find out, because it imports
+# BeautifulSoup.
+PARSERS = ['html.parser', 'lxml', 'selectolax']
+
+
+def _login(api, username):
+    password = os.environ.get('AO3_PASSWORD') or getpass.getpass()
+    api.login(username, password)
+
+
+def _skip(work_id, exc):
+    print('Skipping %s: %s' % (work_id, exc), file=sys.stderr)
+
+
+def cmd_work(api, args):
+    errors = []
+
+    def on_error(work_id, exc):
+        errors.append(work_id)
+        _skip(work_id, exc)
+
+    for work in api.works(args.ids, on_error=on_error, metadata_only=True):
+        print(work.json(sort_keys=True))
+    return 1 if errors else 0
+
+
+def cmd_bookmarks(api, args):
+    _login(api, args.username)
+    for work_id in api.user.bookmarks_ids(max_workers=args.max_workers):
+        print(work_id)
+    return 0
+
+
+def cmd_history(api, args):
+    _login(api, args.username)
+    for entry in api.user.reading_history(max_workers=args.max_workers):
+        print('%s\t%s' % (entry.work_id, entry.last_read))
+    return 0
+
+
+def cmd_export(api, args):
+    count = run_export(api, args)
+    print('Exported %d works' % count, file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    """Returns the ``argparse`` parser for the ``ao3`` command."""
+    parser = argparse.ArgumentParser(
+        prog='ao3', description='Scrape works and users from AO3.')
+    parser.add_argument(
+        '--parser', choices=PARSERS,
+        help='the HTML parser to use (default: html.parser)')
+    parser.add_argument(
+        '--cache', metavar='FILE',
+        help='keep the pages that are fetched in this SQLite database, '
+             'and reuse them next time')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+
+    work = subparsers.add_parser(
+        'work', help='print the metadata for works as JSON, one per line')
+    work.add_argument('ids', nargs='+', metavar='ID', help='a work ID')
+    work.set_defaults(func=cmd_work)
+
+    bookmarks = subparsers.add_parser(
+        'bookmarks', help="print the IDs of a user's bookmarked works")
+    bookmarks.add_argument('username')
+    bookmarks.add_argument('--max-workers', type=int, default=4)
+    bookmarks.set_defaults(func=cmd_bookmarks)
+
+    history = subparsers.add_parser(
+        'history', help="print a user's reading history")
+    history.add_argument('username')
+    history.add_argument('--max-workers', type=int, default=1)
+    history.set_defaults(func=cmd_history)
+
+    export = subparsers.add_parser(
+        'export', help='export the metadata for a batch of works')
+    add_export_arguments(export)
+    export.set_defaults(func=cmd_export)
+
+    return parser
+
+
+def make_api(args):
+    """Returns an ``AO3`` instance set up from the command-line options."""
+    from . import AO3
+
+    cache = None
+    if args.cache:
+        from .cache import PageCache
+        cache = PageCache(args.cache)
+    return AO3(cache=cache, parser=args.parser)
+
+
+def main(argv=None, api=None):
+    """Run the ``ao3`` command, and return its exit status.
+
+    :param api: the ``AO3`` instance to use.  By default, one is created
+        from the options.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        check_export_arguments(parser, args)
+    if api is None:
+        api = make_api(args)
+    return args.func(api, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,302 @@
+# -*- encoding: utf-8
+"""Exporting works in bulk, for analysis.
+
+``export_works()`` takes an iterable of works and streams their metadata to
+a file, a batch at a time, so it uses the same amount of memory whether
+you export ten works or a hundred thousand.  ``AO3.export()`` is the easy
+way to use it -- the works are fetched on a pool of threads while earlier
+batches are being written:
+
+    >>> api.export(work_ids, 'works.parquet')
+
+There are three formats:
+
+*   ``'ndjson'``: one JSON object per line
+*   ``'parquet'``: an Apache Parquet file
+*   ``'arrow'``: an Arrow IPC stream
+
+Parquet and Arrow need pyarrow (``pip install ao3[export]``).
+
+You can also run this module as a script; see ``python -m ao3.export -h``.
+"""
+
+from __future__ import print_function
+
+import argparse
+import getpass
+import io
+import itertools
+import json
+import os
+import sys
+
+# The columns in an exported record, in order.
+FIELDS = [
+    'id', 'title', 'authors', 'summary', 'rating', 'warnings', 'category',
+    'fandoms', 'relationship', 'characters', 'additional_tags', 'language',
+    'published', 'words', 'comments', 'kudos', 'bookmarks', 'hits',
+]
+
+_LIST_FIELDS = set([
+    'authors', 'rating', 'warnings', 'category', 'fandoms', 'relationship',
+    'characters', 'additional_tags',
+])
+_INT_FIELDS = set(['words', 'comments', 'kudos', 'bookmarks', 'hits'])
+
+FORMATS = ['ndjson', 'parquet', 'arrow']
+
+# Used to guess the format from the name of the output file.
+_EXTENSIONS = {
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.json': 'ndjson',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.arrows': 'arrow',
+}
+
+
+def work_record(work):
+    """Returns a flat dict of the metadata for a work, for exporting.
+
+    Unlike ``Work.json()``, every author is included, the stats aren't
+    nested, and ``published`` is a ``date``.
+    """
+    record = dict((name, getattr(work, name)) for name in FIELDS)
+    record['id'] = str(work.id)
+    return record
+
+
+def guess_format(path):
+    """Guess the export format from a filename; defaults to NDJSON."""
+    _, ext = os.path.splitext(path)
+    return _EXTENSIONS.get(ext.lower(), 'ndjson')
+
+
+class NDJSONWriter(object):
+    """Writes records to a file as newline-delimited JSON.
+
+    :param f: a file opened for writing text.
+    """
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, records):
+        for record in records:
+            if record['published'] is not None:
+                record = dict(
+                    record, published=record['published'].isoformat())
+            # On Python 2, ``json.dumps`` returns a byte string, which a
+            # text file won't take.
+            self.f.write(type(u'')(json.dumps(record, sort_keys=True)))
+            self.f.write(u'\n')
+        self.f.flush()
+
+    def close(self):
+        pass
+
+
+def _import_pyarrow():
+    # pyarrow is big and slow to import, so we only import it when somebody
+    # actually wants to write Parquet or Arrow.
+    global pyarrow
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet  # noqa
+
+
+def _arrow_schema():
+    fields = []
+    for name in FIELDS:
+        if name in _LIST_FIELDS:
+            type_ = pyarrow.list_(pyarrow.string())
+        elif name in _INT_FIELDS:
+            type_ = pyarrow.int64()
+        elif name == 'published':
+            type_ = pyarrow.date32()
+        else:
+            type_ = pyarrow.string()
+        fields.append(pyarrow.field(name, type_))
+    return pyarrow.schema(fields)
+
+
+class _ArrowWriterBase(object):
+
+    def __init__(self, f):
+        try:
+            _import_pyarrow()
+        except ImportError:
+            raise RuntimeError(
+                'Exporting to %s requires pyarrow; install it with '
+                '`pip install ao3[export]`' % self.format)
+        self.schema = _arrow_schema()
+        self._writer = self._open(f)
+
+    def write(self, records):
+        columns = [
+            pyarrow.array([r[name] for r in records], type=field.type)
+            for name, field in zip(FIELDS, self.schema)]
+        self._writer.write_table(
+            pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class ParquetWriter(_ArrowWriterBase):
+    """Writes records to a Parquet file, one row group per batch.
+
+    :param f: a path, or a file opened for writing bytes.
+    """
+
+    format = 'parquet'
+
+    def _open(self, f):
+        return pyarrow.parquet.ParquetWriter(f, self.schema)
+
+
+class ArrowWriter(_ArrowWriterBase):
+    """Writes records to an Arrow IPC stream, one record batch per batch.
+
+    :param f: a path, or a file opened for writing bytes.
+    """
+
+    format = 'arrow'
+
+    def _open(self, f):
+        return pyarrow.ipc.new_stream(f, self.schema)
+
+
+WRITERS = {
+    'ndjson': NDJSONWriter,
+    'parquet': ParquetWriter,
+    'arrow': ArrowWriter,
+}
+
+
+def export_works(works, f, format='ndjson', batch_size=500):
+    """Write the metadata for a series of works to a file.
+
+    Only ``batch_size`` records are held in memory at once, and each work
+    is dropped as soon as its record has been made.  If ``works`` is a
+    generator that fetches works in the background (like ``AO3.works()``),
+    fetching carries on while each batch is written.
+
+    :param works: an iterable of ``Work`` instances.
+    :param f: a file to write to.  For NDJSON this should be opened for
+        text, and for Parquet or Arrow it can be a path or a file opened
+        for bytes.
+    :param format: ``'ndjson'``, ``'parquet'`` or ``'arrow'``.
+    :param batch_size: how many works to write at once.
+    :returns: the number of works written.
+    """
+    if format not in WRITERS:
+        raise ValueError('Unrecognised export format: %r' % format)
+
+    writer = WRITERS[format](f)
+    records = (work_record(work) for work in works)
+    count = 0
+    try:
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                break
+            writer.write(batch)
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+
+def _read_ids(path):
+    """Generates the work IDs in a file, one per line."""
+    if path in (None, '-'):
+        f = sys.stdin
+    else:
+        f = io.open(path, encoding='utf-8')
+    try:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def add_export_arguments(parser):
+    """Add the options for exporting works to an ``argparse`` parser."""
+    parser.add_argument(
+        'output',
+        help='the file to write to, or - for NDJSON on stdout')
+    parser.add_argument(
+        '--ids', metavar='FILE',
+        help='read work IDs from this file, one per line (- for stdin)')
+    parser.add_argument(
+        '--bookmarks', metavar='USERNAME',
+        help="export this user's bookmarks; the password is read from "
+             '$AO3_PASSWORD, or asked for')
+    parser.add_argument(
+        '--format', choices=FORMATS,
+        help='the output format; guessed from the filename by default')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument(
+        '--processes', type=int, metavar='N',
+        help='parse pages on N processes, for when parsing is the '
+             'bottleneck')
+
+
+def check_export_arguments(parser, args):
+    """Exit with a usage error if the options from
+    ``add_export_arguments()`` don't make sense together."""
+    if args.output == '-' and args.format not in (None, 'ndjson'):
+        parser.error(
+            'only ndjson can be written to stdout, not %s' % args.format)
+
+
+def run_export(api, args):
+    """Run an export described by the options from
+    ``add_export_arguments()``.  Returns the number of works written."""
+    if args.bookmarks:
+        password = os.environ.get('AO3_PASSWORD') or getpass.getpass()
+        api.login(args.bookmarks, password)
+        ids = api.user.bookmarks_ids()
+    else:
+        ids = _read_ids(args.ids)
+
+    def on_error(work_id, exc):
+        print('Skipping %s: %s' % (work_id, exc), file=sys.stderr)
+
+    output = args.output
+    format = args.format or guess_format(output)
+    kwargs = dict(
+        format=format, batch_size=args.batch_size,
+        max_workers=args.max_workers, on_error=on_error,
+        processes=getattr(args, 'processes', None))
+
+    if output == '-':
+        return api.export(ids, sys.stdout, **kwargs)
+    if format == 'ndjson':
+        with io.open(output, 'w', encoding='utf-8') as f:
+            return api.export(ids, f, **kwargs)
+    return api.export(ids, output, **kwargs)
+
+
+def main(argv=None):
+    from . import AO3
+
+    parser = argparse.ArgumentParser(
+        prog='python -m ao3.export',
+        description='Export the metadata for a batch of AO3 works.')
+    add_export_arguments(parser)
+    args = parser.parse_args(argv)
+    check_export_arguments(parser, args)
+
+    count = run_export(AO3(), args)
+    print('Exported %d works' % count, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+# -*- encoding: utf-8
+"""A local, searchable index of works you've fetched.
+
+``WorkIndex`` keeps the metadata for works in an SQLite database, so you
+can ask questions about them without going back to AO3:
+
+    >>> index = WorkIndex('works.sqlite')
+    >>> index.update(api, api.user.bookmarks_ids(), collection='bookmarks')
+    >>> index.search(fandom='Star Wars', min_words=50000,
+    ...              collection='bookmarks')
+    [IndexedWork(id='1234', metadata=WorkMetadata(title='...')), ...]
+
+``update()`` only fetches works that aren't in the index yet (or that are
+older than ``max_age``), so it's cheap to run again.  If you pass an index
+to ``AO3(index=...)``, every work it fetches is added as it goes.
+
+The title, summary and tags of each work are indexed for full-text search,
+using SQLite's FTS5 extension.
+"""
+
+import collections
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from .parsers import TAGS, WorkMetadata
+
+
+# A work in the index.  ``metadata`` is a ``WorkMetadata``.
+IndexedWork = collections.namedtuple('IndexedWork', ['id', 'metadata'])
+
+# Maps the list attributes of ``WorkMetadata`` to the kind of tag we store
+# them as.  The names match the classes AO3 uses for each kind of tag.
+TAG_KINDS = collections.OrderedDict([
+    ('authors', 'author'),
+    ('rating', 'rating'),
+    ('warnings', 'warning'),
+    ('category', 'category'),
+    ('fandoms', 'fandom'),
+    ('relationship', 'relationship'),
+    ('characters', 'character'),
+    ('additional_tags', 'freeform'),
+])
+
+_SCALAR_FIELDS = [
+    'title', 'summary', 'language', 'published',
+    'words', 'comments', 'kudos', 'bookmarks', 'hits',
+]
+
+# The columns that results can be sorted by.
+ORDER_BY = [
+    'id', 'title', 'published', 'words', 'comments', 'kudos', 'bookmarks',
+    'hits', 'indexed_at',
+]
+
+_HTML_TAG_REGEX = re.compile(r'<[^>]+>')
+
+_SCHEMA = [
+    # ``key`` is an alias for the rowid, which makes sure it never changes
+    # (even on VACUUM), so we can use it to find works in the search index.
+    'CREATE TABLE IF NOT EXISTS works ('
+    '  key INTEGER PRIMARY KEY,'
+    '  id TEXT UNIQUE NOT NULL,'
+    '  title TEXT,'
+    '  summary TEXT,'
+    '  language TEXT,'
+    '  published TEXT,'
+    '  words INTEGER,'
+    '  comments INTEGER,'
+    '  kudos INTEGER,'
+    '  bookmarks INTEGER,'
+    '  hits INTEGER,'
+    '  indexed_at REAL'
+    ')',
+    'CREATE INDEX IF NOT EXISTS works_published ON works (published)',
+    'CREATE INDEX IF NOT EXISTS works_words ON works (words)',
+    'CREATE INDEX IF NOT EXISTS works_kudos ON works (kudos)',
+    'CREATE TABLE IF NOT EXISTS tags ('
+    '  work_id TEXT,'
+    '  kind TEXT,'
+    '  position INTEGER,'
+    '  name TEXT COLLATE NOCASE,'
+    '  PRIMARY KEY (work_id, kind, position)'
+    ')',
+    'CREATE INDEX IF NOT EXISTS tags_name ON tags (kind, name, work_id)',
+    'CREATE TABLE IF NOT EXISTS collections ('
+    '  name TEXT,'
+    '  work_id TEXT,'
+    '  PRIMARY KEY (name, work_id)'
+    ')',
+    # The rowid of each row in the search index is the key of the work.
+    'CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5('
+    '  title, summary, tags'
+    ')',
+]
+
+
+class WorkIndex(object):
+    """An index of work metadata, stored in an SQLite database.
+
+    :param path: path to the database file.  Use ``':memory:'`` for an index
+        that only lasts as long as the process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        # Like ``PageCache``, the index can be shared by the threads that
+        # fetch works, so we serialise access to the connection ourselves.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    def __repr__(self):
+        return '%s(path=%r)' % (type(self).__name__, self.path)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM works').fetchone()[0]
+
+    def __contains__(self, work_id):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM works WHERE id = ?',
+                (str(work_id),)).fetchone() is not None
+
+    def add(self, work, collection=None):
+        """Add a work to the index, or update it if it's already there.
+
+        :param work: a ``Work``.  If it's lazy, this fetches it.
+        :param collection: optionally, the name of a collection to put the
+            work in, e.g. ``'bookmarks'``.
+        """
+        meta = WorkMetadata(**dict(
+            (name, getattr(work, name)) for name in WorkMetadata.__slots__))
+        self.add_metadata(work.id, meta, collection=collection)
+
+    def add_metadata(self, work_id, meta, collection=None):
+        """Add a ``WorkMetadata`` to the index, as for ``add()``."""
+        work_id = str(work_id)
+        published = meta.published.isoformat() if meta.published else None
+        tags = [
+            (work_id, kind, position, name)
+            for field, kind in TAG_KINDS.items()
+            for position, name in enumerate(getattr(meta, field) or [])]
+        text = _HTML_TAG_REGEX.sub(' ', meta.summary or '')
+
+        values = (
+            meta.title, meta.summary, meta.language, published, meta.words,
+            meta.comments, meta.kudos, meta.bookmarks, meta.hits, time.time(),
+            work_id,
+        )
+
+        with self._lock, self._conn:
+            # We update works in place (rather than INSERT OR REPLACE), so
+            # the key stays the same and we can use it to find the work in
+            # the search index.
+            row = self._conn.execute(
+                'SELECT key FROM works WHERE id = ?', (work_id,)).fetchone()
+            if row is None:
+                key = self._conn.execute(
+                    'INSERT INTO works (%s, indexed_at, id) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+                    % ', '.join(_SCALAR_FIELDS), values).lastrowid
+            else:
+                key = row[0]
+                self._conn.execute(
+                    'UPDATE works SET %s, indexed_at = ? WHERE id = ?'
+                    % ', '.join('%s = ?' % f for f in _SCALAR_FIELDS), values)
+                self._conn.execute(
+                    'DELETE FROM works_fts WHERE rowid = ?', (key,))
+
+            self._conn.execute(
+                'DELETE FROM tags WHERE work_id = ?', (work_id,))
+            self._conn.executemany(
+                'INSERT INTO tags VALUES (?, ?, ?, ?)', tags)
+            self._conn.execute(
+                'INSERT INTO works_fts (rowid, title, summary, tags) '
+                'VALUES (?, ?, ?, ?)', (
+                    key, meta.title, text,
+                    '\n'.join(name for _, _, _, name in tags),
+                ))
+            if collection is not None:
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO collections VALUES (?, ?)',
+                    (collection, work_id))
+
+    def remove(self, work_id):
+        """Remove a work from the index, and from every collection."""
+        work_id = str(work_id)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM works_fts WHERE rowid = '
+                '(SELECT key FROM works WHERE id = ?)', (work_id,))
+            for table, column in [
+                    ('works', 'id'), ('tags', 'work_id'),
+                    ('collections', 'work_id')]:
+                self._conn.execute(
+                    'DELETE FROM %s WHERE %s = ?' % (table, column),
+                    (work_id,))
+
+    def add_to_collection(self, collection, work_ids):
+        """Put works that are already in the index into a collection."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO collections VALUES (?, ?)',
+                [(collection, str(work_id)) for work_id in work_ids])
+
+    def missing(self, work_ids, max_age=None):
+        """Returns the IDs that aren't in the index, in order.
+
+        :param max_age: if given, works that were indexed more than this
+            many seconds ago count as missing too.
+        """
+        cutoff = time.time() - max_age if max_age is not None else None
+        missing = []
+        with self._lock:
+            for work_id in work_ids:
+                row = self._conn.execute(
+                    'SELECT indexed_at FROM works WHERE id = ?',
+                    (str(work_id),)).fetchone()
+                if row is None or (cutoff is not None and row[0] < cutoff):
+                    missing.append(work_id)
+        return missing
+
+    def update(self, api, work_ids, collection=None, max_age=None,
+               max_workers=8, on_error=None):
+        """Fetch and index any of these works that aren't in the index.
+
+        Works are fetched in metadata-only mode with ``api.works()``.
+
+        :param api: an ``AO3`` instance.
+        :param collection: optionally, the name of a collection to put all
+            of ``work_ids`` in, whether or not they needed fetching.
+        :param max_age: as for ``missing()``.
+        :param on_error: as for ``AO3.works()``.
+        :returns: the number of works that were fetched.
+        """
+        work_ids = list(work_ids)
+        count = 0
+        works = api.works(
+            self.missing(work_ids, max_age=max_age), max_workers=max_workers,
+            ordered=False, on_error=on_error, metadata_only=True)
+        for work in works:
+            # If the API has this index, ``works()`` has already added it.
+            if getattr(api, 'index', None) is not self:
+                self.add(work)
+            count += 1
+        if collection is not None:
+            self.add_to_collection(collection, [
+                work_id for work_id in work_ids if work_id in self])
+        return count
+
+    def get(self, work_id):
+        """Returns the ``WorkMetadata`` for a work, or None."""
+        results = self._load(['works.id = ?'], [str(work_id)], 'id', None)
+        return results[0].metadata if results else None
+
+    def search(self, text=None, author=None, fandom=None, relationship=None,
+               character=None, tag=None, rating=None, language=None,
+               min_words=None, max_words=None, published_after=None,
+               published_before=None, collection=None, order_by='-kudos',
+               limit=None):
+        """Find works in the index.
+
+        Every condition you give must match.  The tag conditions are exact
+        (but case-insensitive) tag names, and ``tag`` matches a tag of any
+        kind.  ``text`` is an FTS5 query over the title, summary and tags,
+        e.g. ``'coffee shop'`` or ``'"slow burn"'``.
+
+        :param order_by: the column to sort by, with a leading ``-`` for
+            descending order.  See ``ORDER_BY`` for the choices.
+        :returns: a list of ``IndexedWork`` instances.
+        """
+        conditions = []
+        params = []
+
+        tag_conditions = [
+            ('author', author), ('fandom', fandom),
+            ('relationship', relationship), ('character', character),
+            ('rating', rating), (None, tag)]
+        for kind, name in tag_conditions:
+            if name is None:
+                continue
+            if kind is None:
+                conditions.append(
+                    'works.id IN (SELECT work_id FROM tags WHERE name = ?)')
+                params.append(name)
+            else:
+                conditions.append(
+                    'works.id IN (SELECT work_id FROM tags '
+                    'WHERE kind = ? AND name = ?)')
+                params.extend([kind, name])
+
+        if text is not None:
+            conditions.append(
+                'works.key IN (SELECT rowid FROM works_fts '
+                'WHERE works_fts MATCH ?)')
+            params.append(text)
+        if collection is not None:
+            conditions.append(
+                'works.id IN (SELECT work_id FROM collections WHERE name = ?)')
+            params.append(collection)
+
+        for column, op, value in [
+                ('language', '=', language),
+                ('words', '>=', min_words),
+                ('words', '<=', max_words),
+                ('published', '>=', published_after),
+                ('published', '<=', published_before)]:
+            if value is not None:
+                if hasattr(value, 'isoformat'):
+                    value = value.isoformat()
+                conditions.append('works.%s %s ?' % (column, op))
+                params.append(value)
+
+        return self._load(conditions, params, order_by, limit)
+
+    def _load(self, conditions, params, order_by, limit):
+        descending = order_by.startswith('-')
+        column = order_by.lstrip('-')
+        if column not in ORDER_BY:
+            raise ValueError('Cannot sort by %r' % order_by)
+
+        query = 'SELECT %s, id FROM works' % ', '.join(_SCALAR_FIELDS)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY %s %s' % (column, 'DESC' if descending else 'ASC')
+        if limit is not None:
+            query += ' LIMIT %d' % limit
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = collections.OrderedDict()
+            for row in rows:
+                fields = dict(zip(_SCALAR_FIELDS, row))
+                if fields['published'] is not None:
+                    fields['published'] = datetime.strptime(
+                        fields['published'], '%Y-%m-%d').date()
+                for field in TAG_KINDS:
+                    fields[field] = []
+                results[row[-1]] = WorkMetadata(**fields)
+
+            # Then fill in the tags, a few hundred works at a time so we
+            # stay under SQLite's limit on query parameters.
+            fields_by_kind = dict((v, k) for k, v in TAG_KINDS.items())
+            ids = list(results)
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                tag_rows = self._conn.execute(
+                    'SELECT work_id, kind, name FROM tags '
+                    'WHERE work_id IN (%s) ORDER BY work_id, kind, position'
+                    % ', '.join('?' * len(chunk)), chunk)
+                for work_id, kind, name in tag_rows:
+                    # Authors aren't shared between works; see
+                    # ``TagVocabulary``.
+                    if kind != 'author':
+                        name = TAGS.intern(name)
+                    getattr(results[work_id], fields_by_kind[kind]).append(
+                        name)
+
+        return [
+            IndexedWork(work_id, meta) for work_id, meta in results.items()]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
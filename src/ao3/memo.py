@@ -0,0 +1,114 @@
+# -*- encoding: utf-8
+"""Sharing fetched works between callers who ask for the same one.
+
+When several threads ask an ``AO3`` instance for the same work at once --
+say, because several users have bookmarked it -- only the first one
+fetches and parses the page, and the others wait for its result
+(``SingleFlight``).  Works that have been fetched are kept in a small
+least-recently-used cache (``LRUCache``), so asking again soon afterwards
+doesn't go back to AO3 at all.
+"""
+
+import collections
+from concurrent.futures import Future
+import threading
+
+
+def work_key(work_id, metadata_only=False, low_memory=False):
+    """Returns the key a work is remembered under.
+
+    Works fetched in different modes keep different things -- a low-memory
+    work doesn't keep its page -- so each mode is remembered separately.
+    Otherwise asking for a low-memory work could get you a full one.
+    """
+    return (str(work_id), bool(metadata_only), bool(low_memory))
+
+
+class LRUCache(object):
+    """A dict-like cache that holds at most ``maxsize`` items.
+
+    When it's full, adding an item drops the one that was used least
+    recently.  It's safe to share between threads.
+
+    :param maxsize: the most items to keep.  If 0, nothing is kept.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s(maxsize=%r)' % (type(self).__name__, self.maxsize)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """Returns the item for ``key``, and marks it as recently used."""
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                return default
+            self._items[key] = value
+            return value
+
+    def put(self, key, value):
+        """Add an item, dropping the least recently used if we're full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._items.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class SingleFlight(object):
+    """Makes sure only one call for each key is running at once.
+
+    If ``do(key, func)`` is called while another call with the same key is
+    still running, it doesn't call ``func`` -- it waits for the first call
+    to finish, and returns the same result (or raises the same exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._calls[key] = Future()
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,296 @@
+# -*- encoding: utf-8
+"""Instrumentation for requests to AO3, and for parsing the pages.
+
+If a script is slow, this tells you whether it's waiting for the network,
+parsing HTML, or being throttled.  Every ``AO3`` instance has an
+``instrumentation`` attribute, and you can register sinks with it:
+
+    >>> api = AO3()
+    >>> counters = CounterSink()
+    >>> api.instrumentation.add_sink(counters)
+    >>> api.instrumentation.add_sink(LoggingSink())
+
+A sink is any callable that takes an event.  There are two kinds of event:
+
+*   ``RequestEvent``, sent once for every request, after any retries.
+*   ``ParseEvent``, sent every time the parser backend does some work.
+
+If no sinks are registered, nothing is timed and no events are created.
+"""
+
+import collections
+import logging
+import re
+import threading
+import timeit
+import types
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from .utils import url_kind
+
+
+# A request to AO3.  ``kind`` is the kind of page (``'work'``, ``'kudos'``,
+# ``'bookmarks'``, ``'readings'``, ``'login'`` or ``'default'``).  ``bytes``
+# is the size of the body, or None if it's being streamed and we don't know
+# yet.  ``network_time`` is in seconds, and doesn't include time spent
+# waiting for the rate limiter.  ``retries`` is how many times we were
+# throttled before the request went through.  ``cache`` is ``'hit'``,
+# ``'revalidated'`` or ``'miss'``, or None if there's no cache.
+RequestEvent = collections.namedtuple('RequestEvent', [
+    'kind', 'method', 'url', 'status', 'bytes', 'network_time', 'retries',
+    'cache'])
+
+# Some work done by a parser backend.  ``kind`` is the name of the parser
+# method, e.g. ``'parse'`` or ``'work_metadata'``.  ``bytes`` is the length
+# of the HTML, or None if the method was given a page that had already been
+# parsed.  ``parse_time`` is in seconds.  For methods that generate their
+# results, like ``'kudos_left_by'``, the event is sent once the results have
+# all been read (or the generator is closed).
+ParseEvent = collections.namedtuple('ParseEvent', [
+    'kind', 'bytes', 'parse_time'])
+
+
+# Pages that don't need their own TTL in the cache, but that are worth
+# telling apart when you're looking at where the time went.
+_LOGIN_URL_REGEX = re.compile(r'^https?://[^/]+/?$|/user_sessions$')
+_KUDOS_URL_REGEX = re.compile(r'/works/[0-9]+/kudos')
+
+
+def request_kind(url):
+    """Returns the kind of AO3 page that a request is for."""
+    if _LOGIN_URL_REGEX.search(url):
+        return 'login'
+    if _KUDOS_URL_REGEX.search(url):
+        return 'kudos'
+    return url_kind(url)
+
+
+class Instrumentation(object):
+    """The sinks that get told about requests and parsing.
+
+    :param sinks: an optional list of sinks to start with.
+    """
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+
+    def __repr__(self):
+        return '%s(sinks=%r)' % (type(self).__name__, self.sinks)
+
+    def add_sink(self, sink):
+        """Start sending events to ``sink``."""
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        """Stop sending events to ``sink``."""
+        self.sinks.remove(sink)
+
+    def emit(self, event):
+        """Send an event to every sink."""
+        for sink in self.sinks:
+            sink(event)
+
+
+class InstrumentedAdapter(BaseAdapter):
+    """A transport adapter that sends a ``RequestEvent`` for every request.
+
+    This should be the outermost adapter, so it sees the final response
+    after any caching and retries.  Requests are sent with ``adapter``,
+    which defaults to a plain ``HTTPAdapter``.
+    """
+
+    def __init__(self, instrumentation, adapter=None):
+        super(InstrumentedAdapter, self).__init__()
+        self.instrumentation = instrumentation
+        self.adapter = adapter or HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        if not self.instrumentation.sinks:
+            return self.adapter.send(request, **kwargs)
+
+        start = timeit.default_timer()
+        resp = self.adapter.send(request, **kwargs)
+
+        # Unless we're streaming, requests is about to read the whole body
+        # anyway -- reading it here means the download counts as network
+        # time, and we know how big it was.
+        if kwargs.get('stream'):
+            size = resp.headers.get('Content-Length')
+            size = int(size) if size is not None else None
+        else:
+            size = len(resp.content)
+        elapsed = timeit.default_timer() - start
+
+        self.instrumentation.emit(RequestEvent(
+            kind=request_kind(request.url),
+            method=request.method,
+            url=request.url,
+            status=resp.status_code,
+            bytes=size,
+            network_time=elapsed - getattr(resp, 'rate_limit_wait', 0),
+            retries=getattr(resp, 'retries', 0),
+            cache=getattr(resp, 'cache_status', None)))
+        return resp
+
+    def close(self):
+        self.adapter.close()
+
+
+def _timed_generator(instrumentation, name, generator, elapsed):
+    # Calling a generator method doesn't do any parsing -- that happens as
+    # the caller walks through it.  So we add up the time spent inside the
+    # generator (but not in the caller), and send the event once it's
+    # finished or closed.
+    try:
+        while True:
+            start = timeit.default_timer()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += timeit.default_timer() - start
+            yield item
+    finally:
+        generator.close()
+        instrumentation.emit(
+            ParseEvent(kind=name, bytes=None, parse_time=elapsed))
+
+
+def _timed(name):
+    def method(self, arg):
+        func = getattr(self.parser, name)
+        if not self.instrumentation.sinks:
+            return func(arg)
+
+        start = timeit.default_timer()
+        result = func(arg)
+        elapsed = timeit.default_timer() - start
+
+        if isinstance(result, types.GeneratorType):
+            return _timed_generator(
+                self.instrumentation, name, result, elapsed)
+
+        size = len(arg) if isinstance(arg, (str, bytes)) else None
+        self.instrumentation.emit(
+            ParseEvent(kind=name, bytes=size, parse_time=elapsed))
+        return result
+
+    method.__name__ = name
+    return method
+
+
+class InstrumentedParser(object):
+    """Wraps a parser backend, and sends a ``ParseEvent`` every time one of
+    its methods is called.
+
+    Anything else is passed straight through to ``parser``, so this can be
+    used anywhere the parser could.
+    """
+
+    def __init__(self, parser, instrumentation):
+        self.parser = parser
+        self.instrumentation = instrumentation
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.parser)
+
+    def __getattr__(self, name):
+        return getattr(self.parser, name)
+
+    parse = _timed('parse')
+    parse_metadata = _timed('parse_metadata')
+    parse_kudos = _timed('parse_kudos')
+    work_metadata = _timed('work_metadata')
+    kudos_left_by = _timed('kudos_left_by')
+    bookmarks_page = _timed('bookmarks_page')
+    readings_page = _timed('readings_page')
+    blurbs_page = _timed('blurbs_page')
+
+
+class LoggingSink(object):
+    """A sink that writes a line to a logger for every event.
+
+    :param logger: the logger to use; defaults to the ``ao3.metrics`` logger.
+    :param level: the level to log at.
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def __call__(self, event):
+        if isinstance(event, RequestEvent):
+            self.logger.log(
+                self.level,
+                '%s %s -> %s (%s, %s bytes, %.3fs, %d retries, cache=%s)',
+                event.method, event.url, event.status, event.kind,
+                event.bytes, event.network_time, event.retries, event.cache)
+        else:
+            self.logger.log(
+                self.level, 'parser.%s (%s bytes, %.3fs)',
+                event.kind, event.bytes, event.parse_time)
+
+
+class CounterSink(object):
+    """A sink that adds up events into Prometheus-style counters.
+
+    Each counter has a name and some labels, and you can read it with
+    ``get()``:
+
+        >>> counters.get('ao3_requests_total', kind='work', status='200')
+        12
+
+    or get every counter in the Prometheus text format with ``render()``.
+    """
+
+    def __init__(self):
+        self.counters = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s()' % type(self).__name__
+
+    def _inc(self, name, value, **labels):
+        self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def __call__(self, event):
+        with self._lock:
+            if isinstance(event, RequestEvent):
+                kind = event.kind
+                self._inc(
+                    'ao3_requests_total', 1,
+                    kind=kind, status=str(event.status))
+                self._inc(
+                    'ao3_request_seconds_total', event.network_time,
+                    kind=kind)
+                self._inc(
+                    'ao3_request_bytes_total', event.bytes or 0, kind=kind)
+                self._inc('ao3_retries_total', event.retries, kind=kind)
+                if event.cache is not None:
+                    self._inc(
+                        'ao3_cache_total', 1, kind=kind, outcome=event.cache)
+            else:
+                self._inc('ao3_parses_total', 1, kind=event.kind)
+                self._inc(
+                    'ao3_parse_seconds_total', event.parse_time,
+                    kind=event.kind)
+
+    def get(self, name, **labels):
+        """Returns the value of a counter, or the sum over every counter
+        with this name if you leave out some of the labels."""
+        with self._lock:
+            return sum(
+                value for (n, key), value in self.counters.items()
+                if n == name and set(labels.items()) <= set(key))
+
+    def render(self):
+        """Returns all the counters in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                label_str = ','.join('%s="%s"' % kv for kv in labels)
+                lines.append('%s{%s} %s' % (name, label_str, repr(value)))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,1235 @@
+# -*- encoding: utf-8
+"""Parsers for turning AO3 pages into data.
+
+All the HTML parsing in this package goes through a parser backend, so
+that it can be swapped for a faster one.  There are three built-in
+backends:
+
+``'html.parser'``
+    BeautifulSoup with the HTML parser from the standard library.  This is
+    the default, and always available.
+
+``'lxml'``
+    BeautifulSoup with lxml's tree builder.  Same extraction code, but
+    the page is parsed in C.
+
+``'selectolax'``
+    selectolax's Lexbor engine, queried with CSS selectors.  This is the
+    fastest by some distance.
+
+If the library a backend needs isn't installed, you get ``'html.parser'``
+instead.  You can also pass your own parser object, which needs the same
+methods as ``SoupParser``.
+"""
+
+from datetime import datetime
+import collections
+import importlib
+import re
+import threading
+
+try:
+    from html.parser import HTMLParser
+except ImportError:  # Python 2
+    from HTMLParser import HTMLParser
+
+from xml.sax.saxutils import escape as xml_escape
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+
+ReadingHistoryItem = collections.namedtuple(
+    'ReadingHistoryItem', ['work_id', 'last_read'])
+
+# How many chapters of a work have been posted, and how many there will be.
+# ``total`` is None if the author hasn't said (AO3 shows this as "3/?").
+ChapterCount = collections.namedtuple('ChapterCount', ['posted', 'total'])
+
+# One chapter of a work.  ``title`` is the heading AO3 shows above it, e.g.
+# "Chapter 2: The Next Day", or None for a single-chapter work.  ``html`` is
+# the text of the chapter.
+Chapter = collections.namedtuple('Chapter', ['number', 'title', 'html'])
+
+# One work in a listing, like a page of bookmarks or search results.  AO3
+# calls these "blurbs".  ``metadata`` is a ``WorkMetadata``, but blurbs don't
+# say when a work was published, so ``metadata.published`` is None and
+# ``updated`` is the date the work was last updated instead.
+Blurb = collections.namedtuple('Blurb', ['work_id', 'metadata', 'updated'])
+
+# One page of a paginated listing, like a user's bookmarks.  ``page_count``
+# is the number of the last page linked from the pagination block, or None
+# if there isn't one.
+ListingPage = collections.namedtuple(
+    'ListingPage', ['items', 'has_next_page', 'page_count'])
+
+
+class WorkMetadata(object):
+    """The metadata about a work, as shown at the top of its page.
+
+    This is a plain record with one attribute for each property of ``Work``
+    that comes from the page.  Use ``parser.work_metadata()`` to create one.
+    """
+
+    __slots__ = (
+        'title', 'authors', 'summary',
+        'rating', 'warnings', 'category', 'fandoms', 'relationship',
+        'characters', 'additional_tags', 'language',
+        'published', 'words', 'chapters', 'comments', 'kudos', 'bookmarks',
+        'hits',
+    )
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    def __repr__(self):
+        return '%s(title=%r)' % (type(self).__name__, self.title)
+
+
+class TagVocabulary(object):
+    """A shared vocabulary of tag names.
+
+    The same few thousand tags turn up on most works, so if you load a lot
+    of works you'd otherwise have one copy of "Alternate Universe" for
+    each of them.  ``intern()`` returns a single shared copy of each name,
+    and also gives every name a small integer id, in case you want to store
+    tags more compactly still.
+
+    The parsers intern tags into ``TAGS`` unless they're given a different
+    vocabulary.  Only tags are interned: authors are nearly all different,
+    so sharing them wouldn't save anything.
+
+    :param maxsize: the most names to hold.  Once the vocabulary is full,
+        new names are still copied out of the parse tree but aren't shared
+        or given an id, so a long-running process doesn't grow without
+        limit.  ``None`` means no limit.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._names = {}
+        self._ids = {}
+        self._by_id = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def intern(self, name):
+        """Returns the shared copy of ``name``, adding it if it's new.
+
+        The result is always a plain string, even if ``name`` was a
+        BeautifulSoup string that refers back into the parse tree.  If the
+        vocabulary is full, a new name comes back as an unshared copy.
+        """
+        try:
+            return self._names[name]
+        except KeyError:
+            pass
+        name = _plain_text(name)
+        with self._lock:
+            if name not in self._names:
+                if self.maxsize is not None and len(self) >= self.maxsize:
+                    return name
+                self._names[name] = name
+                self._ids[name] = len(self._by_id)
+                self._by_id.append(name)
+            return self._names[name]
+
+    def intern_all(self, names):
+        return [self.intern(name) for name in names]
+
+    def id(self, name):
+        """Returns the integer id of a tag name, adding it if it's new.
+
+        Raises ``KeyError`` if the name is new and the vocabulary is full.
+        """
+        return self._ids[self.intern(name)]
+
+    def name(self, id):
+        """Returns the tag name with this id."""
+        return self._by_id[id]
+
+    def clear(self):
+        with self._lock:
+            self._names.clear()
+            self._ids.clear()
+            del self._by_id[:]
+
+
+def _plain_text(value):
+    # BeautifulSoup's NavigableString is a subclass of str that holds on
+    # to its place in the tree (and so the whole tree); this makes a plain
+    # copy of it.
+    return type(u'')(value)
+
+
+# The vocabulary that parsers intern tags into by default.  AO3 has a lot
+# of tags, but the ones in common use fit comfortably in this.
+TAGS = TagVocabulary(maxsize=50000)
+
+
+# Maps the class of a <dd> tag in the work metadata to the attribute of
+# ``WorkMetadata`` where we store its value.
+_DD_FIELDS = {
+    'rating': 'rating',
+    'warning': 'warnings',
+    'category': 'category',
+    'fandom': 'fandoms',
+    'relationship': 'relationship',
+    'character': 'characters',
+    'freeform': 'additional_tags',
+    'language': 'language',
+    'published': 'published',
+    'words': 'words',
+    'chapters': 'chapters',
+    'comments': 'comments',
+    'kudos': 'kudos',
+    'bookmarks': 'bookmarks',
+    'hits': 'hits',
+}
+
+# The links in the kudos list that aren't users.  If a fic has lots of
+# kudos, not all the users who left kudos are displayed by default.
+# There's a link for expanding the list of users:
+#
+#     <a href="/works/[work_id]/kudos" id="kudos_summary">
+#
+# and another for collapsing the list afterward:
+#
+#     <a href="#" id="kudos_collapser">
+#
+_KUDOS_CONTROLS = ('kudos_collapser', 'kudos_summary')
+
+# Maps the class of an <li> in the tags of a blurb to the attribute of
+# ``WorkMetadata`` where we store its value.
+_BLURB_TAG_FIELDS = {
+    'warnings': 'warnings',
+    'relationships': 'relationship',
+    'characters': 'characters',
+    'freeforms': 'additional_tags',
+}
+
+# The link to a work in the heading of a blurb, e.g. /works/1234
+_WORK_HREF_REGEX = re.compile(r'^/works/(?P<work_id>[0-9]+)$')
+
+# The message shown instead of a work that's only visible when logged in.
+_RESTRICTED_TEXT = 'This work is only available to registered users'
+
+# The last viewed date on an entry in the reading history, e.g. 24 Dec 2012
+_VIEWED_DATE_REGEX = re.compile(r'[0-9]{1,2} [A-Z][a-z]+ [0-9]{4}')
+
+
+# The parts of a work page that we need for its metadata.  Anything else
+# is ignored when parsing with ``parse_metadata()``.  (We match the class
+# with a regex because a strainer may see the whole, unsplit attribute.)
+_METADATA_STRAINER = SoupStrainer(
+    ['dl', 'h2', 'h3', 'div'],
+    attrs={'class': re.compile(r'(^|\s)(meta|title|byline|summary)(\s|$)')})
+
+_KUDOS_STRAINER = SoupStrainer('div', attrs={'id': 'kudos'})
+
+
+def _metadata_region(html):
+    """Trims a work page to the part before the text of the work.
+
+    Everything we need for the metadata comes before the chapters, which
+    is usually most of the page, so there's no point parsing them at all.
+    If the page doesn't look like we expect, this returns the whole page.
+    """
+    end = html.find('<div id="chapters"')
+    if end == -1:
+        return html
+    return html[:end]
+
+
+def _kudos_region(html):
+    """Trims a work page to the part starting at the list of kudos."""
+    start = html.find('<div id="kudos"')
+    if start == -1:
+        return html
+    return html[start:]
+
+
+def _int_stat(value):
+    # Large numbers are written with thousands separators, e.g. "1,234".
+    return int(value.replace(',', ''))
+
+
+def _build_metadata(raw, title, authors, summary, vocabulary=TAGS):
+    """Build a ``WorkMetadata`` from the strings we found on the page.
+
+    :param raw: a dict of the values found in the work metadata, keyed by
+        ``WorkMetadata`` attribute.  List fields are lists of strings,
+        everything else is the text of the <dd> tag.
+    :param vocabulary: the ``TagVocabulary`` to intern the tags and
+        language into.
+    """
+    # Every string we keep is a plain, shared copy, so the metadata
+    # doesn't keep the parse tree alive and repeated tags aren't duplicated.
+    intern_all = vocabulary.intern_all
+    warnings = intern_all(raw.get('warnings', []))
+    if warnings == ['No Archive Warnings Apply']:
+        warnings = []
+
+    published = None
+    if 'published' in raw:
+        published = datetime.strptime(
+            raw['published'].strip(), '%Y-%m-%d').date()
+
+    # The chapter count is of the form "3/10", or "3/?" if the author
+    # doesn't know how many chapters there will be.
+    chapters = None
+    if 'chapters' in raw:
+        posted, total = raw['chapters'].strip().split('/')
+        chapters = ChapterCount(
+            posted=_int_stat(posted),
+            total=None if total == '?' else _int_stat(total))
+
+    return WorkMetadata(
+        title=None if title is None else _plain_text(title),
+        authors=[_plain_text(author) for author in authors],
+        summary=summary,
+        rating=intern_all(raw.get('rating', [])),
+        warnings=warnings,
+        category=intern_all(raw.get('category', [])),
+        fandoms=intern_all(raw.get('fandoms', [])),
+        relationship=intern_all(raw.get('relationship', [])),
+        characters=intern_all(raw.get('characters', [])),
+        additional_tags=intern_all(raw.get('additional_tags', [])),
+        language=vocabulary.intern(raw.get('language', '').strip()),
+        published=published,
+        words=_int_stat(raw.get('words', '0')),
+        chapters=chapters,
+        comments=_int_stat(raw.get('comments', '0')),
+        kudos=_int_stat(raw.get('kudos', '0')),
+        bookmarks=_int_stat(raw.get('bookmarks', '0')),
+        hits=_int_stat(raw.get('hits', '0')),
+    )
+
+
+def _page_count(page_numbers):
+    """Returns the last page number, given the text of the pagination links.
+
+    The pagination block at the end of a listing is of the form
+
+        <ol class="pagination actions">
+          <li class="previous"> ... </li>
+          <li><span class="current">1</span></li>
+          <li><a href="...?page=2">2</a></li>
+          <li class="gap">&hellip;</li>
+          <li><a href="...?page=30">30</a></li>
+          <li class="next"> ... </li>
+        </ol>
+
+    so the last page is the biggest number in it.
+    """
+    numbers = [int(text) for text in page_numbers if text.strip().isdigit()]
+    if numbers:
+        return max(numbers)
+    return None
+
+
+def _parse_viewed_date(text):
+    date_str = _VIEWED_DATE_REGEX.search(text).group(0)
+    return datetime.strptime(date_str, '%d %b %Y').date()
+
+
+class SoupParser(object):
+    """Parses pages with BeautifulSoup.
+
+    :param features: the BeautifulSoup tree builder to use, e.g.
+        ``'html.parser'`` or ``'lxml'``.
+    :param vocabulary: the ``TagVocabulary`` to intern tags into; by
+        default the shared ``TAGS``.
+    """
+
+    def __init__(self, features='html.parser', vocabulary=None):
+        self.name = features
+        self.features = features
+        if vocabulary is None:
+            vocabulary = TAGS
+        self.vocabulary = vocabulary
+
+    def __repr__(self):
+        return '%s(features=%r)' % (type(self).__name__, self.features)
+
+    def parse(self, html):
+        """Parse a page, and return a tree for the other methods."""
+        return BeautifulSoup(html, features=self.features)
+
+    def parse_metadata(self, html):
+        """Parse just enough of a work page for ``work_metadata()``."""
+        return BeautifulSoup(_metadata_region(html), features=self.features,
+                             parse_only=_METADATA_STRAINER)
+
+    def parse_kudos(self, html):
+        """Parse just enough of a work page for ``kudos_left_by()``."""
+        return BeautifulSoup(_kudos_region(html), features=self.features,
+                             parse_only=_KUDOS_STRAINER)
+
+    def _list_stat(self, dd_tag):
+        """Returns the value of a list statistic.
+
+        Some statistics can have multiple values (e.g. the list of
+        characters).  This helper method should be used to retrieve those.
+
+        """
+        # A list tag is stored in the form
+        #
+        #     <dd class="[field_name] tags">
+        #       <ul class="commas">
+        #         <li><a href="/further-works">[value 1]</a></li>
+        #         <li><a href="/more-info">[value 2]</a></li>
+        #         <li class="last"><a href="/more-works">[value 3]</a></li>
+        #       </ul>
+        #     </dd>
+        #
+        # We want to get the data from the individual <li> elements.
+        li_tags = dd_tag.findAll('li')
+        a_tags = [t.contents[0] for t in li_tags]
+        return [t.contents[0] for t in a_tags]
+
+    def work_metadata(self, soup):
+        """Extract the metadata from the parsed page for a work.
+
+        This walks each part of the page it needs exactly once, rather than
+        searching the whole page again for every value.  Returns a
+        ``WorkMetadata`` instance.
+        """
+        # The stats are stored in a series of <dd> tags inside the work
+        # metadata list, of the form
+        #
+        #     <dl class="work meta group">
+        #       <dd class="[field_name]">[field_value]</dd>
+        #       ...
+        #       <dd class="stats">
+        #         <dl class="stats">
+        #           <dd class="[field_name]">[field_value]</dd>
+        #           ...
+        #         </dl>
+        #       </dd>
+        #     </dl>
+        #
+        # so one walk over that <dl> gets all of them.
+        raw = {}
+        meta_dl = soup.find('dl', attrs={'class': 'meta'})
+        if meta_dl is not None:
+            for dd_tag in meta_dl.findAll('dd'):
+                classes = dd_tag.attrs.get('class', [])
+                for class_name in classes:
+                    field = _DD_FIELDS.get(class_name)
+                    if field is None or field in raw:
+                        continue
+                    if 'tags' in classes:
+                        raw[field] = self._list_stat(dd_tag)
+                    elif field == 'bookmarks':
+                        # This is a link of the form
+                        #
+                        #     <a href="/works/9079264/bookmarks">102</a>
+                        #
+                        # It might be nice to follow that page and get a list
+                        # of who has bookmarked this, but for now just return
+                        # the number.
+                        raw[field] = dd_tag.contents[0].contents[0]
+                    else:
+                        raw[field] = dd_tag.contents[0]
+
+        # The title of the work is stored in an <h2> tag of the form
+        #
+        #     <h2 class="title heading">[title]</h2>
+        #
+        title = None
+        title_tag = soup.find('h2', attrs={'class': 'title'})
+        if title_tag is not None:
+            title = title_tag.contents[0].strip()
+
+        # The author of the work is kept in the byline, in the form
+        #
+        #     <h3 class="byline heading">
+        #       <a href="/users/[author_name]" rel="author">[author_name]</a>
+        #     </h3>
+        #
+        authors = []
+        byline_tag = soup.find('h3', attrs={'class': 'byline'})
+        if byline_tag is not None:
+            authors = [t.contents[0].strip()
+                       for t in byline_tag.contents
+                       if isinstance(t, Tag)]
+
+        # The author summary is kept in the following format:
+        #
+        #     <div class="summary module" role="complementary">
+        #       <h3 class="heading">Summary:</h3>
+        #       <blockquote class="userstuff">
+        #         [author_summary_html]
+        #       </blockquote>
+        #     </div>
+        #
+        summary = None
+        summary_div = soup.find('div', attrs={'class': 'summary'})
+        if summary_div is not None:
+            blockquote = summary_div.find('blockquote')
+            summary = blockquote.renderContents().decode('utf8').strip()
+
+        return _build_metadata(raw, title=title, authors=authors,
+                               summary=summary, vocabulary=self.vocabulary)
+
+    def kudos_left_by(self, soup):
+        """Generates the usernames who left kudos on a work."""
+        # The list of usernames who left kudos is stored in the following
+        # format:
+        #
+        #     <div id="kudos">
+        #       <p class="kudos">
+        #         <a href="/users/[username1]">[username1]</a>
+        #         <a href="/users/[username2]">[username2]</a>
+        #         ...
+        #       </p>
+        #     </div>
+        #
+        # And yes, this really does include every username.  The fic with
+        # the most kudos is http://archiveofourown.org/works/2080878, and
+        # this approach successfully retrieved the username of everybody
+        # who left kudos.
+        kudos_div = soup.find('div', attrs={'id': 'kudos'})
+        if kudos_div is None:
+            return
+        for a_tag in kudos_div.findAll('a'):
+            if a_tag.attrs.get('id') in _KUDOS_CONTROLS:
+                continue
+            yield a_tag.attrs['href'].replace('/users/', '')
+
+    def _has_next_page(self, soup):
+        """Is there another page of results after this one?"""
+        # The pagination button at the end of the page is of the form
+        #
+        #     <li class="next" title="next"> ... </li>
+        #
+        # If there's another page of results, this contains an <a> tag
+        # pointing to the next page.  Otherwise, it contains a <span>
+        # tag with the 'disabled' class.
+        next_button = soup.find('li', attrs={'class': 'next'})
+        if next_button is None:
+            # In case of absence of "next"
+            return False
+        return next_button.find('span', attrs={'class': 'disabled'}) is None
+
+    def _page_count(self, soup):
+        pagination = soup.find('ol', attrs={'class': 'pagination'})
+        if pagination is None:
+            return None
+        return _page_count(li.get_text() for li in pagination.findAll('li'))
+
+    def _listing_page(self, items, soup):
+        return ListingPage(
+            items, self._has_next_page(soup), self._page_count(soup))
+
+    def bookmarks_page(self, html):
+        """Parse one page of a user's bookmarks.
+
+        Returns a ``ListingPage`` whose items are work IDs.  External work
+        bookmarks are ignored.
+        """
+        soup = self.parse(html)
+
+        # The entries are stored in a list of the form:
+        #
+        #     <ol class="bookmark index group">
+        #       <li id="bookmark_12345" class="bookmark blurb group"
+        #           role="article">
+        #         ...
+        #       </li>
+        #       <li id="bookmark_67890" class="bookmark blurb group"
+        #           role="article">
+        #         ...
+        #       </li>
+        #       ...
+        #     </o
+        ol_tag = soup.find('ol', attrs={'class': 'bookmark'})
+
+        work_ids = []
+        for li_tag in ol_tag.findAll('li', attrs={'class': 'blurb'}):
+            try:
+                # <h4 class="heading">
+                #     <a href="/works/12345678">Work Title</a>
+                #     <a href="/users/authorname/pseuds/authorpseud"
+                #        rel="author">Author Name</a>
+                # </h4>
+
+                h4_tags = li_tag.findAll('h4', attrs={'class': 'heading'})
+                for h4_tag in h4_tags:
+                    for link in h4_tag.findAll('a'):
+                        href = link.get('href')
+                        if 'works' in href and 'external_works' not in href:
+                            work_ids.append(href.replace('/works/', ''))
+            except KeyError:
+                # A deleted work shows up as
+                #
+                #      <li class="deleted reading work blurb group">
+                #
+                # There's nothing that we can do about that, so just skip
+                # over it.
+                if 'deleted' in li_tag.attrs['class']:
+                    pass
+                else:
+                    raise
+
+        return self._listing_page(work_ids, soup)
+
+    def _blurb(self, li_tag):
+        """Extract a ``Blurb`` from the <li> tag for one work in a listing.
+
+        Returns None for blurbs that aren't for works on AO3, like
+        bookmarks of external works, or works that have been deleted.
+        """
+        heading = self._blurb_heading(li_tag)
+        if heading is None:
+            return None
+        work_id, title, authors = heading
+
+        # Underneath are the fandoms, and the symbols for the rating,
+        # warnings and category:
+        #
+        #     <h5 class="fandoms heading">
+        #       <a class="tag" href="...">[fandom]</a>
+        #     </h5>
+        #     <ul class="required-tags">
+        #       <li><a ...><span class="rating-teen rating" title="[rating]">
+        #       <li><a ...><span class="category-multi category"
+        #                        title="F/M, M/M">
+        #       ...
+        #     </ul>
+        #
+        # then the rest of the tags, and the stats in the same <dd> tags as
+        # on the work page:
+        #
+        #     <ul class="tags commas">
+        #       <li class="warnings">
+        #         <strong><a class="tag">[warning]</a></strong>
+        #       </li>
+        #       <li class="characters"><a class="tag">[character]</a></li>
+        #       ...
+        #     </ul>
+        #     <blockquote class="userstuff summary">[summary]</blockquote>
+        #     <dl class="stats">
+        #       <dd class="words">[words]</dd>
+        #       ...
+        #     </dl>
+        #
+        raw = self._blurb_tags(li_tag)
+        raw.update(self._blurb_stats(li_tag))
+
+        summary = None
+        blockquote = li_tag.find('blockquote', attrs={'class': 'summary'})
+        if blockquote is not None:
+            summary = blockquote.renderContents().decode('utf8').strip()
+
+        updated = None
+        datetime_tag = li_tag.find('p', attrs={'class': 'datetime'})
+        if datetime_tag is not None:
+            updated = _parse_viewed_date(datetime_tag.get_text())
+
+        meta = _build_metadata(raw, title=title, authors=authors,
+                               summary=summary, vocabulary=self.vocabulary)
+        return Blurb(work_id, meta, updated)
+
+    def _blurb_heading(self, li_tag):
+        """Returns ``(work_id, title, authors)`` from the heading of a blurb,
+        or None if it isn't for a work on AO3."""
+        # The heading has a link to the work, and to each of its authors:
+        #
+        #     <h4 class="heading">
+        #       <a href="/works/[work_id]">[title]</a>
+        #       by
+        #       <a rel="author" href="/users/[author]/pseuds/[author]">
+        #         [author]</a>
+        #     </h4>
+        #
+        heading = li_tag.find('h4', attrs={'class': 'heading'})
+        if heading is None:
+            return None
+        work_id = title = None
+        authors = []
+        for a_tag in heading.findAll('a'):
+            match = _WORK_HREF_REGEX.match(a_tag.attrs.get('href', ''))
+            if 'author' in (a_tag.attrs.get('rel') or []):
+                authors.append(a_tag.get_text().strip())
+            elif match is not None and work_id is None:
+                work_id = match.group('work_id')
+                title = a_tag.get_text().strip()
+        if work_id is None:
+            return None
+        return work_id, title, authors
+
+    def _blurb_tags(self, li_tag):
+        raw = {}
+        fandoms_tag = li_tag.find('h5', attrs={'class': 'fandoms'})
+        if fandoms_tag is not None:
+            raw['fandoms'] = [
+                a_tag.get_text().strip()
+                for a_tag in fandoms_tag.findAll('a', attrs={'class': 'tag'})]
+
+        for field in ('rating', 'category'):
+            span = li_tag.find('span', attrs={'class': field})
+            if span is not None and span.attrs.get('title'):
+                raw[field] = span.attrs['title'].split(', ')
+
+        tags_ul = li_tag.find('ul', attrs={'class': 'tags'})
+        tag_lis = tags_ul.findAll('li') if tags_ul is not None else []
+        for tag_li in tag_lis:
+            for class_name in tag_li.attrs.get('class', []):
+                field = _BLURB_TAG_FIELDS.get(class_name)
+                if field is not None:
+                    raw.setdefault(field, []).append(
+                        tag_li.get_text().strip())
+        return raw
+
+    def _blurb_stats(self, li_tag):
+        raw = {}
+        stats_dl = li_tag.find('dl', attrs={'class': 'stats'})
+        dd_tags = stats_dl.findAll('dd') if stats_dl is not None else []
+        for dd_tag in dd_tags:
+            for class_name in dd_tag.attrs.get('class', []):
+                field = _DD_FIELDS.get(class_name)
+                text = dd_tag.get_text().strip()
+                if field is not None and text:
+                    raw[field] = text
+        return raw
+
+    def blurbs_page(self, html):
+        """Parse one page of a listing of works, like a user's bookmarks.
+
+        Returns a ``ListingPage`` whose items are ``Blurb`` instances.
+        Blurbs for external works and deleted works are skipped.
+        """
+        soup = self.parse(html)
+        blurbs = []
+        for li_tag in soup.findAll('li', attrs={'class': 'blurb'}):
+            blurb = self._blurb(li_tag)
+            if blurb is not None:
+                blurbs.append(blurb)
+        return self._listing_page(blurbs, soup)
+
+    def readings_page(self, html):
+        """Parse one page of a user's reading history.
+
+        Returns a ``ListingPage`` whose items are ``ReadingHistoryItem``
+        instances.
+        """
+        soup = self.parse(html)
+
+        # The entries are stored in a list of the form:
+        #
+        #     <ol class="reading work index group">
+        #       <li id="work_12345" class="reading work blurb group">
+        #         ...
+        #       </li>
+        #       <li id="work_67890" class="reading work blurb group">
+        #         ...
+        #       </li>
+        #       ...
+        #     </ol>
+        #
+        ol_tag = soup.find('ol', attrs={'class': 'reading'})
+
+        entries = []
+        for li_tag in ol_tag.findAll('li', attrs={'class': 'blurb'}):
+            try:
+                work_id = li_tag.attrs['id'].replace('work_', '')
+
+                # Within the <li>, the last viewed date is stored as
+                #
+                #     <h4 class="viewed heading">
+                #         <span>Last viewed:</span> 24 Dec 2012
+                #
+                #         (Latest version.)
+                #
+                #         Viewed once
+                #     </h4>
+                #
+                h4_tag = li_tag.find('h4', attrs={'class': 'viewed'})
+                date = _parse_viewed_date(h4_tag.contents[2])
+
+                entries.append(ReadingHistoryItem(work_id, date))
+            except KeyError:
+                # A deleted work shows up as
+                #
+                #      <li class="deleted reading work blurb group">
+                #
+                # There's nothing that we can do about that, so just skip
+                # over it.
+                if 'deleted' in li_tag.attrs['class']:
+                    pass
+                else:
+                    raise
+
+        return self._listing_page(entries, soup)
+
+
+class SelectolaxParser(object):
+    """Parses pages with selectolax, using CSS selectors.
+
+    This extracts exactly the same data as ``SoupParser``; see the comments
+    there for what the HTML looks like.  The one difference is that the
+    summary HTML is re-serialised by Lexbor, so void elements come out as
+    ``<br>`` rather than ``<br/>``.
+    """
+
+    name = 'selectolax'
+
+    def __init__(self, vocabulary=None):
+        if vocabulary is None:
+            vocabulary = TAGS
+        self.vocabulary = vocabulary
+
+    def __repr__(self):
+        return '%s()' % type(self).__name__
+
+    def parse(self, html):
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser(html)
+
+    def parse_metadata(self, html):
+        return self.parse(_metadata_region(html))
+
+    def parse_kudos(self, html):
+        return self.parse(_kudos_region(html))
+
+    def _first_text(self, node):
+        # The equivalent of ``tag.contents[0]`` in BeautifulSoup.
+        child = node.child
+        if child is None:
+            return ''
+        if child.tag == '-text':
+            return child.text_content
+        return child.text()
+
+    def work_metadata(self, tree):
+        raw = {}
+        for dd_node in tree.css('dl.meta dd'):
+            classes = (dd_node.attributes.get('class') or '').split()
+            for class_name in classes:
+                field = _DD_FIELDS.get(class_name)
+                if field is None or field in raw:
+                    continue
+                if 'tags' in classes:
+                    raw[field] = [
+                        self._first_text(li_node.child)
+                        for li_node in dd_node.css('li')]
+                elif field == 'bookmarks':
+                    raw[field] = self._first_text(dd_node.child)
+                else:
+                    raw[field] = self._first_text(dd_node)
+
+        title = None
+        title_node = tree.css_first('h2.title')
+        if title_node is not None:
+            title = self._first_text(title_node).strip()
+
+        authors = []
+        byline_node = tree.css_first('h3.byline')
+        if byline_node is not None:
+            authors = [
+                self._first_text(node).strip()
+                for node in byline_node.iter(include_text=False)]
+
+        summary = None
+        blockquote = tree.css_first('div.summary blockquote')
+        if blockquote is not None:
+            summary = ''.join(
+                node.html for node in blockquote.iter(include_text=True)
+            ).strip()
+
+        return _build_metadata(raw, title=title, authors=authors,
+                               summary=summary, vocabulary=self.vocabulary)
+
+    def kudos_left_by(self, tree):
+        for a_node in tree.css('div#kudos a'):
+            if a_node.attributes.get('id') in _KUDOS_CONTROLS:
+                continue
+            yield a_node.attributes['href'].replace('/users/', '')
+
+    def _has_next_page(self, tree):
+        next_button = tree.css_first('li.next')
+        if next_button is None:
+            return False
+        return next_button.css_first('span.disabled') is None
+
+    def _listing_page(self, items, tree):
+        page_count = None
+        pagination = tree.css_first('ol.pagination')
+        if pagination is not None:
+            page_count = _page_count(
+                li.text() for li in pagination.css('li'))
+        return ListingPage(items, self._has_next_page(tree), page_count)
+
+    def bookmarks_page(self, html):
+        tree = self.parse(html)
+        work_ids = []
+        for a_node in tree.css('ol.bookmark li.blurb h4.heading a'):
+            href = a_node.attributes.get('href') or ''
+            if 'works' in href and 'external_works' not in href:
+                work_ids.append(href.replace('/works/', ''))
+        return self._listing_page(work_ids, tree)
+
+    def _blurb(self, li_node):
+        heading = self._blurb_heading(li_node)
+        if heading is None:
+            return None
+        work_id, title, authors = heading
+
+        raw = self._blurb_tags(li_node)
+        raw.update(self._blurb_stats(li_node))
+
+        summary = None
+        blockquote = li_node.css_first('blockquote.summary')
+        if blockquote is not None:
+            summary = ''.join(
+                node.html for node in blockquote.iter(include_text=True)
+            ).strip()
+
+        updated = None
+        datetime_node = li_node.css_first('p.datetime')
+        if datetime_node is not None:
+            updated = _parse_viewed_date(datetime_node.text())
+
+        meta = _build_metadata(raw, title=title, authors=authors,
+                               summary=summary, vocabulary=self.vocabulary)
+        return Blurb(work_id, meta, updated)
+
+    def _blurb_heading(self, li_node):
+        heading = li_node.css_first('h4.heading')
+        if heading is None:
+            return None
+        work_id = title = None
+        authors = []
+        for a_node in heading.css('a'):
+            href = a_node.attributes.get('href') or ''
+            match = _WORK_HREF_REGEX.match(href)
+            if a_node.attributes.get('rel') == 'author':
+                authors.append(a_node.text().strip())
+            elif match is not None and work_id is None:
+                work_id = match.group('work_id')
+                title = a_node.text().strip()
+        if work_id is None:
+            return None
+        return work_id, title, authors
+
+    def _blurb_tags(self, li_node):
+        raw = {}
+        fandoms_node = li_node.css_first('h5.fandoms')
+        if fandoms_node is not None:
+            raw['fandoms'] = [
+                a_node.text().strip() for a_node in fandoms_node.css('a.tag')]
+
+        for field in ('rating', 'category'):
+            span = li_node.css_first('span.%s' % field)
+            if span is not None and span.attributes.get('title'):
+                raw[field] = span.attributes['title'].split(', ')
+
+        for tag_node in li_node.css('ul.tags li'):
+            for class_name in _node_classes(tag_node):
+                field = _BLURB_TAG_FIELDS.get(class_name)
+                if field is not None:
+                    raw.setdefault(field, []).append(tag_node.text().strip())
+        return raw
+
+    def _blurb_stats(self, li_node):
+        raw = {}
+        for dd_node in li_node.css('dl.stats dd'):
+            for class_name in _node_classes(dd_node):
+                field = _DD_FIELDS.get(class_name)
+                text = dd_node.text().strip()
+                if field is not None and text:
+                    raw[field] = text
+        return raw
+
+    def blurbs_page(self, html):
+        tree = self.parse(html)
+        blurbs = []
+        for li_node in tree.css('li.blurb'):
+            blurb = self._blurb(li_node)
+            if blurb is not None:
+                blurbs.append(blurb)
+        return self._listing_page(blurbs, tree)
+
+    def readings_page(self, html):
+        tree = self.parse(html)
+        entries = []
+        for li_node in tree.css('ol.reading li.blurb'):
+            li_id = li_node.attributes.get('id')
+            if li_id is None:
+                # A deleted work, which we skip, as above.
+                if 'deleted' in (li_node.attributes.get('class') or ''):
+                    continue
+                raise KeyError('id')
+            h4_node = li_node.css_first('h4.viewed')
+            entries.append(ReadingHistoryItem(
+                li_id.replace('work_', ''),
+                _parse_viewed_date(h4_node.text())))
+        return self._listing_page(entries, tree)
+
+
+def _node_classes(node):
+    return (node.attributes.get('class') or '').split()
+
+
+class KudosScanner(HTMLParser):
+    """An incremental parser for the usernames on a page of kudos.
+
+    This doesn't build a tree: feed it the page a chunk at a time, and call
+    ``drain()`` after each chunk to get the usernames it's seen so far.
+    This means you can scan a page with thousands of kudos in constant
+    memory, and stop as soon as you've found what you're looking for.
+
+    After the whole page has been fed in, ``has_next_page`` tells you if
+    there's another page of kudos to fetch.
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.has_next_page = False
+        self._usernames = []
+        self._kudos_depth = 0
+        self._in_next_button = False
+
+    def drain(self):
+        """Returns the usernames seen since the last call to ``drain()``."""
+        usernames, self._usernames = self._usernames, []
+        return usernames
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        # The usernames are links inside <div id="kudos">.  We track how
+        # deeply nested we are so we know when we've left it.
+        if tag == 'div':
+            if self._kudos_depth:
+                self._kudos_depth += 1
+            elif attrs.get('id') == 'kudos':
+                self._kudos_depth = 1
+        elif tag == 'a' and self._kudos_depth:
+            href = attrs.get('href') or ''
+            if (attrs.get('id') not in _KUDOS_CONTROLS and
+                    href.startswith('/users/')):
+                self._usernames.append(href.replace('/users/', ''))
+
+        # The pagination works the same way as it does on every other
+        # listing: see ``SoupParser._has_next_page()``.
+        if tag == 'li' and 'next' in (attrs.get('class') or '').split():
+            self._in_next_button = True
+        elif tag == 'a' and self._in_next_button:
+            self.has_next_page = True
+
+    def handle_endtag(self, tag):
+        if tag == 'div' and self._kudos_depth:
+            self._kudos_depth -= 1
+        elif tag == 'li':
+            self._in_next_button = False
+
+
+class ChapterScanner(HTMLParser):
+    """An incremental parser for the chapters on a work page.
+
+    This works like ``KudosScanner``: feed it the page a chunk at a time,
+    and call ``drain()`` to get the ``Chapter`` instances it's finished so
+    far.  Only the chapter currently being read is kept in memory, so it
+    works for the ``view_full_work=true`` page of even the longest works.
+
+    After the whole page has been fed in, ``restricted`` tells you if it was
+    the page saying the work is only available to logged-in users.
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.restricted = False
+        self._chapters = []
+        self._depth = 0
+        self._number = None
+        self._title = None
+        self._title_parts = None
+        self._text_depth = None
+        self._text_parts = None
+        self._in_landmark = False
+        self._notice_tag = None
+        self._notice_parts = None
+
+    def drain(self):
+        """Returns the chapters finished since the last call to ``drain()``."""
+        chapters, self._chapters = self._chapters, []
+        return chapters
+
+    # The chapters are kept in a <div> of the form
+    #
+    #     <div id="chapters" role="article">
+    #       <div class="chapter" id="chapter-1">
+    #         <div class="chapter preface group" role="complementary">
+    #           <h3 class="title">
+    #             <a href="/works/[work_id]/chapters/[id]">Chapter 1</a>:
+    #             [title]
+    #           </h3>
+    #           ...
+    #         </div>
+    #         <div class="userstuff module" role="article">
+    #           <h3 class="landmark heading" id="work">Chapter Text</h3>
+    #           [chapter_html]
+    #         </div>
+    #       </div>
+    #       ...
+    #     </div>
+    #
+    # For a work with only one chapter, the <div class="userstuff"> comes
+    # straight inside <div id="chapters">.  We track how deeply nested we
+    # are in <div> tags, so we know when we've left each one.
+    #
+    # A restricted work has a notice instead, of the form
+    #
+    #     <p class="notice">This work is only available to registered
+    #       users of the Archive.</p>
+    #
+    # The text of an element can be split across several calls to
+    # ``handle_data()``, so we collect all of it before looking at it.
+
+    def handle_starttag(self, tag, attrs):
+        if self._text_parts is not None:
+            self._chapter_text_starttag(tag, attrs)
+            return
+
+        classes = _classes(attrs)
+        if not self._depth and 'notice' in classes:
+            self._notice_tag = tag
+            self._notice_parts = []
+
+        if tag == 'div':
+            self._div_starttag(dict(attrs), classes)
+        elif tag == 'h3' and self._depth and 'title' in classes:
+            self._title_parts = []
+
+    def _chapter_text_starttag(self, tag, attrs):
+        # The text of a chapter is kept as HTML, apart from the "Chapter
+        # Text" heading.
+        if tag == 'div':
+            self._depth += 1
+        elif tag == 'h3' and 'landmark' in _classes(attrs):
+            self._in_landmark = True
+            return
+        self._text_parts.append(self.get_starttag_text())
+
+    def _div_starttag(self, attrs, classes):
+        if self._depth:
+            self._depth += 1
+        elif attrs.get('id') == 'chapters':
+            self._depth = 1
+            return
+        else:
+            return
+
+        div_id = attrs.get('id') or ''
+        if 'chapter' in classes and div_id.startswith('chapter-'):
+            self._number = int(div_id[len('chapter-'):])
+            self._title = None
+        elif 'userstuff' in classes:
+            self._text_depth = self._depth
+            self._text_parts = []
+
+    def handle_startendtag(self, tag, attrs):
+        if self._text_parts is not None:
+            self._text_parts.append(self.get_starttag_text())
+        else:
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self._text_parts is not None:
+            if tag == 'div':
+                if self._depth == self._text_depth:
+                    self._finish_chapter()
+                    self._depth -= 1
+                    return
+                self._depth -= 1
+            elif tag == 'h3' and self._in_landmark:
+                self._in_landmark = False
+                return
+            self._text_parts.append('</%s>' % tag)
+            return
+
+        if tag == self._notice_tag:
+            notice = ' '.join(''.join(self._notice_parts).split())
+            if _RESTRICTED_TEXT in notice:
+                self.restricted = True
+            self._notice_tag = self._notice_parts = None
+
+        if tag == 'div' and self._depth:
+            self._depth -= 1
+        elif tag == 'h3' and self._title_parts is not None:
+            self._title = ' '.join(''.join(self._title_parts).split())
+            self._title_parts = None
+
+    def handle_data(self, data):
+        if self._notice_parts is not None:
+            self._notice_parts.append(data)
+
+        if self._text_parts is not None:
+            if not self._in_landmark:
+                self._text_parts.append(xml_escape(data))
+        elif self._title_parts is not None:
+            self._title_parts.append(data)
+
+    def _finish_chapter(self):
+        self._chapters.append(Chapter(
+            number=self._number or 1,
+            title=self._title,
+            html=''.join(self._text_parts).strip()))
+        self._text_depth = None
+        self._text_parts = None
+
+
+def _classes(attrs):
+    for name, value in attrs:
+        if name == 'class':
+            return (value or '').split()
+    return []
+
+
+DEFAULT_PARSER = 'html.parser'
+
+# The built-in backends: the module each one needs (if it isn't always
+# available), and a function that creates it.
+_BACKENDS = {
+    'html.parser': (None, lambda: SoupParser('html.parser')),
+    'lxml': ('lxml', lambda: SoupParser('lxml')),
+    'selectolax': ('selectolax.lexbor', lambda: SelectolaxParser()),
+}
+
+_parsers = {}
+
+
+def get_parser(parser=None):
+    """Returns the parser backend with this name.
+
+    If ``parser`` is None, returns the default backend.  If it's already
+    a parser object, it's returned unchanged.  If the library a backend
+    needs isn't installed, this falls back to the default.
+    """
+    if parser is None:
+        parser = DEFAULT_PARSER
+    if not isinstance(parser, str):
+        return parser
+
+    if parser not in _parsers:
+        try:
+            requirement, factory = _BACKENDS[parser]
+        except KeyError:
+            raise ValueError('Unrecognised parser: %r' % parser)
+        if requirement is not None:
+            try:
+                importlib.import_module(requirement)
+            except ImportError:
+                return get_parser(DEFAULT_PARSER)
+        _parsers[parser] = factory()
+
+    return _parsers[parser]
@@ -0,0 +1,186 @@
+# -*- encoding: utf-8
+"""Fetching and parsing works in a pipeline, across several processes.
+
+``AO3.works()`` fetches pages on a pool of threads, which keeps the network
+busy -- but parsing holds the GIL, so however many threads there are, only
+one core is ever parsing.  When you're loading a lot of works, that's the
+bottleneck.
+
+``pipeline_works()`` splits the work into two stages:
+
+1.  A pool of threads downloads the raw HTML for each work.
+2.  A pool of processes parses each page into a ``WorkMetadata`` record.
+
+Each stage only runs a little way ahead of the next -- the threads stop
+downloading when enough pages are waiting to be parsed, and the processes
+stop when enough results are waiting for you -- so memory stays bounded
+however many IDs you pass in.  ``AO3.pipeline()`` is the easy way to use it:
+
+    >>> for work in api.pipeline(work_ids, processes=16):
+    ...     print(work.title)
+
+The works you get back have their metadata already filled in; anything
+else (like the text or the full list of kudos) is fetched again if you ask
+for it.  Results come back in the order they finish, not the order of
+``ids``.
+
+Parsing in other processes isn't reported to the instrumentation sinks,
+because the events would happen in the wrong process.
+"""
+
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, wait
+)
+import multiprocessing
+import sys
+
+from .parsers import TAGS, _metadata_region, get_parser
+from .utils import threaded_map
+from .works import RestrictedWork, Work, WorkNotFound, fetch_work_html
+
+# The attributes of ``WorkMetadata`` that are lists of tags.
+_TAG_FIELDS = [
+    'rating', 'warnings', 'category', 'fandoms', 'relationship',
+    'characters', 'additional_tags',
+]
+
+
+def parse_metadata(html, parser=None):
+    """Parse the metadata from the HTML of a work page.
+
+    This is what runs in the worker processes, so it only takes and returns
+    things that can be pickled.
+
+    :param parser: the name of a parser backend, as for ``get_parser()``.
+    """
+    parser = get_parser(parser)
+    return parser.work_metadata(parser.parse_metadata(html))
+
+
+def _intern_metadata(meta, vocabulary=TAGS):
+    # Anything that comes back from another process has been through
+    # pickle, so it has its own copy of every string.  Swap them for the
+    # shared copies in this process.
+    for name in _TAG_FIELDS:
+        setattr(meta, name, vocabulary.intern_all(getattr(meta, name)))
+    meta.language = vocabulary.intern(meta.language)
+    return meta
+
+
+def _parser_name(parser):
+    # The parser has to be sent to the worker processes by name; parser
+    # objects (and the instrumentation around them) don't pickle.
+    if parser is None or isinstance(parser, str):
+        return parser
+    return parser.name
+
+
+def pipeline_works(ids, sess=None, parser=None, base_url=None,
+                   max_workers=8, processes=None, max_pending=None,
+                   on_error=None):
+    """Fetch works on a pool of threads and parse them on a pool of
+    processes, generating a ``Work`` for each one.
+
+    :param ids: an iterable of work IDs.
+    :param sess: the ``requests.Session`` to download pages with.
+    :param parser: the name of the parser backend to use in the worker
+        processes.
+    :param base_url: the address of AO3.
+    :param max_workers: the number of threads downloading pages.
+    :param processes: the number of processes parsing pages.  Defaults to
+        the number of CPUs.
+    :param max_pending: the most pages that can be waiting to be parsed (or
+        parsed but waiting for you) at once.  Defaults to twice
+        ``processes``.
+    :param on_error: called as ``on_error(work_id, exc)`` for any work
+        that raises ``WorkNotFound`` or ``RestrictedWork``.  These works
+        are skipped.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if max_pending is None:
+        max_pending = processes * 2
+
+    kwargs = {}
+    if base_url is not None:
+        kwargs['base_url'] = base_url
+
+    def fetch(work_id):
+        # We only send the part of the page with the metadata to the
+        # worker processes, which saves pickling the text of the work.
+        return _metadata_region(fetch_work_html(work_id, sess=sess, **kwargs))
+
+    with _process_pool(processes) as executor:
+        # ``threaded_map`` only downloads a couple of pages ahead of what
+        # we've taken from it, so when the parsing falls behind and we stop
+        # taking pages, the downloads stop too.  If you stop taking works,
+        # closing it stops them straight away.
+        pages = _downloaded(
+            threaded_map(fetch, ids, max_workers=max_workers, ordered=False),
+            on_error=on_error)
+        try:
+            parsed = _parse_pages(
+                pages, executor, _parser_name(parser),
+                max_pending=max_pending)
+            for work_id, meta in parsed:
+                yield Work(id=work_id, sess=sess, parser=parser,
+                           metadata_only=True, metadata=meta, **kwargs)
+        finally:
+            pages.close()
+
+
+def _process_pool(processes):
+    # The pool starts its processes when the first page is sent to it, and
+    # by then the download threads are running.  Forking a process that
+    # has other threads can copy a lock that one of them is holding (e.g.
+    # in urllib3's connection pool), and deadlock the child -- so where we
+    # can, start the workers fresh rather than forking them.
+    if sys.version_info < (3, 7):
+        return ProcessPoolExecutor(max_workers=processes)
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+    else:
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=processes, mp_context=context)
+
+
+def _downloaded(pages, on_error=None):
+    """Generates ``(work_id, html)`` for each page from ``threaded_map()``
+    that downloaded, and passes the errors to ``on_error``."""
+    for work_id, future in pages:
+        try:
+            html = future.result()
+        except (RestrictedWork, WorkNotFound) as exc:
+            if on_error is not None:
+                on_error(work_id, exc)
+            continue
+        yield work_id, html
+
+
+def _parse_pages(pages, executor, parser_name, max_pending):
+    """Parses pages on a process pool, generating ``(work_id, metadata)`` as
+    they finish.  At most ``max_pending`` pages are in the pool at once."""
+    pending = {}
+
+    def finished(done):
+        return [
+            (pending.pop(future), _intern_metadata(future.result()))
+            for future in done]
+
+    for work_id, html in pages:
+        pending[executor.submit(parse_metadata, html, parser_name)] = work_id
+
+        # If there are too many pages waiting, wait for some to finish
+        # before taking any more; otherwise, just pass on the ones that
+        # have finished already.
+        if len(pending) >= max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        else:
+            done = [f for f in list(pending) if f.done()]
+        for result in finished(done):
+            yield result
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for result in finished(done):
+            yield result
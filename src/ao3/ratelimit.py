@@ -0,0 +1,164 @@
+# -*- encoding: utf-8
+"""Rate limiting for requests to AO3.
+
+AO3 will start returning ``429 Too Many Requests`` (or ``503 Service
+Unavailable``) if you make requests too quickly.  ``RateLimiter`` is a
+token bucket that spaces out requests, and ``RateLimitedAdapter`` plugs it
+into a ``requests.Session``:
+
+    >>> api = AO3(rate_limiter=RateLimiter(rate=2))
+
+The limiter is shared by every thread using the session.  When AO3 tells
+us to slow down, every thread waits for as long as the ``Retry-After``
+header asks, the rate is halved, and the request is retried.  The rate then
+creeps back up while requests are succeeding.
+"""
+
+from email.utils import mktime_tz, parsedate_tz
+import collections
+import threading
+import time
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+
+# The status codes AO3 uses to tell us we're going too fast.
+THROTTLED_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value, now=None):
+    """Returns the number of seconds asked for by a Retry-After header.
+
+    The header is either a number of seconds, or an HTTP date.  Returns
+    None if the header is missing or can't be parsed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(0, mktime_tz(parsed) - now)
+
+
+class RateLimiter(object):
+    """A token bucket that adapts to throttling.
+
+    :param rate: the most requests per second to make.
+    :param burst: how many requests can be made at once after a quiet
+        period.
+    :param min_rate: the rate will never be slowed below this.
+    :param backoff: how long (in seconds) to pause if we're throttled
+        without a ``Retry-After`` header.
+
+    The ``stats`` attribute counts the ``requests`` made through the
+    limiter, and the number of times we were ``throttled``.
+    """
+
+    def __init__(self, rate=1.0, burst=1, min_rate=0.05, backoff=30,
+                 clock=time.time, sleep=time.sleep):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = burst
+        self.min_rate = min_rate
+        self.backoff = backoff
+        self.stats = collections.Counter(requests=0, throttled=0)
+
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._last_refill = clock()
+        self._blocked_until = 0
+
+    def __repr__(self):
+        return '%s(rate=%r)' % (type(self).__name__, self.rate)
+
+    def acquire(self):
+        """Block until we're allowed to make a request.
+
+        Returns how long (in seconds) we had to wait.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            # Take a token now, even if it's one we have to wait for.  The
+            # count can go negative, which makes anybody after us wait for
+            # their turn too.
+            wait = max(0, self._blocked_until - now)
+            if self._tokens < 1:
+                wait = max(wait, (1 - self._tokens) / self.rate)
+            self._tokens -= 1
+            self.stats['requests'] += 1
+
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def throttled(self, retry_after=None):
+        """Tell the limiter that AO3 has asked us to slow down."""
+        if retry_after is None:
+            retry_after = self.backoff
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+            self._blocked_until = max(
+                self._blocked_until, self._clock() + retry_after)
+            self.stats['throttled'] += 1
+
+    def succeeded(self):
+        """Tell the limiter that a request went through without throttling."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(
+                    self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RateLimitedAdapter(BaseAdapter):
+    """A transport adapter that sends requests through a ``RateLimiter``.
+
+    Throttled requests are retried up to ``max_retries`` times, after which
+    the 429/503 response is returned as-is.  Requests are sent with
+    ``adapter``, which defaults to a plain ``HTTPAdapter``.
+
+    The response records how many times it was ``retries``, and how long we
+    spent waiting for the limiter (``rate_limit_wait``), for
+    ``ao3.metrics``.
+    """
+
+    def __init__(self, limiter, adapter=None, max_retries=5):
+        super(RateLimitedAdapter, self).__init__()
+        self.limiter = limiter
+        self.adapter = adapter or HTTPAdapter()
+        self.max_retries = max_retries
+
+    def send(self, request, **kwargs):
+        waited = 0
+        for attempt in range(self.max_retries + 1):
+            waited += self.limiter.acquire()
+            resp = self.adapter.send(request, **kwargs)
+            resp.retries = attempt
+            resp.rate_limit_wait = waited
+
+            if resp.status_code not in THROTTLED_STATUS_CODES:
+                self.limiter.succeeded()
+                return resp
+
+            self.limiter.throttled(
+                parse_retry_after(resp.headers.get('Retry-After')))
+            if attempt < self.max_retries:
+                resp.close()
+
+        return resp
+
+    def close(self):
+        self.adapter.close()
@@ -0,0 +1,225 @@
+# -*- encoding: utf-8
+"""Listing the works with a tag, or the results of a search.
+
+These are the two ways to find works on AO3 without knowing their IDs:
+
+*   ``AO3.tag_works(tag)`` lists the works from a tag's page,
+    ``/tags/<tag>/works``, which you can filter and sort the same way as
+    the "Sort and Filter" form on that page.
+*   ``AO3.search_works(...)`` lists the results of the works search,
+    ``/works/search``.
+
+Both generate ``WorkBlurb`` instances, read from the listing pages, so
+they make one request per page of twenty works.  After the first page,
+the rest are fetched ``max_workers`` at a time.  Filtering and sorting
+happen on AO3, so you only download the works you want:
+
+    >>> for blurb in api.tag_works('Star Wars', sort_by='kudos',
+    ...                            complete=True, words_from=50000):
+    ...     print(blurb.title)
+
+If you only want the first few results, stop when you've got them (e.g.
+with ``itertools.islice``); at most a few pages beyond that are fetched.
+"""
+
+from datetime import date
+
+try:
+    from urllib.parse import quote, urlencode
+except ImportError:  # Python 2
+    from urllib import quote, urlencode
+
+from .parsers import get_parser
+from .utils import AO3_URL, iter_listing
+from .works import WorkBlurb
+
+# The orders that works can be listed in, and the names AO3 uses for them.
+SORT_COLUMNS = {
+    'updated': 'revised_at',
+    'posted': 'created_at',
+    'author': 'authors_to_sort_on',
+    'title': 'title_to_sort_on',
+    'words': 'word_count',
+    'hits': 'hits',
+    'kudos': 'kudos_count',
+    'comments': 'comments_count',
+    'bookmarks': 'bookmarks_count',
+}
+
+# Maps the arguments of ``tag_works()`` to the fields of the filter form on
+# a tag's works page.
+_TAG_FILTERS = {
+    'sort_by': 'sort_column',
+    'sort_direction': 'sort_direction',
+    'complete': 'complete',
+    'crossover': 'crossover',
+    'words_from': 'words_from',
+    'words_to': 'words_to',
+    'updated_from': 'date_from',
+    'updated_to': 'date_to',
+    'language': 'language_id',
+    'include_tags': 'other_tag_names',
+    'exclude_tags': 'excluded_tag_names',
+    'query': 'query',
+}
+
+# Maps the arguments of ``search_works()`` to the fields of the works
+# search form.
+_SEARCH_FIELDS = {
+    'query': 'query',
+    'title': 'title',
+    'creators': 'creators',
+    'fandoms': 'fandom_names',
+    'characters': 'character_names',
+    'relationships': 'relationship_names',
+    'tags': 'freeform_names',
+    'complete': 'complete',
+    'crossover': 'crossover',
+    'single_chapter': 'single_chapter',
+    'words': 'word_count',
+    'hits': 'hits',
+    'kudos': 'kudos_count',
+    'comments': 'comments_count',
+    'bookmarks': 'bookmarks_count',
+    'updated': 'revised_at',
+    'language': 'language_id',
+    'sort_by': 'sort_column',
+    'sort_direction': 'sort_direction',
+}
+
+# The search form's "yes or no" fields come in two shapes.  Most are radio
+# buttons, with an empty "All works" option:
+#
+#     <input type="radio" name="work_search[complete]" value="T" />
+#     <input type="radio" name="work_search[complete]" value="F" />
+#
+# but a few are checkboxes, which Rails sends as "1", or as "0" from the
+# hidden input alongside it when the box isn't ticked:
+#
+#     <input name="work_search[single_chapter]" type="hidden" value="0" />
+#     <input type="checkbox" name="work_search[single_chapter]" value="1" />
+#
+_CHECKBOX_FIELDS = set(['single_chapter'])
+
+# AO3 replaces the characters in a tag name that would confuse its URLs.
+_TAG_ESCAPES = [
+    ('/', '*s*'),
+    ('&', '*a*'),
+    ('.', '*d*'),
+    ('?', '*q*'),
+    ('#', '*h*'),
+]
+
+
+def tag_url(tag, base_url=AO3_URL):
+    """Returns the URL of the page listing the works with a tag."""
+    for char, escape in _TAG_ESCAPES:
+        tag = tag.replace(char, escape)
+    return '%s/tags/%s/works' % (
+        base_url, quote(tag.encode('utf8'), safe='*'))
+
+
+def search_url(base_url=AO3_URL):
+    """Returns the URL of the works search."""
+    return '%s/works/search' % base_url
+
+
+def _param_value(name, value):
+    if name == 'sort_by':
+        if value not in SORT_COLUMNS:
+            raise ValueError('Cannot sort by %r' % value)
+        return SORT_COLUMNS[value]
+    if name == 'sort_direction' and value not in ('asc', 'desc'):
+        raise ValueError('Unrecognised sort direction: %r' % value)
+    if isinstance(value, bool):
+        if name in _CHECKBOX_FIELDS:
+            return '1' if value else '0'
+        return 'T' if value else 'F'
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ','.join(value)
+    return value
+
+
+def work_search_params(fields, **kwargs):
+    """Turns keyword arguments into the query parameters for a listing.
+
+    :param fields: maps each argument to the name of the AO3 form field,
+        like ``_TAG_FILTERS``.  Arguments that are None are left out.
+    :returns: a list of ``(name, value)`` pairs, in a consistent order.
+    """
+    params = []
+    for name, value in sorted(kwargs.items()):
+        if value is None:
+            continue
+        if name not in fields:
+            raise TypeError('Unexpected argument: %r' % name)
+        params.append((
+            'work_search[%s]' % fields[name], _param_value(name, value)))
+    return params
+
+
+def listing_page_url(url, params, page_no):
+    """Returns the URL of one page of a listing."""
+    params = list(params) + [('page', page_no)]
+    return '%s?%s' % (url, urlencode([
+        (k, v.encode('utf8') if isinstance(v, type(u'')) else v)
+        for k, v in params]))
+
+
+class ListingNotFound(Exception):
+    pass
+
+
+def check_listing_response(url, status_code, text):
+    """Raises an appropriate exception if a listing couldn't be fetched."""
+    if status_code == 404:
+        raise ListingNotFound('Unable to find a listing at %r' % url)
+    elif status_code != 200:
+        raise RuntimeError('Unexpected error from AO3 API: %r (%r)' % (
+            text, status_code))
+
+
+def iter_blurbs(url, params, sess, parser=None, base_url=AO3_URL,
+                max_workers=4):
+    """Generates a ``WorkBlurb`` for every work in a paginated listing.
+
+    :param url: the URL of the listing, without any query parameters.
+    :param params: the query parameters, from ``work_search_params()``.
+    :param sess: the ``requests.Session`` to fetch pages with.
+    """
+    parser = get_parser(parser)
+
+    def get_page(page_no):
+        page_url = listing_page_url(url, params, page_no)
+        req = sess.get(page_url)
+        check_listing_response(page_url, req.status_code, req.text)
+        return parser.blurbs_page(req.text)
+
+    for blurb in iter_listing(get_page, max_workers=max_workers):
+        yield WorkBlurb(blurb, sess=sess, parser=parser, base_url=base_url)
+
+
+def tag_works(tag, sess, parser=None, base_url=AO3_URL, max_workers=4,
+              **filters):
+    """Generates a ``WorkBlurb`` for every work with a tag.
+
+    See ``AO3.tag_works()`` for the filters.
+    """
+    return iter_blurbs(
+        tag_url(tag, base_url=base_url),
+        work_search_params(_TAG_FILTERS, **filters),
+        sess=sess, parser=parser, base_url=base_url, max_workers=max_workers)
+
+
+def search_works(sess, parser=None, base_url=AO3_URL, max_workers=4,
+                 **fields):
+    """Generates a ``WorkBlurb`` for every result of a works search.
+
+    See ``AO3.search_works()`` for the search fields.
+    """
+    return iter_blurbs(
+        search_url(base_url=base_url),
+        work_search_params(_SEARCH_FIELDS, **fields),
+        sess=sess, parser=parser, base_url=base_url, max_workers=max_workers)
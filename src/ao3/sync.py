@@ -0,0 +1,130 @@
+# -*- encoding: utf-8
+"""Incremental syncing of a user's reading history.
+
+The reading history is sorted with the most recently read works first, so
+if we remember where we got to last time, we only need to read the first
+page or two to find everything that's new:
+
+    >>> new_entries = sync_reading_history(api.user, 'checkpoint.json')
+
+Because AO3 only tells us the date (not the time) when you last read
+something, the checkpoint remembers the newest date we've seen, and the IDs
+of every work read on that date.
+"""
+
+from datetime import datetime
+import collections
+import io
+import json
+import os
+
+
+ReadingHistoryCheckpoint = collections.namedtuple(
+    'ReadingHistoryCheckpoint', ['last_read', 'work_ids'])
+
+
+def _rename_over(src, dst):
+    # ``os.rename`` replaces ``dst`` atomically on POSIX, but on Windows it
+    # won't replace a file that exists, so we have to remove it first.
+    try:
+        os.rename(src, dst)
+    except OSError:
+        os.remove(dst)
+        os.rename(src, dst)
+
+
+# ``os.replace`` is new in Python 3.3.
+_replace = getattr(os, 'replace', _rename_over)
+
+
+def entries_since(entries, checkpoint):
+    """Generates the entries in a reading history that are newer than a
+    checkpoint.
+
+    This stops as soon as it gets to an entry older than the checkpoint,
+    so ``entries`` can be (and usually is) a lazy iterator over the pages
+    of the reading history.
+
+    :param entries: ``ReadingHistoryItem`` instances, most recent first.
+    :param checkpoint: a ``ReadingHistoryCheckpoint``, or None to get
+        every entry.
+    """
+    for entry in entries:
+        if checkpoint is not None:
+            if entry.last_read < checkpoint.last_read:
+                break
+            if (entry.last_read == checkpoint.last_read and
+                    entry.work_id in checkpoint.work_ids):
+                continue
+        yield entry
+
+
+def update_checkpoint(checkpoint, new_entries):
+    """Returns the checkpoint to use after seeing ``new_entries``."""
+    if not new_entries:
+        return checkpoint
+
+    last_read = max(entry.last_read for entry in new_entries)
+    work_ids = set(
+        entry.work_id for entry in new_entries
+        if entry.last_read == last_read)
+    if checkpoint is not None and checkpoint.last_read == last_read:
+        work_ids |= checkpoint.work_ids
+
+    return ReadingHistoryCheckpoint(
+        last_read=last_read, work_ids=frozenset(work_ids))
+
+
+def load_checkpoint(path):
+    """Load a checkpoint from a JSON file, or return None if there isn't
+    one."""
+    try:
+        with io.open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (IOError, OSError):
+        return None
+
+    return ReadingHistoryCheckpoint(
+        last_read=datetime.strptime(data['last_read'], '%Y-%m-%d').date(),
+        work_ids=frozenset(data['work_ids']))
+
+
+def save_checkpoint(path, checkpoint):
+    """Save a checkpoint to a JSON file."""
+    data = json.dumps({
+        'last_read': checkpoint.last_read.isoformat(),
+        'work_ids': sorted(checkpoint.work_ids),
+    })
+
+    # Write to a temporary file first, so a crash halfway through writing
+    # can't leave us with a corrupt checkpoint.
+    tmp_path = path + '.tmp'
+    with io.open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(type(u'')(data))
+    _replace(tmp_path, path)
+
+
+def sync_reading_history(user, path):
+    """Returns everything in a user's reading history that's new since the
+    last time this was called with the same checkpoint file.
+
+    The first time you call this, you get the entire reading history.  After
+    that, it only fetches pages until it reaches entries it's already seen,
+    which is usually just the first page.
+
+    :param user: a logged-in ``User``.
+    :param path: the path to a JSON file for storing the checkpoint.  The
+        checkpoint is only updated once the new entries have been fetched.
+    :returns: a list of ``ReadingHistoryItem`` instances, most recent first.
+    """
+    checkpoint = load_checkpoint(path)
+
+    # Fetch one page at a time, so we stop as soon as we've caught up.
+    new_entries = list(entries_since(
+        user.reading_history(max_workers=1), checkpoint))
+
+    new_checkpoint = update_checkpoint(checkpoint, new_entries)
+    if new_checkpoint is not None and new_checkpoint != checkpoint:
+        save_checkpoint(path, new_checkpoint)
+
+    return new_entries
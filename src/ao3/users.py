@@ -1,132 +1,138 @@
 # -*- encoding: utf-8
 
-from datetime import datetime
-import collections
-import itertools
-import re
-
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup
 import requests
 
-from .works import Work
+from .parsers import get_parser
+from .utils import AO3_URL, iter_listing
+from .works import Work, WorkBlurb
+
+
+def parse_authenticity_token(html):
+    """Find the CSRF token on a page, which we need to log in."""
+    soup = BeautifulSoup(html, features='html.parser')
+    return soup.find('input', {'name': 'authenticity_token'})['value']
+
+
+def check_logged_in(html):
+    """Raises ``RuntimeError`` if this is the page for a failed login."""
+    # Unfortunately AO3 doesn't use HTTP status codes to communicate
+    # results -- it's a 200 even if the login fails.
+    if 'Please try again' in html:
+        raise RuntimeError(
+            'Error logging in to AO3; is your password correct?')
+
+
+def parse_bookmarks_page(html, parser=None):
+    """Parse one page of a user's bookmarks.
 
+    Returns a ``ListingPage`` whose items are work IDs.  External work
+    bookmarks are ignored.
+    """
+    return get_parser(parser).bookmarks_page(html)
 
-ReadingHistoryItem = collections.namedtuple(
-    'ReadingHistoryItem', ['work_id', 'last_read'])
+
+def parse_blurbs_page(html, parser=None):
+    """Parse one page of a listing of works, like a user's bookmarks.
+
+    Returns a ``ListingPage`` whose items are ``Blurb`` instances.  External
+    work bookmarks are ignored.
+    """
+    return get_parser(parser).blurbs_page(html)
+
+
+def parse_readings_page(html, parser=None):
+    """Parse one page of a user's reading history.
+
+    Returns a ``ListingPage`` whose items are ``ReadingHistoryItem``
+    instances.
+    """
+    return get_parser(parser).readings_page(html)
 
 
 class User(object):
 
-    def __init__(self, username, password, sess=None):
+    def __init__(self, username, password, sess=None, parser=None,
+                 base_url=AO3_URL):
         self.username = username
+        self.parser = get_parser(parser)
+        self.base_url = base_url
 
-        if sess == None:
+        if sess is None:
             sess = requests.Session()
 
-        req = sess.get('https://archiveofourown.org')
-        soup = BeautifulSoup(req.text, features='html.parser')
-
-        authenticity_token = soup.find('input', {'name': 'authenticity_token'})['value']
+        req = sess.get(base_url)
+        authenticity_token = parse_authenticity_token(req.text)
 
-        req = sess.post('https://archiveofourown.org/user_sessions', params={
+        req = sess.post(base_url + '/user_sessions', params={
             'authenticity_token': authenticity_token,
             'user_session[login]': username,
             'user_session[password]': password,
         })
-
-        # Unfortunately AO3 doesn't use HTTP status codes to communicate
-        # results -- it's a 200 even if the login fails.
-        if 'Please try again' in req.text:
-            raise RuntimeError(
-                'Error logging in to AO3; is your password correct?')
+        check_logged_in(req.text)
 
         self.sess = sess
+
     def __repr__(self):
         return '%s(username=%r)' % (type(self).__name__, self.username)
 
-    def bookmarks_ids(self):
+    def _iter_listing(self, api_url, parse_page, max_workers):
+        """Generates every item in a paginated listing, in order."""
+        return iter_listing(
+            lambda page_no: parse_page(
+                self.sess.get(api_url % page_no).text, self.parser),
+            max_workers=max_workers)
+
+    def bookmarks_ids(self, max_workers=4):
         """
-        Returns a list of the user's bookmarks' ids. Ignores external work bookmarks.
+        Returns a list of the user's bookmarks' ids. Ignores external work
+        bookmarks.
 
         User must be logged in to see private bookmarks.
+
+        After the first page, up to ``max_workers`` pages of bookmarks are
+        fetched at once.
         """
 
         api_url = (
-            'https://archiveofourown.org/users/%s/bookmarks?page=%%d'
-            % self.username)
+            '%s/users/%s/bookmarks?page=%%d'
+            % (self.base_url, self.username))
 
-        bookmarks = []
+        return list(self._iter_listing(
+            api_url, parse_bookmarks_page, max_workers=max_workers))
 
-        num_works = 0
-        for page_no in itertools.count(start=1):
-            # print("Finding page: \t" + str(page_no) + " of bookmarks. \t" + str(num_works) + " bookmarks ids found.")
-
-            req = self.sess.get(api_url % page_no)
-            soup = BeautifulSoup(req.text, features='html.parser')
-
-            # The entries are stored in a list of the form:
-            #
-            #     <ol class="bookmark index group">
-            #       <li id="bookmark_12345" class="bookmark blurb group" role="article">
-            #         ...
-            #       </li>
-            #       <li id="bookmark_67890" class="bookmark blurb group" role="article">
-            #         ...
-            #       </li>
-            #       ...
-            #     </o
-
-            ol_tag = soup.find('ol', attrs={'class': 'bookmark'})
-            
-
-            for li_tag in ol_tag.findAll('li', attrs={'class': 'blurb'}):
-                num_works = num_works + 1
-                try:
-                    # <h4 class="heading">
-                    #     <a href="/works/12345678">Work Title</a>
-                    #     <a href="/users/authorname/pseuds/authorpseud" rel="author">Author Name</a>
-                    # </h4>
-
-                    for h4_tag in li_tag.findAll('h4', attrs={'class': 'heading'}):
-                        for link in h4_tag.findAll('a'):
-                            if ('works' in link.get('href')) and not ('external_works' in link.get('href')):
-                                work_id = link.get('href').replace('/works/', '')
-                                bookmarks.append(work_id)
-                except KeyError:
-                    # A deleted work shows up as
-                    #
-                    #      <li class="deleted reading work blurb group">
-                    #
-                    # There's nothing that we can do about that, so just skip
-                    # over it.
-                    if 'deleted' in li_tag.attrs['class']:
-                        pass
-                    else:
-                        raise
-
-
-            # The pagination button at the end of the page is of the form
-            #
-            #     <li class="next" title="next"> ... </li>
-            #
-            # If there's another page of results, this contains an <a> tag
-            # pointing to the next page.  Otherwise, it contains a <span>
-            # tag with the 'disabled' class.
-            try:
-                next_button = soup.find('li', attrs={'class': 'next'})
-                if next_button.find('span', attrs={'class': 'disabled'}):
-                    break
-            except:
-                # In case of absence of "next"
-                break
+    def bookmark_blurbs(self, max_workers=4):
+        """
+        Returns a list of the user's bookmarks as ``WorkBlurb`` objects.
 
-        return bookmarks
+        These are read from the bookmark pages themselves, which show the
+        title, authors, tags and stats of every work -- so this only makes
+        one request per page of bookmarks, not one per work.  Use
+        ``blurb.work()`` to get the full ``Work`` for any you need.
+
+        User must be logged in to see private bookmarks.
+        """
+
+        api_url = (
+            '%s/users/%s/bookmarks?page=%%d'
+            % (self.base_url, self.username))
 
-    def bookmarks(self):
+        return [
+            WorkBlurb(blurb, sess=self.sess, parser=self.parser,
+                      base_url=self.base_url)
+            for blurb in self._iter_listing(
+                api_url, parse_blurbs_page, max_workers=max_workers)]
+
+    def bookmarks(self, lazy=False, metadata_only=False, low_memory=False):
         """
         Returns a list of the user's bookmarks as Work objects.
 
-        Takes forever.
+        Takes forever, unless you pass ``lazy=True``, in which case each work
+        is only fetched when you look at it.  If you only need the metadata
+        of each work, pass ``metadata_only=True`` to skip parsing the text,
+        or use ``bookmark_blurbs()`` to skip fetching the works at all.
+        If you're holding on to a lot of bookmarks, pass ``low_memory=True``
+        so each work only keeps what it extracted from its page.
 
         User must be logged in to see private bookmarks.
         """
@@ -136,7 +142,9 @@ class User(object):
         bookmarks = []
 
         for bookmark_id in bookmark_ids:
-            work = Work(bookmark_id, self.sess)
+            work = Work(bookmark_id, self.sess, lazy=lazy, parser=self.parser,
+                        metadata_only=metadata_only, base_url=self.base_url,
+                        low_memory=low_memory)
             bookmarks.append(work)
 
             bookmark_total = bookmark_total + 1
@@ -144,82 +152,26 @@ class User(object):
 
         return bookmarks
 
-    def reading_history(self):
+    def reading_history(self, max_workers=1):
         """Returns a list of articles in the user's reading history.
 
         This requires the user to turn on the Viewing History feature.
 
         This generates a series of ``ReadingHistoryItem`` instances,
-        a 2-tuple ``(work_id, last_read)``.
+        a 2-tuple ``(work_id, last_read)``, most recently read first.
+
+        By default the pages are fetched one at a time, because you often
+        stop after the first page or two (e.g. once you get to works you
+        read a while ago).  If you want all of it, pass ``max_workers`` to
+        fetch that many pages at once after the first -- but if you then
+        stop early, the pages that were already being fetched are wasted.
         """
         # TODO: What happens if you don't have this feature enabled?
 
         # URL for the user's reading history page
         api_url = (
-            'https://archiveofourown.org/users/%s/readings?page=%%d' %
-            self.username)
-
-        for page_no in itertools.count(start=1):
-            req = self.sess.get(api_url % page_no)
-            soup = BeautifulSoup(req.text, features='html.parser')
-
-            # The entries are stored in a list of the form:
-            #
-            #     <ol class="reading work index group">
-            #       <li id="work_12345" class="reading work blurb group">
-            #         ...
-            #       </li>
-            #       <li id="work_67890" class="reading work blurb group">
-            #         ...
-            #       </li>
-            #       ...
-            #     </ol>
-            #
-            ol_tag = soup.find('ol', attrs={'class': 'reading'})
-            for li_tag in ol_tag.findAll('li', attrs={'class': 'blurb'}):
-                try:
-                    work_id = li_tag.attrs['id'].replace('work_', '')
-
-                    # Within the <li>, the last viewed date is stored as
-                    #
-                    #     <h4 class="viewed heading">
-                    #         <span>Last viewed:</span> 24 Dec 2012
-                    #
-                    #         (Latest version.)
-                    #
-                    #         Viewed once
-                    #     </h4>
-                    #
-                    h4_tag = li_tag.find('h4', attrs={'class': 'viewed'})
-                    date_str = re.search(
-                        r'[0-9]{1,2} [A-Z][a-z]+ [0-9]{4}',
-                        h4_tag.contents[2]).group(0)
-                    date = datetime.strptime(date_str, '%d %b %Y').date()
-
-                    yield work_id, date
-                except KeyError:
-                    # A deleted work shows up as
-                    #
-                    #      <li class="deleted reading work blurb group">
-                    #
-                    # There's nothing that we can do about that, so just skip
-                    # over it.
-                    if 'deleted' in li_tag.attrs['class']:
-                        pass
-                    else:
-                        raise
-
-            # The pagination button at the end of the page is of the form
-            #
-            #     <li class="next" title="next"> ... </li>
-            #
-            # If there's another page of results, this contains an <a> tag
-            # pointing to the next page.  Otherwise, it contains a <span>
-            # tag with the 'disabled' class.
-            try:
-                next_button = soup.find('li', attrs={'class': 'next'})
-                if next_button.find('span', attrs={'class': 'disabled'}):
-                    break
-            except:
-                # In case of absence of "next"
-                break
+            '%s/users/%s/readings?page=%%d' %
+            (self.base_url, self.username))
+
+        return self._iter_listing(
+            api_url, parse_readings_page, max_workers=max_workers)
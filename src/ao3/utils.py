@@ -1,8 +1,15 @@
 # -*- encoding: utf-8
 """Utility functions."""
 
+import collections
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import itertools
 import re
 
+# The address of AO3.  Everything that makes requests lets you override this,
+# e.g. to point at a local stand-in for testing.
+AO3_URL = 'https://archiveofourown.org'
+
 # Regex for extracting the work ID from an AO3 URL.  Designed to match URLs
 # of the form
 #
@@ -14,6 +21,26 @@ WORK_URL_REGEX = re.compile(
     r'(?P<work_id>[0-9]+)'
 )
 
+# The kinds of page on AO3, which ``ao3.cache`` uses to decide which TTL
+# applies to a URL, and ``ao3.metrics`` to group requests.  The first
+# pattern that matches wins; anything that doesn't match is a 'default'
+# page.
+URL_KINDS = [
+    ('work', re.compile(r'/works/[0-9]+')),
+    ('bookmarks', re.compile(r'/users/[^/]+/bookmarks')),
+    ('readings', re.compile(r'/users/[^/]+/readings')),
+    ('tag_works', re.compile(r'/tags/[^/]+/works')),
+    ('search', re.compile(r'/works/search')),
+]
+
+
+def url_kind(url):
+    """Returns the kind of AO3 page that lives at this URL."""
+    for kind, pattern in URL_KINDS:
+        if pattern.search(url):
+            return kind
+    return 'default'
+
 
 def work_id_from_url(url):
     """Given an AO3 URL, return the work ID."""
@@ -22,3 +49,111 @@ def work_id_from_url(url):
         return match.group('work_id')
     else:
         raise RuntimeError('%r is not a recognised AO3 work URL')
+
+
+def threaded_map(func, iterable, max_workers, ordered=True):
+    """Call ``func`` on every item of ``iterable`` using a pool of threads.
+
+    This generates a series of ``(item, future)`` pairs, where ``future``
+    has already finished -- call ``future.result()`` to get the return value
+    of ``func(item)``, or to re-raise the exception it threw.
+
+    Only a bounded number of items are in flight at once, so ``iterable``
+    can be arbitrarily long (or lazy).
+
+    :param max_workers: the number of threads in the pool.
+    :param ordered: if True, results come back in the same order as
+        ``iterable``.  Otherwise, they come back as soon as they finish.
+
+    """
+    # Keep a couple of items queued for each worker, so no thread is ever
+    # idle waiting for us to submit the next item.
+    window = max_workers * 2
+    items = iter(iterable)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if ordered:
+            results = _ordered_map(executor, func, items, window)
+        else:
+            results = _unordered_map(executor, func, items, window)
+        try:
+            for result in results:
+                yield result
+        finally:
+            # This has to happen before the executor shuts down, not
+            # whenever ``results`` is garbage collected.
+            results.close()
+
+
+# If the caller stops before the end, the executor would still run every
+# item we'd queued up before it shut down -- for a listing, that's a page
+# for every queued item that nobody will look at.  So when the generator is
+# closed, we cancel everything that hasn't started yet.
+
+def _ordered_map(executor, func, items, window):
+    pending = collections.deque(
+        (item, executor.submit(func, item))
+        for item in itertools.islice(items, window))
+    try:
+        while pending:
+            item, future = pending.popleft()
+            for next_item in itertools.islice(items, 1):
+                pending.append((next_item, executor.submit(func, next_item)))
+            wait([future])
+            yield item, future
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def _unordered_map(executor, func, items, window):
+    pending = {
+        executor.submit(func, item): item
+        for item in itertools.islice(items, window)
+    }
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                for next_item in itertools.islice(items, 1):
+                    pending[executor.submit(func, next_item)] = next_item
+                yield item, future
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_listing(get_page, max_workers=4):
+    """Generates every item in a paginated listing, in order.
+
+    We fetch the first page to find out how many pages there are, then
+    fetch the rest of them ``max_workers`` at a time.  If there are
+    more pages by the time we've got to the end (because something was
+    added while we were going), we carry on one page at a time.
+
+    :param get_page: called as ``get_page(page_no)`` to fetch and parse a
+        page, starting from 1.  Returns a ``ListingPage``.
+    """
+    page = get_page(1)
+    for item in page.items:
+        yield item
+    page_no = 1
+
+    if page.has_next_page and page.page_count and max_workers > 1:
+        pages = threaded_map(
+            get_page, range(2, page.page_count + 1), max_workers=max_workers)
+        try:
+            for page_no, future in pages:
+                page = future.result()
+                for item in page.items:
+                    yield item
+        finally:
+            # If we're stopped early, don't fetch the pages still queued.
+            pages.close()
+
+    while page.has_next_page:
+        page_no += 1
+        page = get_page(page_no)
+        for item in page.items:
+            yield item
@@ -1,11 +1,15 @@
 # -*- encoding: utf-8
 
-from datetime import datetime
+import codecs
+import itertools
 import json
+from xml.sax.saxutils import escape as xml_escape
 
-from bs4 import BeautifulSoup, Tag
 import requests
 
+from .parsers import ChapterScanner, KudosScanner, WorkMetadata, get_parser
+from .utils import AO3_URL
+
 
 class WorkNotFound(Exception):
     pass
@@ -15,41 +19,179 @@ class RestrictedWork(Exception):
     pass
 
 
-class Work(object):
+def work_url(work_id, view_adult=False, view_full_work=False,
+             base_url=AO3_URL):
+    """Returns the URL of a work page.
+
+    If ``view_adult`` is True, this is the URL that skips the interstitial
+    page warning about adult content.  If ``view_full_work`` is True, it's
+    the page with every chapter of the work, rather than just the first.
+    """
+    url = '%s/works/%s' % (base_url, work_id)
+    params = []
+    if view_adult:
+        params.append('view_adult=true')
+    if view_full_work:
+        params.append('view_full_work=true')
+    if params:
+        url += '?' + '&'.join(params)
+    return url
+
+
+def kudos_url(work_id, page_no=1, base_url=AO3_URL):
+    """Returns the URL of a page of the full list of kudos on a work."""
+    return '%s/works/%s/kudos?page=%d' % (base_url, work_id, page_no)
+
+
+def check_work_response(work_id, status_code, text):
+    """Raises an appropriate exception if a work page couldn't be fetched."""
+    if status_code == 404:
+        raise WorkNotFound('Unable to find a work with id %r' % work_id)
+    elif status_code != 200:
+        raise RuntimeError('Unexpected error from AO3 API: %r (%r)' % (
+            text, status_code))
+
+
+def is_adult_interstitial(text):
+    """Is this the page asking us to confirm we want to see adult works?"""
+    return 'This work could have adult content' in text
+
+
+def check_not_restricted(work_id, text):
+    """Raises ``RestrictedWork`` if this work is only visible to users."""
+    # Check for restricted works, which require you to be logged in
+    # first.  See https://archiveofourown.org/admin_posts/138
+    # To make this work, we'd need to have a common Session object
+    # across all the API classes.  Not impossible, but fiddlier than I
+    # care to implement right now.
+    # TODO: Fix this.
+    if 'This work is only available to registered users' in text:
+        raise RestrictedWork('Looking at work ID %s requires login' % work_id)
+
 
-    def __init__(self, id, sess=None):
+def fetch_work_html(work_id, sess=None, base_url=AO3_URL):
+    """Fetch the HTML of the page for a work, without parsing it.
+
+    Raises ``WorkNotFound`` or ``RestrictedWork`` if the work can't be
+    retrieved.
+    """
+    if sess is None:
+        sess = requests.Session()
+
+    req = sess.get(work_url(work_id, base_url=base_url))
+    check_work_response(work_id, req.status_code, req.text)
+
+    # For some works, AO3 throws up an interstitial page asking you to
+    # confirm that you really want to see the adult works.  Yes, we do.
+    if is_adult_interstitial(req.text):
+        req = sess.get(work_url(work_id, view_adult=True, base_url=base_url))
+
+    check_not_restricted(work_id, req.text)
+    return req.text
+
+
+class Work(object):
+    """A work on AO3.
+
+    Normally a work keeps its page, and the parsed tree of its page, for as
+    long as it exists -- which for a long work can be a few megabytes.  If
+    you're keeping a lot of works around, pass ``low_memory=True``: the
+    metadata and the kudos are extracted as soon as the page arrives, and
+    the page is thrown away.  A low-memory work then takes about 2 KB, plus
+    about 60 bytes for each username in ``kudos_left_by``, however long the
+    work is.  (Anything else that needs the page, like ``_soup``, fetches
+    it again.)
+    """
+
+    def __init__(self, id, sess=None, html=None, lazy=False, parser=None,
+                 metadata_only=False, base_url=AO3_URL, metadata=None,
+                 low_memory=False):
         self.id = id
+        self._sess = sess
+        self._base_url = base_url
+        self._parser = get_parser(parser)
+        self._metadata_only = metadata_only
+        self._low_memory = low_memory
+        self._loaded = False
+        self._html = None
+        self._tree = None
+        self._meta = None
+        self._kudos = None
+        self._all_kudos = None
+
+        # If we've been given the HTML for the work page, we can skip
+        # straight to parsing it.  This is how the async client shares
+        # its parsing with this class.
+        #
+        # In lazy mode, we don't fetch anything until somebody asks for
+        # a property that needs the page -- so it's cheap to create lots
+        # of works and only look at a few of them.
+        #
+        # In metadata-only mode, we only parse the parts of the page that
+        # have the metadata (title, byline, summary and stats), and skip
+        # the text of the work.  The list of kudos is only parsed if
+        # somebody asks for it.
+        #
+        # In low-memory mode, we extract the metadata and the kudos as soon
+        # as we have the page, and then throw away the page and the parse
+        # tree.  Those are most of the memory a work uses, and usually a
+        # lot more than the values we got out of them.
+        #
+        # If we've been given the metadata, it's already been parsed
+        # somewhere else (e.g. in another process by ``ao3.pipeline``), and
+        # we only fetch the page if somebody asks for something else.
+        if html is not None:
+            self._load(html)
+        elif metadata is not None:
+            self._meta = metadata
+        elif not lazy:
+            self.prefetch()
+
+    def prefetch(self):
+        """Fetch and parse the page for this work, if we haven't already.
+
+        This is only useful for works created with ``lazy=True``, where it
+        lets you choose when the network request happens.  It raises
+        ``WorkNotFound`` or ``RestrictedWork`` if the work can't be
+        retrieved.  Returns the work itself.
+        """
+        if not self._loaded:
+            self._load(self._fetch(self._sess))
+        return self
 
-        # Fetch the HTML for this work
-        if sess == None:
-            sess = requests.Session()
-            
-        req = sess.get('https://archiveofourown.org/works/%s' % self.id)
-
-        if req.status_code == 404:
-            raise WorkNotFound('Unable to find a work with id %r' % self.id)
-        elif req.status_code != 200:
-            raise RuntimeError('Unexpected error from AO3 API: %r (%r)' % (
-                req.text, req.statuscode))
-
-        # For some works, AO3 throws up an interstitial page asking you to
-        # confirm that you really want to see the adult works.  Yes, we do.
-        if 'This work could have adult content' in req.text:
-            req = sess.get(
-                'https://archiveofourown.org/works/%s?view_adult=true' %
-                self.id)
-
-        # Check for restricted works, which require you to be logged in
-        # first.  See https://archiveofourown.org/admin_posts/138
-        # To make this work, we'd need to have a common Session object
-        # across all the API classes.  Not impossible, but fiddlier than I
-        # care to implement right now.
-        # TODO: Fix this.
-        if 'This work is only available to registered users' in req.text:
-            raise RestrictedWork('Looking at work ID %s requires login')
-
-        self._html = req.text
-        self._soup = BeautifulSoup(self._html, 'html.parser')
+    @property
+    def is_loaded(self):
+        """Whether the page for this work has been fetched yet."""
+        return self._loaded
+
+    def _fetch(self, sess=None):
+        """Fetch the HTML for this work."""
+        return fetch_work_html(self.id, sess=sess, base_url=self._base_url)
+
+    def _load(self, html):
+        self._loaded = True
+        if self._low_memory:
+            self._meta = self._parser.work_metadata(
+                self._parser.parse_metadata(html))
+            self._kudos = list(self._parser.kudos_left_by(
+                self._parser.parse_kudos(html)))
+            return
+
+        self._html = html
+        if self._metadata_only:
+            self._tree = self._parser.parse_metadata(self._html)
+        else:
+            self._tree = self._parser.parse(self._html)
+        self._meta = None
+
+    @property
+    def _soup(self):
+        # The parsed page, which might come from BeautifulSoup or one of
+        # the other parser backends.  A low-memory work doesn't keep it,
+        # so we have to fetch it again.
+        if self.prefetch()._tree is None:
+            return self._parser.parse(self._fetch(self._sess))
+        return self._tree
 
     def __repr__(self):
         return '%s(id=%r)' % (type(self).__name__, self.id)
@@ -66,207 +208,254 @@ class Work(object):
     @property
     def url(self):
         """A URL to this work."""
-        return 'https://archiveofourown.org/works/%s' % self.id
+        return work_url(self.id, base_url=self._base_url)
+
+    @property
+    def _metadata(self):
+        # All the metadata is extracted in a single pass over the page the
+        # first time any of it is needed, and then kept for later.
+        if self._meta is None:
+            self._meta = self._parser.work_metadata(self._soup)
+        return self._meta
 
     @property
     def title(self):
         """The title of this work."""
-        # The title of the work is stored in an <h2> tag of the form
-        #
-        #     <h2 class="title heading">[title]</h2>
-        #
         # TODO: Retrieve title from restricted work
-        title_tag = self._soup.find('h2', attrs={'class': 'title'})
-        return title_tag.contents[0].strip()
+        return self._metadata.title
+
+    @property
+    def authors(self):
+        """The authors of this work."""
+        return self._metadata.authors
 
     @property
     def author(self):
         """The author of this work."""
-        # The author of the work is kept in the byline, in the form
-        #
-        #     <h3 class="byline heading">
-        #       <a href="/users/[author_name]" rel="author">[author_name]</a>
-        #     </h3>
-        #
-        byline_tag = self._soup.find('h3', attrs={'class': 'byline'})
-        a_tag = [t
-                 for t in byline_tag.contents
-                 if isinstance(t, Tag)]
-        assert len(a_tag) == 1
-        return a_tag[0].contents[0].strip()
+        authors = self._metadata.authors
+        assert len(authors) == 1
+        return authors[0]
 
     @property
     def summary(self):
         """The author summary of the work."""
-        # The author summary is kept in the following format:
-        #
-        #     <div class="summary module" role="complementary">
-        #       <h3 class="heading">Summary:</h3>
-        #       <blockquote class="userstuff">
-        #         [author_summary_html]
-        #       </blockquote>
-        #     </div>
-        #
-        summary_div = self._soup.find('div', attrs={'class': 'summary'})
-        blockquote = summary_div.find('blockquote')
-        return blockquote.renderContents().decode('utf8').strip()
-
-    def _lookup_stat(self, class_name, default=None):
-        """Returns the value of a stat."""
-        # The stats are stored in a series of divs of the form
-        #
-        #     <dd class="[field_name]">[field_value]</div>
-        #
-        # This is a convenience method for looking up values from these divs.
-        #
-        dd_tag = self._soup.find('dd', attrs={'class': class_name})
-        if dd_tag is None:
-            return default
-        if 'tags' in dd_tag.attrs['class']:
-            return self._lookup_list_stat(dd_tag=dd_tag)
-        return dd_tag.contents[0]
-
-    def _lookup_list_stat(self, dd_tag):
-        """Returns the value of a list statistic.
-
-        Some statistics can have multiple values (e.g. the list of characters).
-        This helper method should be used to retrieve those.
-
-        """
-        # A list tag is stored in the form
-        #
-        #     <dd class="[field_name] tags">
-        #       <ul class="commas">
-        #         <li><a href="/further-works">[value 1]</a></li>
-        #         <li><a href="/more-info">[value 2]</a></li>
-        #         <li class="last"><a href="/more-works">[value 3]</a></li>
-        #       </ul>
-        #     </dd>
-        #
-        # We want to get the data from the individual <li> elements.
-        li_tags = dd_tag.findAll('li')
-        a_tags = [t.contents[0] for t in li_tags]
-        return [t.contents[0] for t in a_tags]
+        return self._metadata.summary
 
     @property
     def rating(self):
         """The age rating for this work."""
-        return self._lookup_stat('rating', [])
+        return self._metadata.rating
 
     @property
     def warnings(self):
         """Any archive warnings on the work."""
-        value = self._lookup_stat('warning', [])
-        if value == ['No Archive Warnings Apply']:
-            return []
-        else:
-            return value
+        return self._metadata.warnings
 
     @property
     def category(self):
         """The category of the work."""
-        return self._lookup_stat('category', [])
+        return self._metadata.category
 
     @property
     def fandoms(self):
         """The fandoms in this work."""
-        return self._lookup_stat('fandom', [])
+        return self._metadata.fandoms
 
     @property
     def relationship(self):
         """The relationships in this work."""
-        return self._lookup_stat('relationship', [])
+        return self._metadata.relationship
 
     @property
     def characters(self):
         """The characters in this work."""
-        return self._lookup_stat('character', [])
+        return self._metadata.characters
 
     @property
     def additional_tags(self):
         """Any additional tags on the work."""
-        return self._lookup_stat('freeform', [])
+        return self._metadata.additional_tags
 
     @property
     def language(self):
         """The language in which this work is published."""
-        return self._lookup_stat('language', "").strip()
+        return self._metadata.language
 
     @property
     def published(self):
         """The date when this work was published."""
-        date_str = self._lookup_stat('published')
-        date_val = datetime.strptime(date_str, '%Y-%m-%d')
-        return date_val.date()
+        return self._metadata.published
 
     @property
     def words(self):
         """The number of words in this work."""
-        return int(self._lookup_stat('words', 0))
+        return self._metadata.words
 
     @property
     def comments(self):
         """The number of comments on this work."""
-        return int(self._lookup_stat('comments', 0))
+        return self._metadata.comments
+
+    @property
+    def chapters(self):
+        """How many chapters have been posted, and how many are planned.
+
+        This is a ``ChapterCount`` of ``(posted, total)``, where ``total``
+        is None if the author hasn't said.  Use ``iter_chapters()`` to get
+        the text of the chapters.
+        """
+        return self._metadata.chapters
 
     @property
     def kudos(self):
         """The number of kudos on this work."""
-        return int(self._lookup_stat('kudos', 0))
+        return self._metadata.kudos
 
     @property
     def kudos_left_by(self):
-        """Returns a list of usernames who left kudos on this work."""
-        # The list of usernames who left kudos is stored in the following
-        # format:
-        #
-        #     <div id="kudos">
-        #       <p class="kudos">
-        #         <a href="/users/[username1]">[username1]</a>
-        #         <a href="/users/[username2]">[username2]</a>
-        #         ...
-        #       </p>
-        #     </div>
-        #
-        # And yes, this really does include every username.  The fic with the
-        # most kudos is http://archiveofourown.org/works/2080878, and this
-        # approach successfully retrieved the username of everybody who
-        # left kudos.
-        kudos_div = self._soup.find('div', attrs={'id': 'kudos'})
-        for a_tag in kudos_div.findAll('a'):
-
-            # If a fic has lots of kudos, not all the users who left kudos
-            # are displayed by default.  There's a link for expanding the
-            # list of users:
-            #
-            #     <a href="/works/[work_id]/kudos" id="kudos_summary">
-            #
-            # and another for collapsing the list afterward:
-            #
-            #     <a href="#" id="kudos_collapser">
-            #
-            if a_tag.attrs.get('id') in ('kudos_collapser', 'kudos_summary'):
-                continue
-
-            # There's sometimes a kudos summary that can be expanded to
-
-            yield a_tag.attrs['href'].replace('/users/', '')
+        """Returns a list of usernames who left kudos on this work.
+
+        This is only the usernames shown on the work page itself.  For
+        popular works, AO3 only shows some of them -- use ``iter_kudos()``
+        to get everybody.
+        """
+        if self.prefetch()._kudos is not None:
+            return iter(self._kudos)
+        if self._metadata_only:
+            tree = self._parser.parse_kudos(self.prefetch()._html)
+        else:
+            tree = self._soup
+        return self._parser.kudos_left_by(tree)
+
+    def iter_kudos(self, chunk_size=16384):
+        """Generates the username of everybody who left kudos on this work.
+
+        Unlike ``kudos_left_by``, this follows the separate kudos pages, so
+        it gets every username.  It doesn't need the work page, so it won't
+        cause a lazy work to be fetched.
+
+        The pages are streamed and scanned as they arrive, so this uses
+        constant memory however many kudos there are, and if you stop
+        iterating early, the rest of the page is never downloaded.
+        """
+        for page_no in itertools.count(start=1):
+            scanner = KudosScanner()
+            url = kudos_url(self.id, page_no, base_url=self._base_url)
+            for username in self._scan(url, scanner, chunk_size):
+                yield username
+            if not scanner.has_next_page:
+                break
+
+    def kudos_from(self, usernames, chunk_size=16384):
+        """Returns the set of ``usernames`` who left kudos on this work.
+
+        If the work page has already been fetched, we look there first.
+        Otherwise, this follows the kudos pages like ``iter_kudos()``, and
+        stops as soon as it's found everybody -- so if you're only asking
+        about one user, it usually stops part-way through the first page.
+        If it has to read the whole list, the list is remembered, and
+        later calls on this work don't make any requests.
+        """
+        usernames = set(usernames)
+        if self._all_kudos is not None:
+            return usernames & self._all_kudos
+
+        found = set()
+        if self.is_loaded:
+            found = usernames.intersection(self.kudos_left_by)
+        if found == usernames:
+            return found
+
+        seen = set()
+        for name in self.iter_kudos(chunk_size=chunk_size):
+            seen.add(name)
+            if name in usernames:
+                found.add(name)
+                if found == usernames:
+                    return found
+        self._all_kudos = frozenset(seen)
+        return found
+
+    def has_kudos_from(self, username, chunk_size=16384):
+        """Did this user leave kudos on this work?  See ``kudos_from()``."""
+        return bool(self.kudos_from([username], chunk_size=chunk_size))
+
+    def iter_chapters(self, chunk_size=16384):
+        """Generates the chapters of this work, as ``Chapter`` instances.
+
+        Every chapter comes from a single request for the "Entire Work"
+        page, which is streamed and split into chapters as it arrives, so
+        only one chapter is held in memory at a time.  Like ``iter_kudos()``,
+        it doesn't use (or fetch) the page this work was loaded from.
+
+        Raises ``RestrictedWork`` if the work is only visible to logged-in
+        users.
+        """
+        # Asking to skip the adult content warning is harmless on works
+        # that don't have one, and saves us going back for a second try.
+        url = work_url(
+            self.id, view_adult=True, view_full_work=True,
+            base_url=self._base_url)
+        scanner = ChapterScanner()
+        for chapter in self._scan(url, scanner, chunk_size):
+            yield chapter
+        if scanner.restricted:
+            raise RestrictedWork(
+                'Looking at work ID %s requires login' % self.id)
+
+    def download(self, f, chunk_size=16384):
+        """Save the full text of this work to a file, as HTML.
+
+        Each chapter is written as soon as it's been read, under an ``<h2>``
+        with its title, so this works in constant memory however long the
+        work is.
+
+        :param f: a file opened for writing text.
+        :returns: the number of chapters written.
+        """
+        count = 0
+        for chapter in self.iter_chapters(chunk_size=chunk_size):
+            if chapter.title:
+                f.write(u'<h2>%s</h2>\n' % xml_escape(chapter.title))
+            f.write(chapter.html)
+            f.write(u'\n')
+            count += 1
+        return count
+
+    def _scan(self, url, scanner, chunk_size):
+        """Stream a page through an incremental scanner, like
+        ``KudosScanner``, and generate whatever it finds."""
+        sess = self._sess
+        if sess is None:
+            sess = requests.Session()
+
+        req = sess.get(url, stream=True)
+        try:
+            if req.status_code != 200:
+                check_work_response(self.id, req.status_code, req.text)
+
+            decoder = codecs.getincrementaldecoder(
+                req.encoding or 'utf-8')(errors='replace')
+            for chunk in req.iter_content(chunk_size=chunk_size):
+                scanner.feed(decoder.decode(chunk))
+                for item in scanner.drain():
+                    yield item
+            scanner.feed(decoder.decode(b'', final=True))
+            scanner.close()
+            for item in scanner.drain():
+                yield item
+        finally:
+            req.close()
 
     @property
     def bookmarks(self):
         """The number of times this work has been bookmarked."""
-        # This returns a link of the form
-        #
-        #     <a href="/works/9079264/bookmarks">102</a>
-        #
-        # It might be nice to follow that page and get a list of who has
-        # bookmarked this, but for now just return the number.
-        return int(self._lookup_stat('bookmarks').contents[0])
+        return self._metadata.bookmarks
 
     @property
     def hits(self):
         """The number of hits this work has received."""
-        return int(self._lookup_stat('hits', 0))
+        return self._metadata.hits
 
     def json(self, *args, **kwargs):
         """Provide a complete representation of the work in JSON.
@@ -274,28 +463,87 @@ class Work(object):
         *args and **kwargs are passed directly to `json.dumps()` from the
         standard library.
 
+        ``authors`` lists every author; ``author`` is the first of them, or
+        None for an anonymous work.
+
         """
+        meta = self._metadata
         data = {
             'id': self.id,
-            'title': self.title,
-            'author': self.author,
-            'summary': self.summary,
-            'rating': self.rating,
-            'warnings': self.warnings,
-            'category': self.category,
-            'fandoms': self.fandoms,
-            'relationship': self.relationship,
-            'characters': self.characters,
-            'additional_tags': self.additional_tags,
-            'language': self.language,
+            'title': meta.title,
+            'author': meta.authors[0] if meta.authors else None,
+            'authors': meta.authors,
+            'summary': meta.summary,
+            'rating': meta.rating,
+            'warnings': meta.warnings,
+            'category': meta.category,
+            'fandoms': meta.fandoms,
+            'relationship': meta.relationship,
+            'characters': meta.characters,
+            'additional_tags': meta.additional_tags,
+            'language': meta.language,
             'stats': {
-                'published': str(self.published),
-                'words': self.words,
-                # TODO: chapters
-                'comments': self.comments,
-                'kudos': self.kudos,
-                'bookmarks': self.bookmarks,
-                'hits': self.hits,
+                'published': str(meta.published),
+                'words': meta.words,
+                'chapters': (
+                    dict(meta.chapters._asdict()) if meta.chapters else None),
+                'comments': meta.comments,
+                'kudos': meta.kudos,
+                'bookmarks': meta.bookmarks,
+                'hits': meta.hits,
             }
         }
         return json.dumps(data, *args, **kwargs)
+
+
+class WorkBlurb(object):
+    """A summary of a work, as shown in a listing like a user's bookmarks.
+
+    AO3 calls these "blurbs".  They have most of the same metadata as the
+    work page -- the title, authors, tags and stats -- so if that's all you
+    need, you can skip fetching every work.  They don't have the date the
+    work was published (``published`` is None), but they do have the date
+    it was last ``updated``.
+
+    Use ``work()`` to get the full ``Work`` when you need it.
+
+    :param blurb: a ``Blurb`` from ``parser.blurbs_page()``.
+    """
+
+    def __init__(self, blurb, sess=None, parser=None, base_url=AO3_URL):
+        self.id = blurb.work_id
+        self.metadata = blurb.metadata
+        self.updated = blurb.updated
+        self._sess = sess
+        self._parser = parser
+        self._base_url = base_url
+
+    def __repr__(self):
+        return '%s(id=%r)' % (type(self).__name__, self.id)
+
+    def __getattr__(self, name):
+        # Everything else comes straight from the metadata, with the same
+        # names as the properties of ``Work``.
+        if name in WorkMetadata.__slots__:
+            return getattr(self.metadata, name)
+        raise AttributeError(name)
+
+    @property
+    def url(self):
+        """A URL to this work."""
+        return work_url(self.id, base_url=self._base_url)
+
+    @property
+    def author(self):
+        """The first author of this work, or None if it's anonymous."""
+        if self.metadata.authors:
+            return self.metadata.authors[0]
+        return None
+
+    def work(self, lazy=False, metadata_only=False):
+        """Returns the full ``Work`` for this blurb.
+
+        This fetches the work page, unless ``lazy`` is True; see ``Work``.
+        """
+        return Work(self.id, sess=self._sess, lazy=lazy, parser=self._parser,
+                    metadata_only=metadata_only, base_url=self._base_url)
@@ -0,0 +1,42 @@
+# -*- encoding: utf-8
+
+import io
+import os
+
+import pytest
+
+from ao3 import AO3
+from helpers import FakeSession
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture
+def fixture_html():
+    """Returns a function for reading saved AO3 pages from tests/fixtures."""
+    def read(name):
+        path = os.path.join(FIXTURES_DIR, name)
+        with io.open(path, encoding='utf-8') as f:
+            return f.read()
+    return read
+
+
+@pytest.fixture
+def work_session(fixture_html):
+    """A fake session that knows about one work, with id 258626."""
+    return FakeSession({
+        'https://archiveofourown.org/works/258626': fixture_html('work.html'),
+        'https://archiveofourown.org/works/258626/kudos?page=1':
+            fixture_html('kudos_page1.html'),
+        'https://archiveofourown.org/works/258626/kudos?page=2':
+            fixture_html('kudos_page2.html'),
+    })
+
+
+@pytest.fixture
+def api(work_session):
+    """An ``AO3`` instance that fetches pages from ``work_session``."""
+    api = AO3()
+    api.session = work_session
+    return api
@@ -0,0 +1,67 @@
+# -*- encoding: utf-8
+"""Stand-ins for requests, shared between the tests."""
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.encoding = 'utf-8'
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        content = self.text.encode('utf-8')
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession(object):
+    """Stands in for a ``requests.Session``, serving pages from a dict of
+    ``{url: html}``.  Every URL that's requested is recorded in ``urls``."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if url in self.pages:
+            return FakeResponse(200, self.pages[url])
+        return FakeResponse(404, 'Not found')
+
+    def post(self, url, **kwargs):
+        self.urls.append(url)
+        return FakeResponse(200, 'Successfully logged in.')
+
+
+class StubAdapter(BaseAdapter):
+    """A transport adapter that returns canned responses, and remembers
+    every request it was asked to send."""
+
+    def __init__(self, status_code=200, headers=None, content=b'<html/>'):
+        super(StubAdapter, self).__init__()
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        resp = Response()
+        resp.url = request.url
+        resp.request = request
+        resp.status_code = self.status_code
+        resp.headers = CaseInsensitiveDict(self.headers)
+        resp._content = self.content
+        resp._content_consumed = True
+        return resp
+
+    def close(self):
+        pass
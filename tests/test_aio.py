@@ -0,0 +1,83 @@
+# -*- encoding: utf-8
+"""Tests for ao3.aio."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+# These have to come after the check above, because ao3.aio imports aiohttp.
+from ao3.aio import AsyncAO3, AsyncUser  # noqa: E402
+from ao3.works import WorkNotFound  # noqa: E402
+
+
+@pytest.fixture
+def api(fixture_html):
+    """An AsyncAO3 whose requests are served from the saved pages."""
+    pages = {
+        'https://archiveofourown.org/works/258626': fixture_html('work.html'),
+        'https://archiveofourown.org/users/reader/readings?page=1':
+            fixture_html('readings.html'),
+    }
+
+    async def fake_get(url):
+        if url in pages:
+            return 200, pages[url]
+        return 404, 'Not found'
+
+    api = AsyncAO3()
+    api._get = fake_get
+    return api
+
+
+def test_work_is_parsed_like_a_sync_work(api):
+    work = asyncio.run(api.work('258626'))
+    assert work.title == 'The Morning After'
+    assert work.words == 605
+
+
+def test_works_reports_missing_works_and_carries_on(api):
+    errors = []
+
+    async def collect():
+        return [
+            w.id async for w in api.works(
+                ['404', '258626'],
+                on_error=lambda work_id, exc: errors.append((work_id, exc)))
+        ]
+
+    assert asyncio.run(collect()) == ['258626']
+    assert [work_id for work_id, _ in errors] == ['404']
+    assert isinstance(errors[0][1], WorkNotFound)
+
+
+def test_reading_history(api):
+    user = AsyncUser(username='reader', api=api)
+
+    async def collect():
+        return [entry async for entry in user.reading_history()]
+
+    entries = asyncio.run(collect())
+    assert [e.work_id for e in entries] == ['258626', '123']
+
+
+def test_concurrent_requests_for_a_work_share_one_fetch(fixture_html):
+    urls = []
+
+    async def fake_get(url):
+        urls.append(url)
+        await asyncio.sleep(0.01)
+        return 200, fixture_html('work.html')
+
+    api = AsyncAO3()
+    api._get = fake_get
+
+    async def fetch():
+        works = await asyncio.gather(*[api.work('258626') for _ in range(5)])
+        works.append(await api.work('258626'))
+        return works
+
+    works = asyncio.run(fetch())
+    assert all(work is works[0] for work in works)
+    assert urls == ['https://archiveofourown.org/works/258626']
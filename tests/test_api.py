@@ -0,0 +1,103 @@
+# -*- encoding: utf-8
+"""Tests for ao3.api."""
+
+import threading
+import time
+
+import pytest
+
+from ao3 import AO3
+from ao3.works import RestrictedWork, WorkNotFound
+from helpers import FakeSession
+
+
+def work_url(work_id):
+    return 'https://archiveofourown.org/works/%s' % work_id
+
+
+class SlowSession(FakeSession):
+    """A ``FakeSession`` that takes a while over some pages, and records
+    how many requests were in flight at once."""
+
+    def __init__(self, pages, delays=None):
+        super(SlowSession, self).__init__(pages)
+        self.delays = delays or {}
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.delays.get(url, 0.01))
+            return super(SlowSession, self).get(url, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def many_works(fixture_html):
+    html = fixture_html('work.html')
+    ids = [str(i) for i in range(1, 9)]
+    return ids, dict((work_url(work_id), html) for work_id in ids)
+
+
+def test_works_come_back_in_order(many_works):
+    ids, pages = many_works
+    api = AO3()
+    # The first works are the slowest, so they finish last.
+    api.session = SlowSession(pages, delays=dict(
+        (work_url(work_id), 0.05 - 0.005 * i)
+        for i, work_id in enumerate(ids)))
+    works = list(api.works(ids, max_workers=4))
+    assert [work.id for work in works] == ids
+    assert works[0].title == 'The Morning After'
+
+
+def test_unordered_works_include_every_work(many_works):
+    ids, pages = many_works
+    api = AO3()
+    api.session = SlowSession(pages)
+    works = list(api.works(ids, max_workers=4, ordered=False))
+    assert sorted(work.id for work in works) == sorted(ids)
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_works_respects_max_workers(many_works, max_workers):
+    ids, pages = many_works
+    api = AO3()
+    api.session = SlowSession(pages)
+    assert len(list(api.works(ids, max_workers=max_workers))) == len(ids)
+    assert api.session.peak <= max_workers
+    if max_workers > 1:
+        assert api.session.peak > 1
+
+
+def test_works_skips_missing_and_restricted_works(api, fixture_html):
+    api.session.pages[work_url('999')] = fixture_html('restricted.html')
+    errors = []
+    works = list(api.works(
+        ['404', '258626', '999'],
+        on_error=lambda work_id, exc: errors.append((work_id, type(exc)))))
+    assert [work.id for work in works] == ['258626']
+    assert errors == [('404', WorkNotFound), ('999', RestrictedWork)]
+
+
+def test_works_skips_missing_works_without_on_error(api):
+    assert [work.id for work in api.works(['404', '258626'])] == ['258626']
+
+
+def test_other_errors_are_raised(api):
+    def get(url, **kwargs):
+        if url == work_url('500'):
+            raise IOError('Connection reset')
+        return FakeSession.get(api.session, url, **kwargs)
+
+    api.session.get = get
+    works = api.works(['258626', '500'], on_error=lambda *args: None)
+    assert next(works).id == '258626'
+    with pytest.raises(IOError):
+        next(works)
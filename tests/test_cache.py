@@ -0,0 +1,193 @@
+# -*- encoding: utf-8
+"""Tests for ao3.cache."""
+
+import io
+
+import pytest
+import requests
+
+from ao3.cache import CachingAdapter, PageCache, url_kind
+from ao3.works import Work
+
+from helpers import StubAdapter
+
+
+def make_session(cache, stub):
+    sess = requests.Session()
+    sess.mount('https://', CachingAdapter(cache, adapter=stub))
+    return sess
+
+
+URL = 'https://archiveofourown.org/works/258626'
+
+
+@pytest.mark.parametrize('url, kind', [
+    (URL, 'work'),
+    (URL + '?view_adult=true', 'work'),
+    ('https://archiveofourown.org/users/a/bookmarks?page=2', 'bookmarks'),
+    ('https://archiveofourown.org/users/a/readings?page=1', 'readings'),
+    ('https://archiveofourown.org/tags/Night%20Vale/works?page=2',
+     'tag_works'),
+    ('https://archiveofourown.org/works/search?page=1', 'search'),
+    ('https://archiveofourown.org/', 'default'),
+])
+def test_url_kind(url, kind):
+    assert url_kind(url) == kind
+
+
+def test_fresh_pages_come_from_the_cache():
+    cache = PageCache(':memory:')
+    stub = StubAdapter(content=b'hello')
+    sess = make_session(cache, stub)
+
+    assert sess.get(URL).text == 'hello'
+    assert sess.get(URL).text == 'hello'
+    assert len(stub.requests) == 1
+    assert cache.stats == {'hits': 1, 'revalidated': 0, 'misses': 1}
+
+
+def test_view_adult_is_cached_separately():
+    cache = PageCache(':memory:')
+    stub = StubAdapter()
+    sess = make_session(cache, stub)
+
+    sess.get(URL)
+    sess.get(URL + '?view_adult=true')
+    assert len(stub.requests) == 2
+
+
+def test_stale_pages_are_revalidated():
+    cache = PageCache(':memory:', ttls={'work': 0})
+    stub = StubAdapter(headers={'ETag': '"abc"'}, content=b'original')
+    sess = make_session(cache, stub)
+    sess.get(URL)
+
+    stub.status_code = 304
+    stub.content = b''
+    resp = sess.get(URL)
+
+    assert resp.status_code == 200
+    assert resp.text == 'original'
+    assert stub.requests[-1].headers['If-None-Match'] == '"abc"'
+    assert cache.stats['revalidated'] == 1
+
+
+def test_changed_pages_are_replaced():
+    cache = PageCache(':memory:', ttl=0)
+    stub = StubAdapter(headers={'Last-Modified': 'yesterday'}, content=b'v1')
+    sess = make_session(cache, stub)
+    sess.get(URL)
+
+    stub.content = b'v2'
+    assert sess.get(URL).text == 'v2'
+    assert stub.requests[-1].headers['If-Modified-Since'] == 'yesterday'
+
+    cache.ttl = 3600
+    assert sess.get(URL).text == 'v2'
+    assert cache.stats == {'hits': 1, 'revalidated': 0, 'misses': 2}
+
+
+def test_errors_are_not_cached():
+    cache = PageCache(':memory:')
+    stub = StubAdapter(status_code=404)
+    sess = make_session(cache, stub)
+
+    sess.get(URL)
+    sess.get(URL)
+    assert len(stub.requests) == 2
+
+
+def test_cache_persists_across_instances(tmpdir):
+    path = str(tmpdir.join('cache.sqlite'))
+    cache = PageCache(path)
+    make_session(cache, StubAdapter(content=b'saved')).get(URL)
+    cache.close()
+
+    stub = StubAdapter()
+    assert make_session(PageCache(path), stub).get(URL).text == 'saved'
+    assert stub.requests == []
+
+
+def test_streamed_responses_skip_the_cache():
+    cache = PageCache(':memory:')
+    stub = StubAdapter(content=b'hello')
+    sess = make_session(cache, stub)
+    sess.get(URL)
+
+    resp = sess.get(URL, stream=True)
+    assert b''.join(resp.iter_content(2)) == b'hello'
+    sess.get(URL + '/kudos?page=1', stream=True)
+    assert len(stub.requests) == 3
+    assert cache.get(URL + '/kudos?page=1') is None
+
+
+def test_streaming_a_work_with_a_cache_stops_early(fixture_html):
+    class StreamingStub(StubAdapter):
+        # Counts how much of each response has been read.
+        def send(self, request, **kwargs):
+            resp = super(StreamingStub, self).send(request, **kwargs)
+            resp.raw = CountingReader(fixture_html('kudos_page1.html'))
+            resp._content = False
+            resp._content_consumed = False
+            self.raw = resp.raw
+            return resp
+
+    class CountingReader(io.BytesIO):
+        def __init__(self, text):
+            super(CountingReader, self).__init__(text.encode('utf8'))
+            self.size = len(text.encode('utf8'))
+            self.bytes_read = 0
+
+        def read(self, *args, **kwargs):
+            data = super(CountingReader, self).read(*args, **kwargs)
+            self.bytes_read += len(data)
+            return data
+
+        def stream(self, chunk_size, decode_content=None):
+            while True:
+                data = self.read(chunk_size)
+                if not data:
+                    break
+                yield data
+
+    stub = StreamingStub()
+    sess = make_session(PageCache(':memory:'), stub)
+    work = Work('258626', sess=sess, lazy=True)
+    assert work.has_kudos_from('SailAweigh', chunk_size=64)
+    assert stub.raw.bytes_read < stub.raw.size
+
+
+def test_only_works_and_listings_are_cached():
+    cache = PageCache(':memory:')
+    stub = StubAdapter()
+    sess = make_session(cache, stub)
+
+    for _ in range(2):
+        sess.get('https://archiveofourown.org')
+    assert len(stub.requests) == 2
+    assert cache.get('https://archiveofourown.org') is None
+    assert not hasattr(sess.get('https://archiveofourown.org'),
+                       'cache_status')
+
+
+def test_cookies_are_not_stored():
+    cache = PageCache(':memory:')
+    stub = StubAdapter(headers={'Set-Cookie': 'session=abc', 'ETag': '"x"'})
+    make_session(cache, stub).get(URL)
+
+    resp, _ = cache.get(URL)
+    assert 'Set-Cookie' not in resp.headers
+    assert resp.headers['ETag'] == '"x"'
+
+
+def test_nothing_is_cached_after_logging_in():
+    cache = PageCache(':memory:')
+    stub = StubAdapter()
+    sess = make_session(cache, stub)
+    sess.get(URL)
+
+    sess.post('https://archiveofourown.org/user_sessions')
+    sess.get(URL)
+    sess.get('https://archiveofourown.org/users/a/readings?page=1')
+    assert len(stub.requests) == 4
+    assert cache.stats == {'hits': 0, 'revalidated': 0, 'misses': 1}
@@ -0,0 +1,108 @@
+# -*- encoding: utf-8
+"""Tests for ao3.cli."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from ao3 import cli
+
+
+@pytest.fixture
+def api(api, fixture_html):
+    # The login flow fetches the front page, and ``history`` a page of
+    # reading history, on top of the work pages.
+    api.session.pages.update({
+        'https://archiveofourown.org': fixture_html('work.html'),
+        'https://archiveofourown.org/users/reader/readings?page=1':
+            fixture_html('readings.html'),
+    })
+    return api
+
+
+def test_importing_the_cli_does_not_import_requests_or_bs4():
+    code = (
+        'import sys, ao3.cli; '
+        'print(sorted(m for m in ("requests", "bs4", "ao3.api") '
+        'if m in sys.modules))')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.strip() == b'[]'
+
+
+def test_optional_features_are_imported_when_used():
+    code = (
+        'import sys; from ao3 import AO3; AO3(); '
+        'print(sorted(m for m in ("ao3.cache", "ao3.export", "ao3.index", '
+        '"ao3.pipeline", "multiprocessing", "sqlite3") if m in sys.modules))')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.strip() == b'[]'
+
+
+def test_submodules_are_imported_on_first_use():
+    code = (
+        'import ao3; '
+        'print(ao3.works.Work.__name__, ao3.utils.AO3_URL, ao3.Work is '
+        'ao3.works.Work)')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.split() == [
+        b'Work', b'https://archiveofourown.org', b'True']
+
+
+def test_work_prints_json(api, capsys):
+    assert cli.main(['work', '258626'], api=api) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    data = json.loads(lines[0])
+    assert data['id'] == '258626'
+    assert data['title'] == 'The Morning After'
+
+
+def test_work_with_several_authors(api, capsys, fixture_html):
+    html = fixture_html('work.html').replace(
+        '<a rel="author" href="/users/ambyr/pseuds/ambyr">ambyr</a>',
+        '<a rel="author" href="/users/ambyr/pseuds/ambyr">ambyr</a>, '
+        '<a rel="author" href="/users/other/pseuds/other">other</a>')
+    api.session.pages['https://archiveofourown.org/works/1'] = html
+
+    assert cli.main(['work', '1', '258626'], api=api) == 0
+    first, second = map(json.loads, capsys.readouterr().out.splitlines())
+    assert first['authors'] == ['ambyr', 'other']
+    assert first['author'] == 'ambyr'
+    assert second['authors'] == ['ambyr']
+
+
+def test_work_reports_missing_works(api, capsys):
+    assert cli.main(['work', '404', '258626'], api=api) == 1
+    out, err = capsys.readouterr()
+    assert len(out.splitlines()) == 1
+    assert 'Skipping 404' in err
+
+
+def test_history(api, capsys, monkeypatch):
+    monkeypatch.setenv('AO3_PASSWORD', 'password')
+    assert cli.main(['history', 'reader'], api=api) == 0
+    assert capsys.readouterr().out.splitlines() == [
+        '258626\t2012-12-24', '123\t2012-01-03']
+
+
+def test_export(api, capsys, tmpdir):
+    ids = tmpdir.join('ids.txt')
+    ids.write('258626\n404\n')
+    output = tmpdir.join('works.ndjson')
+    assert cli.main(['export', str(output), '--ids', str(ids)], api=api) == 0
+    assert json.loads(output.read())['title'] == 'The Morning After'
+    assert 'Exported 1 works' in capsys.readouterr().err
+
+
+def test_export_to_stdout_needs_ndjson(api, capsys):
+    with pytest.raises(SystemExit):
+        cli.main(['export', '-', '--format', 'parquet'], api=api)
+    assert 'only ndjson' in capsys.readouterr().err
+    assert api.session.urls == []
+
+
+def test_a_command_is_required(capsys):
+    with pytest.raises(SystemExit):
+        cli.main([])
@@ -0,0 +1,127 @@
+# -*- encoding: utf-8
+"""Tests for ao3.export."""
+
+from datetime import date
+import io
+import json
+
+import pytest
+
+from ao3.export import (
+    export_works, guess_format, main, run_export, work_record
+)
+from ao3.works import Work
+
+
+@pytest.fixture
+def works(fixture_html):
+    html = fixture_html('work.html')
+    return [Work(str(i), html=html) for i in range(5)]
+
+
+def test_work_record(works):
+    record = work_record(works[0])
+    assert record['id'] == '0'
+    assert record['title'] == 'The Morning After'
+    assert record['authors'] == ['ambyr']
+    assert record['published'] == date(2011, 9, 29)
+    assert record['kudos'] == 1238
+
+
+@pytest.mark.parametrize('path, format', [
+    ('works.ndjson', 'ndjson'),
+    ('works.parquet', 'parquet'),
+    ('works.arrow', 'arrow'),
+    ('works', 'ndjson'),
+])
+def test_guess_format(path, format):
+    assert guess_format(path) == format
+
+
+def test_export_ndjson(works):
+    out = io.StringIO()
+    assert export_works(iter(works), out, batch_size=2) == 5
+
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 5
+    record = json.loads(lines[0])
+    assert record['published'] == '2011-09-29'
+    assert record['characters'] == [
+        'Pinboard', 'Delicious - Character', 'Diigo - Character']
+
+
+def test_export_consumes_works_in_batches(works):
+    seen = []
+
+    def generate():
+        for work in works:
+            seen.append(work.id)
+            yield work
+
+    class RecordingFile(io.StringIO):
+        def flush(self):
+            self.flushes = getattr(self, 'flushes', []) + [list(seen)]
+
+    out = RecordingFile()
+    export_works(generate(), out, batch_size=2)
+    assert out.flushes == [
+        ['0', '1'], ['0', '1', '2', '3'], ['0', '1', '2', '3', '4']]
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_export_columnar(works, tmpdir, format):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    path = str(tmpdir.join('works.' + format))
+    assert export_works(works, path, format=format, batch_size=2) == 5
+
+    if format == 'parquet':
+        table = pyarrow.parquet.read_table(path)
+    else:
+        with pyarrow.ipc.open_stream(path) as reader:
+            table = reader.read_all()
+    assert table.num_rows == 5
+    assert table.column('kudos').to_pylist() == [1238] * 5
+    assert table.column('published').to_pylist()[0] == date(2011, 9, 29)
+
+
+def test_unknown_format(works):
+    with pytest.raises(ValueError):
+        export_works(works, io.StringIO(), format='xml')
+
+
+def test_api_export_skips_missing_works(api):
+    errors = []
+    out = io.StringIO()
+    count = api.export(
+        ['258626', '404'], out,
+        on_error=lambda work_id, exc: errors.append(work_id))
+    assert count == 1
+    assert errors == ['404']
+
+
+def test_run_export_from_ids_file(api, tmpdir):
+    ids = tmpdir.join('ids.txt')
+    ids.write('# work IDs\n258626\n\n')
+    output = tmpdir.join('out.ndjson')
+
+    class Args(object):
+        bookmarks = None
+        format = None
+        batch_size = 10
+        max_workers = 2
+
+    args = Args()
+    args.ids = str(ids)
+    args.output = str(output)
+    assert run_export(api, args) == 1
+    assert json.loads(output.read())['id'] == '258626'
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_only_ndjson_goes_to_stdout(capsys, format):
+    with pytest.raises(SystemExit):
+        main(['-', '--ids', 'ids.txt', '--format', format])
+    assert 'only ndjson can be written to stdout' in capsys.readouterr().err
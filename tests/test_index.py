@@ -0,0 +1,119 @@
+# -*- encoding: utf-8
+"""Tests for ao3.index."""
+
+from datetime import date
+
+import pytest
+
+from ao3 import AO3
+from ao3.index import WorkIndex
+from ao3.parsers import WorkMetadata
+from ao3.works import Work
+
+
+def metadata(**kwargs):
+    fields = dict(
+        title='A Work', authors=['someone'], summary='<p>A summary.</p>',
+        rating=['General Audiences'], warnings=[], category=['Gen'],
+        fandoms=['Night Vale'], relationship=[], characters=['Cecil'],
+        additional_tags=['Fluff'], language='English',
+        published=date(2017, 1, 1), words=1000, comments=1, kudos=10,
+        bookmarks=1, hits=100)
+    fields.update(kwargs)
+    return WorkMetadata(**fields)
+
+
+@pytest.fixture
+def index():
+    index = WorkIndex(':memory:')
+    index.add_metadata('1', metadata(
+        title='Coffee Shop', words=60000, kudos=500,
+        additional_tags=['Alternate Universe - Coffee Shops', 'Slow Burn']))
+    index.add_metadata('2', metadata(
+        title='Short Thing', words=800, kudos=20, fandoms=['Star Wars']))
+    index.add_metadata('3', metadata(
+        title='Long Thing', words=90000, kudos=50,
+        fandoms=['Star Wars', 'Night Vale'], published=date(2012, 5, 5)),
+        collection='bookmarks')
+    return index
+
+
+def test_add_and_get(fixture_html):
+    index = WorkIndex(':memory:')
+    index.add(Work('258626', html=fixture_html('work.html')))
+
+    assert '258626' in index
+    assert len(index) == 1
+    meta = index.get('258626')
+    assert meta.title == 'The Morning After'
+    assert meta.published == date(2011, 9, 29)
+    assert meta.characters == [
+        'Pinboard', 'Delicious - Character', 'Diigo - Character']
+    assert index.get('404') is None
+
+
+def test_search_by_fandom_and_words(index):
+    results = index.search(fandom='star wars', min_words=50000)
+    assert [r.id for r in results] == ['3']
+    assert results[0].metadata.fandoms == ['Star Wars', 'Night Vale']
+
+
+def test_search_orders_results(index):
+    assert [r.id for r in index.search()] == ['1', '3', '2']
+    assert [r.id for r in index.search(order_by='words', limit=2)] == [
+        '2', '1']
+
+
+def test_full_text_search(index):
+    assert [r.id for r in index.search(text='coffee')] == ['1']
+    assert [r.id for r in index.search(text='"slow burn"')] == ['1']
+    assert [r.id for r in index.search(text='thing', fandom='Star Wars',
+                                       order_by='id')] == ['2', '3']
+
+
+def test_search_by_date_and_collection(index):
+    assert [r.id for r in index.search(
+        published_before=date(2015, 1, 1))] == ['3']
+    assert [r.id for r in index.search(collection='bookmarks')] == ['3']
+
+
+def test_updating_a_work_replaces_it(index):
+    index.add_metadata('1', metadata(title='Renamed', additional_tags=[]))
+    assert index.search(text='coffee') == []
+    assert index.get('1').title == 'Renamed'
+    assert len(index) == 3
+
+
+def test_remove(index):
+    index.remove('3')
+    assert '3' not in index
+    assert index.search(collection='bookmarks') == []
+
+
+def test_bad_order_by(index):
+    with pytest.raises(ValueError):
+        index.search(order_by='title; DROP TABLE works')
+
+
+def test_update_only_fetches_missing_works(api, work_session):
+    index = WorkIndex(':memory:')
+    index.add_metadata('123', metadata())
+
+    assert index.missing(['258626', '123']) == ['258626']
+    assert index.update(api, ['258626', '123'], collection='faves') == 1
+    assert work_session.urls == ['https://archiveofourown.org/works/258626']
+    assert sorted(r.id for r in index.search(collection='faves')) == [
+        '123', '258626']
+
+    assert index.update(api, ['258626', '123']) == 0
+    assert index.missing(['258626'], max_age=-1) == ['258626']
+
+
+def test_api_adds_fetched_works_to_index(work_session):
+    index = WorkIndex(':memory:')
+    api = AO3(index=index)
+    api.session = work_session
+
+    list(api.works(['258626', '404']))
+    assert len(index) == 1
+    assert index.get('258626').kudos == 1238
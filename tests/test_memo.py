@@ -0,0 +1,121 @@
+# -*- encoding: utf-8
+"""Tests for ao3.memo."""
+
+import threading
+import time
+
+import pytest
+
+from ao3 import AO3
+from ao3.memo import LRUCache, SingleFlight
+from ao3.works import WorkNotFound
+
+
+def test_lru_cache_drops_the_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_of_size_zero_keeps_nothing():
+    cache = LRUCache(maxsize=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 'result'
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+        for _ in range(5)]
+    threads[0].start()
+    started.wait()
+
+    # Count the threads that are waiting for the first call to finish.
+    future = flight._calls['k']
+    waiting = []
+    wait_for_result = future.result
+
+    def result():
+        waiting.append(1)
+        return wait_for_result()
+
+    future.result = result
+    for t in threads[1:]:
+        t.start()
+    while len(waiting) < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert results == ['result'] * 5
+    assert len(flight) == 0
+
+
+def test_single_flight_shares_exceptions():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do('k', lambda: int('x'))
+    assert flight.do('k', lambda: 1) == 1
+
+
+def test_work_is_remembered(api):
+    work = api.work('258626')
+    assert api.work(258626) is work
+    assert api.work('258626', lazy=True) is work
+    assert api.session.urls == ['https://archiveofourown.org/works/258626']
+
+
+def test_work_is_remembered_separately_for_each_mode(api):
+    work = api.work('258626')
+    low_memory = api.work('258626', low_memory=True)
+    assert low_memory is not work
+    assert low_memory._html is None
+    assert api.work('258626', low_memory=True) is low_memory
+
+    metadata_only = api.work('258626', metadata_only=True)
+    assert metadata_only is not work
+    assert metadata_only._metadata_only
+    assert api.work('258626') is work
+    assert len(api.session.urls) == 3
+
+
+def test_works_fetches_repeated_ids_once(api):
+    works = list(api.works(['258626'] * 10, max_workers=4))
+    assert len(works) == 10
+    assert len(set(map(id, works))) == 1
+    assert api.session.urls == ['https://archiveofourown.org/works/258626']
+
+
+def test_missing_works_are_not_remembered(api):
+    for _ in range(2):
+        with pytest.raises(WorkNotFound):
+            api.work('404')
+    assert len(api.session.urls) == 2
+
+
+def test_memo_can_be_turned_off(work_session):
+    api = AO3(memo_size=0)
+    api.session = work_session
+    assert api.work('258626') is not api.work('258626')
+    assert len(work_session.urls) == 2
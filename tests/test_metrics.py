@@ -0,0 +1,180 @@
+# -*- encoding: utf-8
+"""Tests for ao3.metrics."""
+
+import logging
+import time
+
+import pytest
+import requests
+
+from ao3 import AO3
+from ao3.cache import CachingAdapter, PageCache
+from ao3.metrics import (
+    CounterSink, Instrumentation, InstrumentedAdapter, InstrumentedParser,
+    LoggingSink, ParseEvent, RequestEvent, request_kind
+)
+from ao3.ratelimit import RateLimitedAdapter, RateLimiter
+from ao3.works import Work
+
+from helpers import StubAdapter
+
+
+def make_session(instrumentation, adapter):
+    sess = requests.Session()
+    sess.mount('https://', InstrumentedAdapter(
+        instrumentation, adapter=adapter))
+    return sess
+
+
+@pytest.mark.parametrize('url, kind', [
+    ('https://archiveofourown.org/', 'login'),
+    ('https://archiveofourown.org/user_sessions', 'login'),
+    ('https://archiveofourown.org/works/1', 'work'),
+    ('https://archiveofourown.org/works/1/kudos?page=2', 'kudos'),
+    ('https://archiveofourown.org/users/a/bookmarks?page=1', 'bookmarks'),
+    ('https://archiveofourown.org/users/a/readings?page=1', 'readings'),
+    ('https://archiveofourown.org/tags', 'default'),
+])
+def test_request_kind(url, kind):
+    assert request_kind(url) == kind
+
+
+def test_request_events():
+    events = []
+    sess = make_session(
+        Instrumentation([events.append]), StubAdapter(content=b'x' * 100))
+    sess.get('https://archiveofourown.org/works/1')
+
+    event, = events
+    assert event.kind == 'work'
+    assert event.method == 'GET'
+    assert event.status == 200
+    assert event.bytes == 100
+    assert event.network_time >= 0
+    assert event.retries == 0
+    assert event.cache is None
+
+
+def test_no_events_without_sinks():
+    instrumentation = Instrumentation()
+    sess = make_session(instrumentation, StubAdapter())
+    sess.get('https://archiveofourown.org/works/1')
+
+    # Sinks can be added at any time, and only see requests made after.
+    events = []
+    instrumentation.add_sink(events.append)
+    sess.get('https://archiveofourown.org/works/2')
+    assert [e.url for e in events] == ['https://archiveofourown.org/works/2']
+
+
+def test_retries_are_reported():
+    class FlakyAdapter(StubAdapter):
+        def send(self, request, **kwargs):
+            self.status_code = 429 if len(self.requests) < 2 else 200
+            return super(FlakyAdapter, self).send(request, **kwargs)
+
+    events = []
+    limiter = RateLimiter(rate=1000, sleep=lambda seconds: None)
+    sess = make_session(
+        Instrumentation([events.append]),
+        RateLimitedAdapter(limiter, adapter=FlakyAdapter()))
+    sess.get('https://archiveofourown.org/works/1')
+
+    assert events[0].retries == 2
+    assert events[0].status == 200
+
+
+def test_cache_hits_are_reported():
+    events = []
+    adapter = CachingAdapter(PageCache(':memory:'), adapter=StubAdapter())
+    sess = make_session(Instrumentation([events.append]), adapter)
+    sess.get('https://archiveofourown.org/works/1')
+    sess.get('https://archiveofourown.org/works/1')
+    assert [e.cache for e in events] == ['miss', 'hit']
+
+
+def test_parse_events(fixture_html):
+    events = []
+    api = AO3(sinks=[events.append])
+    html = fixture_html('work.html')
+    work = Work('258626', html=html, parser=api.parser)
+    assert work.title == 'The Morning After'
+
+    assert [e.kind for e in events] == ['parse', 'work_metadata']
+    assert events[0].bytes == len(html)
+    assert events[1].bytes is None
+    assert api.parser.name == 'html.parser'
+
+
+def test_kudos_event_is_sent_after_the_kudos_are_read(fixture_html):
+    events = []
+    api = AO3(sinks=[events.append])
+    tree = api.parser.parse(fixture_html('work.html'))
+    del events[:]
+
+    kudos = api.parser.kudos_left_by(tree)
+    assert events == []
+    assert len(list(kudos)) > 0
+    assert [e.kind for e in events] == ['kudos_left_by']
+
+
+class SlowParser(object):
+    def kudos_left_by(self, tree):
+        for username in tree:
+            time.sleep(0.02)
+            yield username
+
+
+def test_kudos_parse_time_covers_the_whole_list():
+    events = []
+    parser = InstrumentedParser(SlowParser(), Instrumentation([events.append]))
+    for _ in parser.kudos_left_by(['a', 'b', 'c']):
+        # Time spent by the caller isn't parsing.
+        time.sleep(0.05)
+
+    event, = events
+    assert 0.06 <= event.parse_time < 0.15
+
+
+def test_kudos_event_is_sent_if_the_caller_stops_early():
+    events = []
+    parser = InstrumentedParser(SlowParser(), Instrumentation([events.append]))
+    kudos = parser.kudos_left_by(['a', 'b', 'c'])
+    assert next(kudos) == 'a'
+    kudos.close()
+    assert [e.kind for e in events] == ['kudos_left_by']
+
+
+def test_listing_parse_events(fixture_html):
+    events = []
+    api = AO3(sinks=[events.append])
+    html = fixture_html('tag_works.html')
+    assert api.parser.blurbs_page(html).items
+
+    assert [e.kind for e in events] == ['blurbs_page']
+    assert events[0].bytes == len(html)
+
+
+def test_counter_sink():
+    counters = CounterSink()
+    for status in (200, 200, 429):
+        counters(RequestEvent(
+            kind='work', method='GET', url='', status=status, bytes=10,
+            network_time=0.5, retries=1, cache='miss'))
+    counters(ParseEvent(kind='parse', bytes=10, parse_time=0.25))
+
+    assert counters.get('ao3_requests_total', kind='work', status='200') == 2
+    assert counters.get('ao3_requests_total') == 3
+    assert counters.get('ao3_request_seconds_total') == 1.5
+    assert counters.get('ao3_retries_total', kind='work') == 3
+    assert counters.get('ao3_cache_total', outcome='miss') == 3
+    assert counters.get('ao3_parse_seconds_total', kind='parse') == 0.25
+    assert (
+        'ao3_requests_total{kind="work",status="429"} 1.0'
+        in counters.render().splitlines())
+
+
+def test_logging_sink(caplog):
+    caplog.set_level(logging.DEBUG, logger='ao3.metrics')
+    LoggingSink()(ParseEvent(kind='parse', bytes=10, parse_time=0.25))
+    assert 'parser.parse (10 bytes, 0.250s)' in caplog.text
@@ -0,0 +1,226 @@
+# -*- encoding: utf-8
+"""Tests for ao3.parsers."""
+
+import sys
+
+import pytest
+
+from ao3 import parsers
+
+
+BACKENDS = ['html.parser', 'lxml', 'selectolax']
+
+
+@pytest.fixture(params=BACKENDS)
+def parser(request):
+    if request.param != 'html.parser':
+        pytest.importorskip(request.param)
+    return parsers.get_parser(request.param)
+
+
+def _as_dict(meta):
+    return {name: getattr(meta, name) for name in meta.__slots__}
+
+
+def test_backends_extract_the_same_metadata(parser, fixture_html):
+    html = fixture_html('work.html')
+    expected = parsers.get_parser().work_metadata(
+        parsers.get_parser().parse(html))
+    actual = parser.work_metadata(parser.parse(html))
+    assert _as_dict(actual) == _as_dict(expected)
+
+
+def test_backends_find_the_same_kudos(parser, fixture_html):
+    tree = parser.parse(fixture_html('work.html'))
+    assert list(parser.kudos_left_by(tree)) == [
+        'winterbelles', 'AnonEhouse', 'SailAweigh']
+
+
+def test_backends_parse_bookmarks_pages(parser, fixture_html):
+    assert parser.bookmarks_page(fixture_html('bookmarks.html')) == (
+        ['258626', '123'], True, 3)
+
+
+def test_backends_parse_blurbs_the_same(parser, fixture_html):
+    html = fixture_html('bookmarks.html')
+    expected = parsers.get_parser().blurbs_page(html)
+    actual = parser.blurbs_page(html)
+    assert actual.page_count == expected.page_count == 3
+    assert len(actual.items) == 2
+    for a, e in zip(actual.items, expected.items):
+        assert (a.work_id, a.updated) == (e.work_id, e.updated)
+        assert _as_dict(a.metadata) == _as_dict(e.metadata)
+
+
+def test_blurb_has_the_same_metadata_as_the_work(parser, fixture_html):
+    blurb = parser.blurbs_page(fixture_html('bookmarks.html')).items[0]
+    meta = parser.work_metadata(parser.parse(fixture_html('work.html')))
+    expected = dict(_as_dict(meta), published=None)
+    assert _as_dict(blurb.metadata) == expected
+
+
+def test_backends_parse_readings_pages(parser, fixture_html):
+    entries, has_next_page, page_count = parser.readings_page(
+        fixture_html('readings.html'))
+    assert [e.work_id for e in entries] == ['258626', '123']
+    assert [e.last_read.year for e in entries] == [2012, 2012]
+    assert not has_next_page
+    assert page_count == 1
+
+
+def test_large_numbers_have_thousands_separators(parser):
+    html = (
+        '<dl class="work meta group"><dd class="stats"><dl class="stats">'
+        '<dd class="words">12,345</dd><dd class="hits">1,234,567</dd>'
+        '</dl></dd></dl>')
+    meta = parser.work_metadata(parser.parse(html))
+    assert meta.words == 12345
+    assert meta.hits == 1234567
+    assert meta.kudos == 0
+
+
+def test_missing_backend_falls_back_to_html_parser(monkeypatch):
+    monkeypatch.setattr(parsers, '_parsers', {})
+    monkeypatch.setitem(sys.modules, 'lxml', None)
+    assert parsers.get_parser('lxml').name == 'html.parser'
+
+
+def test_unknown_backend_is_an_error():
+    with pytest.raises(ValueError):
+        parsers.get_parser('regex')
+
+
+def test_partial_parsing_extracts_the_same_data(parser, fixture_html):
+    html = fixture_html('work.html')
+    full = parser.work_metadata(parser.parse(html))
+    partial = parser.work_metadata(parser.parse_metadata(html))
+    assert _as_dict(partial) == _as_dict(full)
+
+    kudos = list(parser.kudos_left_by(parser.parse_kudos(html)))
+    assert kudos == list(parser.kudos_left_by(parser.parse(html)))
+
+
+def test_partial_parsing_skips_the_work_text(fixture_html):
+    parser = parsers.get_parser('html.parser')
+    tree = parser.parse_metadata(fixture_html('work.html'))
+    assert 'Delicious wakes up' not in str(tree)
+    assert tree.find('div', attrs={'id': 'kudos'}) is None
+
+
+def test_kudos_scanner_works_across_chunk_boundaries(fixture_html):
+    html = fixture_html('kudos_page1.html')
+    scanner = parsers.KudosScanner()
+    usernames = []
+    for i in range(0, len(html), 7):
+        scanner.feed(html[i:i + 7])
+        usernames.extend(scanner.drain())
+    scanner.close()
+    usernames.extend(scanner.drain())
+
+    assert usernames == ['winterbelles', 'AnonEhouse', 'SailAweigh', 'reader']
+    assert scanner.has_next_page
+
+
+def test_kudos_scanner_on_work_page_skips_controls(fixture_html):
+    scanner = parsers.KudosScanner()
+    scanner.feed(fixture_html('work.html'))
+    scanner.close()
+    assert scanner.drain() == ['winterbelles', 'AnonEhouse', 'SailAweigh']
+    assert not scanner.has_next_page
+
+
+@pytest.mark.parametrize('chunk_size', [1, 50, 100000])
+def test_chapter_scanner(fixture_html, chunk_size):
+    html = fixture_html('full_work.html')
+    scanner = parsers.ChapterScanner()
+    chapters = []
+    for i in range(0, len(html), chunk_size):
+        scanner.feed(html[i:i + chunk_size])
+        chapters.extend(scanner.drain())
+    scanner.close()
+    chapters.extend(scanner.drain())
+
+    assert [c.number for c in chapters] == [1, 2, 3]
+    assert chapters[0].title == 'Chapter 1: Sundown'
+    assert chapters[0].html.endswith(
+        '<p>Cecil turns on the microphone.<br/>Nobody &amp; nothing '
+        'answers.</p>')
+    assert 'Chapter Text' not in chapters[0].html
+    assert 'More soon' not in chapters[0].html
+    assert not scanner.restricted
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100000])
+def test_chapter_scanner_on_restricted_work(fixture_html, chunk_size):
+    html = fixture_html('restricted.html')
+    scanner = parsers.ChapterScanner()
+    for i in range(0, len(html), chunk_size):
+        scanner.feed(html[i:i + chunk_size])
+    scanner.close()
+    assert scanner.restricted
+    assert scanner.drain() == []
+
+
+def test_chapter_scanner_on_single_chapter_work(fixture_html):
+    scanner = parsers.ChapterScanner()
+    scanner.feed(fixture_html('work.html'))
+    scanner.close()
+    chapter, = scanner.drain()
+    assert chapter.number == 1
+    assert chapter.title is None
+    assert chapter.html.startswith('<p>Delicious wakes up')
+
+
+def test_tags_are_plain_shared_strings(parser, fixture_html):
+    html = fixture_html('work.html')
+    first = parser.work_metadata(parser.parse(html))
+    second = parser.work_metadata(parser.parse(html))
+
+    for name in ('characters', 'additional_tags', 'fandoms', 'authors'):
+        for tag in getattr(first, name):
+            assert type(tag) is type(u'')
+    assert type(first.title) is type(u'')
+    assert all(a is b for a, b in zip(first.characters, second.characters))
+    assert first.language is second.language
+
+
+def test_tag_vocabulary():
+    vocabulary = parsers.TagVocabulary()
+    name = vocabulary.intern(u''.join(['Slow', ' Burn']))
+    assert vocabulary.intern(u'Slow Burn') is name
+    assert u'Slow Burn' in vocabulary
+    assert vocabulary.id(u'Fluff') == 1
+    assert vocabulary.name(vocabulary.id(u'Slow Burn')) == u'Slow Burn'
+    assert len(vocabulary) == 2
+
+    vocabulary.clear()
+    assert len(vocabulary) == 0
+
+
+def test_bounded_tag_vocabulary_stops_growing():
+    vocabulary = parsers.TagVocabulary(maxsize=2)
+    vocabulary.intern_all([u'Fluff', u'Angst'])
+    name = vocabulary.intern(u'Slow Burn')
+    assert name == u'Slow Burn'
+    assert type(name) is type(u'')
+    assert u'Slow Burn' not in vocabulary
+    assert len(vocabulary) == 2
+    with pytest.raises(KeyError):
+        vocabulary.id(u'Slow Burn')
+
+
+def test_authors_are_not_interned(fixture_html):
+    vocabulary = parsers.TagVocabulary()
+    parser = parsers.SoupParser(vocabulary=vocabulary)
+    meta = parser.work_metadata(parser.parse(fixture_html('work.html')))
+    assert meta.authors
+    for author in meta.authors:
+        assert type(author) is type(u'')
+        assert author not in vocabulary
+
+
+def test_parser_with_its_own_vocabulary(fixture_html):
+    vocabulary = parsers.TagVocabulary()
+    parser = parsers.SoupParser(vocabulary=vocabulary)
+    meta = parser.work_metadata(parser.parse(fixture_html('work.html')))
+    assert vocabulary.intern(u'Meta') is meta.additional_tags[1]
@@ -0,0 +1,64 @@
+# -*- encoding: utf-8
+"""Tests for ao3.pipeline."""
+
+import sys
+
+import pytest
+
+from ao3 import AO3
+from ao3.parsers import TAGS
+from ao3.pipeline import _process_pool, parse_metadata, pipeline_works
+
+
+def test_parse_metadata(fixture_html):
+    meta = parse_metadata(fixture_html('work.html'), 'html.parser')
+    assert meta.title == 'The Morning After'
+    assert meta.kudos == 1238
+
+
+def test_pipeline_works(work_session):
+    errors = []
+    works = list(pipeline_works(
+        ['258626', '404', '258626'], sess=work_session, processes=2,
+        on_error=lambda work_id, exc: errors.append(work_id)))
+
+    assert [w.id for w in works] == ['258626', '258626']
+    assert errors == ['404']
+    assert works[0].title == 'The Morning After'
+    assert works[0].characters[0] is works[1].characters[0]
+    assert works[0].characters[0] is TAGS.intern(u'Pinboard')
+
+    # Only the metadata has been parsed, so nothing else has been fetched.
+    assert not works[0].is_loaded
+    assert sorted(set(work_session.urls)) == [
+        'https://archiveofourown.org/works/258626',
+        'https://archiveofourown.org/works/404',
+    ]
+
+
+def test_pipeline_stops_when_nobody_is_listening(work_session):
+    ids = ['258626'] * 1000
+    works = pipeline_works(
+        iter(ids), sess=work_session, max_workers=2, processes=1,
+        max_pending=2)
+    next(works)
+    works.close()
+    assert len(work_session.urls) < 20
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 7), reason='needs the mp_context argument')
+def test_workers_are_not_forked():
+    # The download threads are already running when the workers start.
+    with _process_pool(1) as executor:
+        assert executor._mp_context.get_start_method() != 'fork'
+
+
+def test_api_pipeline(work_session):
+    api = AO3(parser='selectolax')
+    api.session = work_session
+    work, = api.pipeline(['258626'], processes=1)
+    assert work.kudos == 1238
+
+    # Anything other than the metadata is fetched when it's needed.
+    assert list(work.kudos_left_by)[:1] == ['winterbelles']
@@ -0,0 +1,104 @@
+# -*- encoding: utf-8
+"""Tests for ao3.ratelimit."""
+
+import pytest
+import requests
+
+from ao3.ratelimit import RateLimitedAdapter, RateLimiter, parse_retry_after
+
+from helpers import StubAdapter
+
+
+class FakeClock(object):
+    """A clock that only moves when somebody sleeps."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_limiter(clock, **kwargs):
+    return RateLimiter(clock=clock.time, sleep=clock.sleep, **kwargs)
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('120', 120),
+    ('Thu, 01 Jan 1970 00:01:00 GMT', 30),
+    (None, None),
+    ('soon', None),
+])
+def test_parse_retry_after(value, seconds):
+    assert parse_retry_after(value, now=30) == seconds
+
+
+def test_requests_are_spaced_out(clock):
+    limiter = make_limiter(clock, rate=2, burst=1)
+    for _ in range(4):
+        limiter.acquire()
+    assert clock.sleeps == [0.5, 0.5, 0.5]
+
+
+def test_burst_allows_requests_at_once(clock):
+    limiter = make_limiter(clock, rate=1, burst=3)
+    for _ in range(3):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+
+def test_throttling_blocks_and_slows_down(clock):
+    limiter = make_limiter(clock, rate=2)
+    limiter.acquire()
+    limiter.throttled(retry_after=10)
+    assert limiter.rate == 1
+
+    limiter.acquire()
+    assert clock.sleeps == [10]
+
+
+def test_rate_recovers_after_successes(clock):
+    limiter = make_limiter(clock, rate=2)
+    limiter.throttled(retry_after=0)
+    for _ in range(30):
+        limiter.succeeded()
+    assert limiter.rate == 2
+
+
+def test_throttled_requests_are_retried(clock):
+    class FlakyAdapter(StubAdapter):
+        def send(self, request, **kwargs):
+            self.status_code = 429 if len(self.requests) < 2 else 200
+            return super(FlakyAdapter, self).send(request, **kwargs)
+
+    stub = FlakyAdapter(headers={'Retry-After': '5'})
+    limiter = make_limiter(clock, rate=1)
+    sess = requests.Session()
+    sess.mount('https://', RateLimitedAdapter(limiter, adapter=stub))
+
+    resp = sess.get('https://archiveofourown.org/works/1')
+    assert resp.status_code == 200
+    assert len(stub.requests) == 3
+    assert limiter.stats['throttled'] == 2
+    assert sum(clock.sleeps) >= 10
+
+
+def test_gives_up_after_max_retries(clock):
+    stub = StubAdapter(status_code=503)
+    limiter = make_limiter(clock, rate=1, backoff=1)
+    sess = requests.Session()
+    sess.mount('https://', RateLimitedAdapter(
+        limiter, adapter=stub, max_retries=2))
+
+    assert sess.get('https://archiveofourown.org/').status_code == 503
+    assert len(stub.requests) == 3
@@ -0,0 +1,106 @@
+# -*- encoding: utf-8
+"""Tests for ao3.search."""
+
+from datetime import date
+
+import pytest
+
+from ao3 import AO3, search
+from helpers import FakeSession
+
+
+def test_tag_url():
+    assert search.tag_url('Carlos/Cecil Palmer') == (
+        'https://archiveofourown.org/tags/Carlos*s*Cecil%20Palmer/works')
+    assert search.tag_url('Harry Potter - J. K. Rowling') == (
+        'https://archiveofourown.org/tags/'
+        'Harry%20Potter%20-%20J*d*%20K*d*%20Rowling/works')
+
+
+def test_work_search_params():
+    params = search.work_search_params(
+        search._TAG_FILTERS, sort_by='kudos', complete=True, words_from=1000,
+        updated_from=date(2016, 1, 1), include_tags=['Fluff', 'Radio'],
+        query=None)
+    assert params == [
+        ('work_search[complete]', 'T'),
+        ('work_search[other_tag_names]', 'Fluff,Radio'),
+        ('work_search[sort_column]', 'kudos_count'),
+        ('work_search[date_from]', '2016-01-01'),
+        ('work_search[words_from]', 1000),
+    ]
+
+
+def test_boolean_search_fields():
+    # ``complete`` and ``crossover`` are radio buttons on the form, but
+    # ``single_chapter`` is a checkbox.
+    params = search.work_search_params(
+        search._SEARCH_FIELDS, complete=False, crossover=True,
+        single_chapter=True)
+    assert params == [
+        ('work_search[complete]', 'F'),
+        ('work_search[crossover]', 'T'),
+        ('work_search[single_chapter]', '1'),
+    ]
+    assert search.work_search_params(
+        search._SEARCH_FIELDS, single_chapter=False) == [
+        ('work_search[single_chapter]', '0'),
+    ]
+
+
+@pytest.mark.parametrize('kwargs, exc', [
+    ({'sort_by': 'popularity'}, ValueError),
+    ({'sort_direction': 'sideways'}, ValueError),
+    ({'fandoms': ['Night Vale']}, TypeError),
+])
+def test_bad_tag_filters(kwargs, exc):
+    with pytest.raises(exc):
+        search.work_search_params(search._TAG_FILTERS, **kwargs)
+
+
+@pytest.fixture
+def api(fixture_html):
+    page1 = fixture_html('tag_works.html')
+    page2 = page1.replace('work_999', 'work_1001').replace(
+        '/works/999"', '/works/1001"').replace(
+        '<a href="/works/1000">', '<a href="/works/1002">').replace(
+        '<li class="next" title="next"><a rel="next" '
+        'href="/tags/Night%20Vale/works?page=2">',
+        '<li class="next" title="next"><span class="disabled">')
+    url = 'https://archiveofourown.org/tags/Night%20Vale/works?'
+    api = AO3()
+    api.session = FakeSession({
+        url + 'work_search%5Bsort_column%5D=kudos_count&page=1': page1,
+        url + 'work_search%5Bsort_column%5D=kudos_count&page=2': page2,
+        'https://archiveofourown.org/works/search?'
+        'work_search%5Bfandom_names%5D=Night+Vale&'
+        'work_search%5Bword_count%5D=%3E1000&page=1': page2,
+    })
+    return api
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_tag_works(api, max_workers):
+    blurbs = list(api.tag_works(
+        'Night Vale', sort_by='kudos', max_workers=max_workers))
+    assert [b.id for b in blurbs] == ['999', '1000', '1001', '1002']
+    assert len(api.session.urls) == 2
+
+    blurb = blurbs[0]
+    assert blurb.title == 'Night Shifts'
+    assert blurb.author == 'someone'
+    assert blurb.characters == ['Cecil Palmer']
+    assert blurb.words == 1234
+    assert blurb.chapters == (3, None)
+    assert blurb.updated == date(2016, 2, 12)
+    assert blurb.url == 'https://archiveofourown.org/works/999'
+
+
+def test_search_works(api):
+    blurbs = list(api.search_works(fandoms=['Night Vale'], words='>1000'))
+    assert [b.id for b in blurbs] == ['1001', '1002']
+
+
+def test_missing_tag(api):
+    with pytest.raises(search.ListingNotFound):
+        list(api.tag_works('No Such Tag'))
@@ -0,0 +1,101 @@
+# -*- encoding: utf-8
+"""Tests for ao3.sync."""
+
+from datetime import date
+
+from ao3 import sync
+from ao3.parsers import ReadingHistoryItem
+from ao3.sync import (
+    ReadingHistoryCheckpoint, entries_since, load_checkpoint,
+    save_checkpoint, sync_reading_history, update_checkpoint
+)
+
+
+HISTORY = [
+    ReadingHistoryItem('5', date(2017, 1, 3)),
+    ReadingHistoryItem('4', date(2017, 1, 2)),
+    ReadingHistoryItem('3', date(2017, 1, 2)),
+    ReadingHistoryItem('2', date(2017, 1, 1)),
+    ReadingHistoryItem('1', date(2016, 12, 25)),
+]
+
+
+class StubUser(object):
+    """A user whose reading history is a list, that records how many
+    entries were read from it."""
+
+    def __init__(self, history):
+        self.history = history
+        self.entries_read = 0
+
+    def reading_history(self, max_workers=4):
+        for entry in self.history:
+            self.entries_read += 1
+            yield entry
+
+
+def test_no_checkpoint_returns_everything():
+    assert list(entries_since(HISTORY, None)) == HISTORY
+
+
+def test_entries_since_skips_work_seen_on_the_same_day():
+    checkpoint = ReadingHistoryCheckpoint(date(2017, 1, 2), frozenset(['3']))
+    assert [e.work_id for e in entries_since(HISTORY, checkpoint)] == [
+        '5', '4']
+
+
+def test_entries_since_stops_at_older_entries():
+    checkpoint = ReadingHistoryCheckpoint(date(2017, 1, 2), frozenset())
+    user = StubUser(HISTORY)
+    list(entries_since(user.reading_history(), checkpoint))
+    assert user.entries_read == 4
+
+
+def test_update_checkpoint_merges_ids_from_the_same_day():
+    checkpoint = ReadingHistoryCheckpoint(date(2017, 1, 2), frozenset(['3']))
+    new = update_checkpoint(checkpoint, [HISTORY[1]])
+    assert new == ReadingHistoryCheckpoint(
+        date(2017, 1, 2), frozenset(['3', '4']))
+
+
+def test_update_checkpoint_with_nothing_new():
+    checkpoint = ReadingHistoryCheckpoint(date(2017, 1, 2), frozenset(['3']))
+    assert update_checkpoint(checkpoint, []) is checkpoint
+
+
+def test_checkpoint_round_trips(tmpdir):
+    path = str(tmpdir.join('checkpoint.json'))
+    checkpoint = ReadingHistoryCheckpoint(
+        date(2017, 1, 2), frozenset(['3', '4']))
+    save_checkpoint(path, checkpoint)
+    assert load_checkpoint(path) == checkpoint
+
+
+def test_checkpoint_is_replaced_without_os_replace(tmpdir, monkeypatch):
+    # Python 2 doesn't have ``os.replace``.
+    monkeypatch.setattr(sync, '_replace', sync._rename_over)
+    path = str(tmpdir.join('checkpoint.json'))
+    first = ReadingHistoryCheckpoint(date(2017, 1, 1), frozenset(['2']))
+    second = ReadingHistoryCheckpoint(date(2017, 1, 2), frozenset(['3']))
+    save_checkpoint(path, first)
+    save_checkpoint(path, second)
+    assert load_checkpoint(path) == second
+    assert tmpdir.listdir() == [tmpdir.join('checkpoint.json')]
+
+
+def test_missing_checkpoint_file():
+    assert load_checkpoint('/does/not/exist.json') is None
+
+
+def test_sync_only_returns_the_delta(tmpdir):
+    path = str(tmpdir.join('checkpoint.json'))
+    user = StubUser(HISTORY[2:])
+    assert sync_reading_history(user, path) == HISTORY[2:]
+
+    user = StubUser(HISTORY)
+    assert sync_reading_history(user, path) == HISTORY[:2]
+    assert user.entries_read == 4
+
+    user = StubUser(HISTORY)
+    assert sync_reading_history(user, path) == []
+    assert user.entries_read == 2
@@ -0,0 +1,124 @@
+# -*- encoding: utf-8
+"""Tests for ao3.users."""
+
+from datetime import date
+
+import pytest
+
+from ao3 import users
+from ao3.parsers import ReadingHistoryItem
+from helpers import FakeSession
+
+
+def test_parse_readings_page(fixture_html):
+    entries, has_next_page, page_count = users.parse_readings_page(
+        fixture_html('readings.html'))
+    assert entries == [
+        ReadingHistoryItem('258626', date(2012, 12, 24)),
+        ReadingHistoryItem('123', date(2012, 1, 3)),
+    ]
+    assert entries[0].work_id == '258626'
+    assert not has_next_page
+
+
+def test_parse_bookmarks_page_skips_external_works(fixture_html):
+    page = users.parse_bookmarks_page(fixture_html('bookmarks.html'))
+    assert page.items == ['258626', '123']
+    assert page.has_next_page
+    assert page.page_count == 3
+
+
+def test_parse_blurbs_page(fixture_html):
+    page = users.parse_blurbs_page(fixture_html('bookmarks.html'))
+    assert [blurb.work_id for blurb in page.items] == ['258626', '123']
+    assert page.page_count == 3
+
+    blurb = page.items[1]
+    assert blurb.updated == date(2017, 3, 5)
+    assert blurb.metadata.title == 'Another Story'
+    assert blurb.metadata.authors == ['someone', 'other']
+    assert blurb.metadata.category == ['F/M', 'M/M']
+    assert blurb.metadata.fandoms == ['Star Wars', 'Night Vale']
+    assert blurb.metadata.words == 12345
+    assert blurb.metadata.chapters == (3, None)
+    assert blurb.metadata.comments == 0
+    assert blurb.metadata.published is None
+
+
+def test_parse_authenticity_token(fixture_html):
+    token = users.parse_authenticity_token(fixture_html('work.html'))
+    assert token == 'AUTH_TOKEN'
+
+
+def bookmarks_page(page_no, page_count, work_ids):
+    """Build a page of bookmarks, with the pagination block AO3 uses."""
+    blurbs = ''.join(
+        '<li id="bookmark_%s" class="bookmark blurb group">'
+        '<h4 class="heading"><a href="/works/%s">Title</a></h4></li>'
+        % (work_id, work_id) for work_id in work_ids)
+    numbers = ''.join(
+        '<li><a href="?page=%d">%d</a></li>' % (n, n)
+        for n in range(1, page_count + 1))
+    if page_no < page_count:
+        next_button = '<li class="next"><a href="?page=%d">Next</a></li>' % (
+            page_no + 1)
+    else:
+        next_button = (
+            '<li class="next"><span class="disabled">Next</span></li>')
+    return (
+        '<ol class="bookmark index group">%s</ol>'
+        '<ol class="pagination actions">%s%s</ol>'
+        % (blurbs, numbers, next_button))
+
+
+@pytest.fixture
+def user(fixture_html):
+    pages = {'https://archiveofourown.org': fixture_html('work.html')}
+    for page_no in range(1, 6):
+        url = (
+            'https://archiveofourown.org/users/reader/bookmarks?page=%d' %
+            page_no)
+        pages[url] = bookmarks_page(
+            page_no, 5, [str(page_no * 10 + i) for i in range(3)])
+    return users.User('reader', 'password', sess=FakeSession(pages))
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_bookmarks_ids_fetches_every_page_in_order(user, max_workers):
+    assert user.bookmarks_ids(max_workers=max_workers) == [
+        str(page_no * 10 + i) for page_no in range(1, 6) for i in range(3)]
+
+
+def test_bookmarks_ids_carries_on_if_pages_are_added(user):
+    # The first page thinks there are only 3 pages, but by the time we get
+    # to the third page, there are more.
+    first_url = 'https://archiveofourown.org/users/reader/bookmarks?page=1'
+    user.sess.pages[first_url] = bookmarks_page(1, 3, ['10', '11', '12'])
+    work_ids = user.bookmarks_ids(max_workers=4)
+    assert work_ids[-3:] == ['50', '51', '52']
+    assert len(work_ids) == 15
+
+
+def test_user_with_base_url(fixture_html):
+    sess = FakeSession({
+        'http://localhost:8000': fixture_html('work.html'),
+        'http://localhost:8000/users/reader/readings?page=1':
+            fixture_html('readings.html'),
+    })
+    user = users.User(
+        'reader', 'password', sess=sess, base_url='http://localhost:8000')
+    assert [entry.work_id for entry in user.reading_history()] == [
+        '258626', '123']
+    assert sess.urls[1] == 'http://localhost:8000/user_sessions'
+
+
+def test_bookmark_blurbs_only_fetches_listing_pages(user):
+    blurbs = user.bookmark_blurbs()
+    assert len(user.sess.urls) == 2 + 5
+    assert [blurb.id for blurb in blurbs] == user.bookmarks_ids()
+    assert blurbs[0].title == 'Title'
+
+    work = blurbs[0].work(lazy=True)
+    assert work.id == '10'
+    assert work.url == blurbs[0].url
+    assert not work.is_loaded
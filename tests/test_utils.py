@@ -1,6 +1,9 @@
 # -*- encoding: utf-8
 """Tests for ao3.utils."""
 
+import threading
+import time
+
 import pytest
 
 from ao3 import utils
@@ -27,3 +30,74 @@ def test_work_id_from_bad_url_raises_runtimeerror(bad_url):
     with pytest.raises(RuntimeError) as exc:
         utils.work_id_from_url(bad_url)
     assert 'not a recognised AO3 work URL' in exc.value.message
+
+
+def _slow_square(n):
+    # Later items finish first, so unordered results come back reversed.
+    time.sleep(0.01 * (5 - n))
+    return n * n
+
+
+def test_threaded_map_preserves_order():
+    results = utils.threaded_map(_slow_square, range(5), max_workers=5)
+    assert [(n, f.result()) for n, f in results] == [
+        (0, 0), (1, 1), (2, 4), (3, 9), (4, 16)]
+
+
+def test_threaded_map_unordered_returns_everything():
+    results = utils.threaded_map(
+        _slow_square, range(5), max_workers=5, ordered=False)
+    assert sorted(f.result() for _, f in results) == [0, 1, 4, 9, 16]
+
+
+def test_threaded_map_keeps_exceptions_per_item():
+    def check(n):
+        if n == 2:
+            raise ValueError(n)
+        return n
+
+    results = dict(utils.threaded_map(check, range(4), max_workers=2))
+    assert results[3].result() == 3
+    with pytest.raises(ValueError):
+        results[2].result()
+
+
+def test_threaded_map_bounds_items_in_flight():
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def track(n):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.005)
+        with lock:
+            state['running'] -= 1
+        return n
+
+    results = utils.threaded_map(track, range(20), max_workers=3)
+    assert [f.result() for _, f in results] == list(range(20))
+    assert state['peak'] <= 3
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_threaded_map_cancels_queued_items_when_stopped(ordered):
+    calls = []
+    release = threading.Event()
+
+    def record(n):
+        calls.append(n)
+        if n > 0:
+            release.wait()
+        return n
+
+    results = utils.threaded_map(
+        record, range(100), max_workers=2, ordered=ordered)
+    item, _ = next(results)
+    assert item == 0
+
+    # Both threads are now stuck on an item, and the rest are queued.  The
+    # running items have to finish before the pool can shut down.
+    threading.Timer(0.05, release.set).start()
+    results.close()
+    assert sorted(calls) == [0, 1, 2]
@@ -0,0 +1,267 @@
+# -*- encoding: utf-8
+"""Tests for ao3.works."""
+
+from datetime import date
+import io
+import json
+
+try:
+    from unittest import mock
+except ImportError:  # Python 2
+    import mock
+
+import pytest
+
+from ao3.works import RestrictedWork, Work, WorkNotFound
+from helpers import FakeSession
+
+
+def test_work_is_fetched_immediately(work_session):
+    work = Work('258626', sess=work_session)
+    assert work.is_loaded
+    assert work_session.urls == ['https://archiveofourown.org/works/258626']
+
+
+def test_lazy_work_defers_fetching_until_needed(work_session):
+    work = Work('258626', sess=work_session, lazy=True)
+    assert work.url == 'https://archiveofourown.org/works/258626'
+    assert not work.is_loaded
+    assert work_session.urls == []
+
+    assert work.title == 'The Morning After'
+    assert work.kudos == 1238
+    assert work_session.urls == ['https://archiveofourown.org/works/258626']
+
+
+def test_lazy_work_raises_on_first_access(work_session):
+    work = Work('404', sess=work_session, lazy=True)
+    with pytest.raises(WorkNotFound):
+        work.title
+
+
+def test_prefetch_only_fetches_once(work_session):
+    work = Work('258626', sess=work_session, lazy=True)
+    assert work.prefetch() is work
+    work.prefetch()
+    assert len(work_session.urls) == 1
+
+
+def test_work_properties(work_session):
+    work = Work('258626', sess=work_session)
+    assert work.title == 'The Morning After'
+    assert work.author == 'ambyr'
+    assert work.summary == (
+        "<p>Delicious just can't understand why it's the shy, quiet ones "
+        "who get all the girls.</p>")
+    assert work.rating == ['Teen And Up Audiences']
+    assert work.warnings == []
+    assert work.category == ['F/M']
+    assert work.fandoms == ['Anthropomorfic - Fandom']
+    assert work.relationship == ['Pinboard/Fandom']
+    assert work.characters == [
+        'Pinboard', 'Delicious - Character', 'Diigo - Character']
+    assert work.additional_tags == [
+        'crackfic', 'Meta', 'so very not my usual thing']
+    assert work.language == 'English'
+    assert work.published == date(2011, 9, 29)
+    assert work.words == 605
+    assert work.comments == 122
+    assert work.kudos == 1238
+    assert work.bookmarks == 99
+    assert work.hits == 43037
+    assert list(work.kudos_left_by) == [
+        'winterbelles', 'AnonEhouse', 'SailAweigh']
+
+
+def test_metadata_is_extracted_once(work_session):
+    work = Work('258626', sess=work_session)
+    calls = []
+    real_extract = work._parser.work_metadata
+
+    def counting_extract(tree):
+        calls.append(tree)
+        return real_extract(tree)
+
+    work._parser = mock.Mock(work_metadata=counting_extract)
+    work.json()
+    work.title
+    assert len(calls) == 1
+
+
+def test_json(work_session):
+    data = json.loads(Work('258626', sess=work_session).json())
+    assert data['id'] == '258626'
+    assert data['stats'] == {
+        'published': '2011-09-29',
+        'words': 605,
+        'chapters': {'posted': 1, 'total': 1},
+        'comments': 122,
+        'kudos': 1238,
+        'bookmarks': 99,
+        'hits': 43037,
+    }
+
+
+def test_metadata_only_work_matches_full_work(work_session):
+    full = Work('258626', sess=work_session)
+    partial = Work('258626', sess=work_session, metadata_only=True)
+    assert partial.json(sort_keys=True) == full.json(sort_keys=True)
+    assert list(partial.kudos_left_by) == list(full.kudos_left_by)
+
+
+def test_iter_kudos_follows_every_page(work_session):
+    work = Work('258626', sess=work_session, lazy=True)
+    assert list(work.iter_kudos(chunk_size=64)) == [
+        'winterbelles', 'AnonEhouse', 'SailAweigh', 'reader',
+        'latecomer', 'sammy_b']
+
+    # We never needed the work page itself.
+    assert not work.is_loaded
+
+
+def test_iter_kudos_can_stop_early(work_session):
+    kudos = Work('258626', sess=work_session, lazy=True).iter_kudos()
+    assert next(kudos) == 'winterbelles'
+    kudos.close()
+    assert work_session.urls == [
+        'https://archiveofourown.org/works/258626/kudos?page=1']
+
+
+KUDOS_PAGE_1 = 'https://archiveofourown.org/works/258626/kudos?page=1'
+KUDOS_PAGE_2 = 'https://archiveofourown.org/works/258626/kudos?page=2'
+
+
+def test_has_kudos_from_stops_when_it_finds_the_user(work_session):
+    work = Work('258626', sess=work_session, lazy=True)
+    assert work.has_kudos_from('winterbelles', chunk_size=64)
+    assert work_session.urls == [KUDOS_PAGE_1]
+
+
+def test_kudos_from_remembers_the_full_list(work_session):
+    work = Work('258626', sess=work_session, lazy=True)
+    assert work.kudos_from(['reader', 'sammy_b', 'nobody']) == set([
+        'reader', 'sammy_b'])
+    assert work_session.urls == [KUDOS_PAGE_1, KUDOS_PAGE_2]
+
+    assert not work.has_kudos_from('nobody')
+    assert work.has_kudos_from('latecomer')
+    assert len(work_session.urls) == 2
+
+
+def test_kudos_from_checks_the_work_page_first(work_session):
+    work = Work('258626', sess=work_session)
+    assert work.has_kudos_from('SailAweigh')
+    assert work.has_kudos_from('sammy_b')
+    assert work_session.urls == [
+        'https://archiveofourown.org/works/258626', KUDOS_PAGE_1,
+        KUDOS_PAGE_2]
+
+
+def test_check_kudos(api, work_session):
+    errors = []
+    results = list(api.check_kudos(
+        'nobody', ['258626', '404'],
+        on_error=lambda work_id, exc: errors.append(work_id)))
+    assert results == [('258626', False)]
+    assert errors == ['404']
+
+    # The kudos are remembered, and fetching the work still works.
+    assert list(api.check_kudos('latecomer', ['258626'])) == [
+        ('258626', True)]
+    assert api.work('258626').title == 'The Morning After'
+    assert work_session.urls.count(KUDOS_PAGE_2) == 1
+
+
+def test_iter_kudos_on_missing_work(work_session):
+    with pytest.raises(WorkNotFound):
+        list(Work('404', sess=work_session, lazy=True).iter_kudos())
+
+
+def test_adult_works_skip_the_interstitial(fixture_html):
+    sess = FakeSession({
+        'https://archiveofourown.org/works/258626':
+            fixture_html('adult_interstitial.html'),
+        'https://archiveofourown.org/works/258626?view_adult=true':
+            fixture_html('work.html'),
+    })
+    work = Work('258626', sess=sess)
+    assert work.title == 'The Morning After'
+    assert sess.urls[-1].endswith('?view_adult=true')
+
+
+def test_restricted_work_raises(fixture_html):
+    sess = FakeSession({
+        'https://archiveofourown.org/works/258626':
+            fixture_html('restricted.html'),
+    })
+    with pytest.raises(RestrictedWork):
+        Work('258626', sess=sess)
+
+
+def test_base_url_is_used_for_every_request(fixture_html):
+    sess = FakeSession({
+        'http://localhost:8000/works/258626': fixture_html('work.html'),
+        'http://localhost:8000/works/258626/kudos?page=1':
+            fixture_html('kudos_page2.html'),
+    })
+    work = Work('258626', sess=sess, base_url='http://localhost:8000')
+    assert work.url == 'http://localhost:8000/works/258626'
+    assert list(work.iter_kudos()) == ['latecomer', 'sammy_b']
+
+
+FULL_WORK_URL = (
+    'https://archiveofourown.org/works/999'
+    '?view_adult=true&view_full_work=true')
+
+
+def test_chapter_count(fixture_html):
+    work = Work('999', html=fixture_html('full_work.html'))
+    assert work.chapters == (3, None)
+    assert work.chapters.posted == 3
+    assert Work('258626', html=fixture_html('work.html')).chapters == (1, 1)
+
+
+def test_iter_chapters_uses_one_request(fixture_html):
+    sess = FakeSession({FULL_WORK_URL: fixture_html('full_work.html')})
+    work = Work('999', sess=sess, lazy=True)
+    chapters = list(work.iter_chapters(chunk_size=100))
+
+    assert [(c.number, c.title) for c in chapters] == [
+        (1, 'Chapter 1: Sundown'), (2, 'Chapter 2'), (3, 'Chapter 3: Sunrise')]
+    assert sess.urls == [FULL_WORK_URL]
+    assert not work.is_loaded
+
+
+def test_iter_chapters_on_restricted_work(fixture_html):
+    sess = FakeSession({FULL_WORK_URL: fixture_html('restricted.html')})
+    with pytest.raises(RestrictedWork):
+        list(Work('999', sess=sess, lazy=True).iter_chapters())
+
+
+def test_download(fixture_html):
+    sess = FakeSession({FULL_WORK_URL: fixture_html('full_work.html')})
+    out = io.StringIO()
+    assert Work('999', sess=sess, lazy=True).download(out) == 3
+
+    text = out.getvalue()
+    assert text.startswith('<h2>Chapter 1: Sundown</h2>\n<p>The lights')
+    assert '<div class="center"><p>Midnight.</p></div>' in text
+
+
+def test_low_memory_work_drops_the_page(work_session):
+    work = Work('258626', sess=work_session, low_memory=True)
+    full = Work('258626', sess=work_session)
+
+    assert work.is_loaded
+    assert work._html is None
+    assert work._tree is None
+    assert work.json() == full.json()
+    assert list(work.kudos_left_by) == list(full.kudos_left_by)
+    assert len(work_session.urls) == 2
+
+
+def test_low_memory_work_fetches_the_page_again_if_needed(work_session):
+    work = Work('258626', sess=work_session, low_memory=True)
+    assert work._soup.find('h2').get_text().strip() == 'The Morning After'
+    assert work._tree is None
+    assert len(work_session.urls) == 2